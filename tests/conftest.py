@@ -0,0 +1,58 @@
+import hashlib
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Esquema de la versión original de la aplicación, antes de las migraciones
+ESQUEMA_ORIGINAL = """
+CREATE TABLE Administrador (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+    email TEXT UNIQUE, password TEXT NOT NULL);
+CREATE TABLE Propietario (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+    telefono TEXT NOT NULL, email TEXT UNIQUE);
+CREATE TABLE Animal (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, especie TEXT,
+    raza TEXT, fecha_nacimiento DATE);
+CREATE TABLE Propietario_Animal (propietario_id INTEGER, animal_id INTEGER,
+    FOREIGN KEY (propietario_id) REFERENCES Propietario(id), FOREIGN KEY (animal_id) REFERENCES Animal(id),
+    PRIMARY KEY (propietario_id, animal_id));
+CREATE TABLE Recepcionista (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+    email TEXT UNIQUE, password TEXT NOT NULL);
+CREATE TABLE Veterinario (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+    email TEXT UNIQUE, password TEXT NOT NULL);
+CREATE TABLE Servicio (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT UNIQUE NOT NULL, precio REAL NOT NULL);
+CREATE TABLE Cita (id INTEGER PRIMARY KEY AUTOINCREMENT, fecha DATETIME NOT NULL, motivo TEXT NOT NULL,
+    estado TEXT DEFAULT 'pendiente', animal_id INTEGER NOT NULL, veterinario_id INTEGER NOT NULL,
+    servicio_id INTEGER NOT NULL);
+CREATE TABLE Pago (id INTEGER PRIMARY KEY AUTOINCREMENT, monto REAL NOT NULL, fecha DATE NOT NULL,
+    estado TEXT DEFAULT 'pendiente', cita_id INTEGER NOT NULL);
+CREATE TABLE HistorialMedico (id INTEGER PRIMARY KEY AUTOINCREMENT, fecha DATE NOT NULL, tipo TEXT NOT NULL,
+    descripcion TEXT NOT NULL, tratamiento TEXT, animal_id INTEGER NOT NULL, veterinario_id INTEGER NOT NULL);
+"""
+
+
+def sha256(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+@pytest.fixture
+def base_original(tmp_path):
+    """Ruta de una base con el esquema y los datos de prueba de la versión original"""
+    ruta = str(tmp_path / "original.db")
+    conn = sqlite3.connect(ruta)
+    conn.executescript(ESQUEMA_ORIGINAL)
+    conn.executemany("INSERT INTO Administrador (nombre, email, password) VALUES (?, ?, ?)",
+                     [("Admin Principal", "admin@vet.com", sha256("admin123"))])
+    conn.executemany("INSERT INTO Recepcionista (nombre, email, password) VALUES (?, ?, ?)",
+                     [("Ana Recepcion", "recepcion@vet.com", sha256("recepcion123"))])
+    conn.executemany("INSERT INTO Veterinario (nombre, email, password) VALUES (?, ?, ?)",
+                     [("Dr. Perez", "vet@vet.com", sha256("vet123"))])
+    conn.execute("INSERT INTO Propietario (nombre, telefono, email) VALUES ('Juan Perez', '5551234567', 'juan@email.com')")
+    conn.execute("INSERT INTO Animal (nombre, especie, raza, fecha_nacimiento) VALUES ('Firulais', 'Perro', 'Labrador', '2020-05-15')")
+    conn.execute("INSERT INTO Propietario_Animal VALUES (1, 1)")
+    conn.execute("INSERT INTO Servicio (nombre, precio) VALUES ('Consulta General', 300.0)")
+    conn.commit()
+    conn.close()
+    return ruta
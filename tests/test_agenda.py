@@ -0,0 +1,54 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import veterinaria_V2 as v
+
+
+def programar(db, fecha, veterinario_id=1):
+    return v.Cita(fecha=fecha, motivo="Control", animal_id=1, veterinario_id=veterinario_id,
+                  servicio_id=1).programar_cita(db)
+
+
+def test_rechaza_una_cita_que_se_solapa_y_libera_el_hueco_al_cancelar():
+    db = v.Database(":memory:")
+    id_cita = programar(db, "2030-01-07 10:00")
+    assert db.conflicto_agenda(1, "2030-01-07 10:15", "2030-01-07 10:45")[0] == id_cita
+    assert db.conflicto_agenda(1, "2030-01-07 10:30", "2030-01-07 11:00") is None
+
+    with pytest.raises(v.ConflictoAgenda):
+        programar(db, "2030-01-07 10:15")
+    # Otro veterinario sí puede atender a esa hora
+    db.conn.execute("INSERT INTO Veterinario (nombre, email, password) VALUES ('Dra. Gomez', 'gomez@vet.com', '')")
+    db.conn.commit()
+    programar(db, "2030-01-07 10:15", veterinario_id=2)
+
+    v.Cita(id=id_cita).cancelar_cita(db)
+    programar(db, "2030-01-07 10:15")
+
+
+def test_huecos_libres_salta_las_citas_y_respeta_el_horario():
+    db = v.Database(":memory:")
+    programar(db, "2030-01-07 09:00")
+    programar(db, "2030-01-07 10:00")
+
+    huecos = db.huecos_libres(1, datetime(2030, 1, 7, 8, 0), cantidad=3)
+    assert [hueco.strftime("%H:%M") for hueco in huecos] == ["09:30", "10:30", "11:00"]
+
+    huecos = db.huecos_libres(1, datetime(2030, 1, 7, 17, 45), cantidad=1)
+    assert huecos == [datetime(2030, 1, 8, 9, 0)]
+
+
+def test_la_migracion_tolera_citas_antiguas_solapadas(base_original):
+    conn = sqlite3.connect(base_original)
+    conn.executemany("INSERT INTO Cita (fecha, motivo, animal_id, veterinario_id, servicio_id) "
+                     "VALUES (?, 'Control', 1, 1, 1)", [("2024-03-01 10:00",), ("2024-03-01 10:00",)])
+    conn.commit()
+    conn.close()
+
+    # Las dos se conservan en la agenda; el trigger solo vigila las nuevas
+    db = v.Database(base_original, sembrar=False)
+    assert db.conn.execute("SELECT cita_id FROM AgendaVeterinario ORDER BY cita_id").fetchall() == [(1,), (2,)]
+    with pytest.raises(v.ConflictoAgenda):
+        programar(db, "2024-03-01 10:15")
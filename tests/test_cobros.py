@@ -0,0 +1,31 @@
+import veterinaria_V2 as v
+
+
+def test_filtra_las_citas_sin_pagar_por_propietario_y_pagina():
+    db = v.Database(":memory:")
+    v.GeneradorDatos(db, semilla=3).generar(400)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT propietario_id FROM Propietario_Animal GROUP BY propietario_id "
+                   "ORDER BY COUNT(*) DESC LIMIT 1")
+    propietario_id = cursor.fetchone()[0]
+    cursor.execute(
+        """SELECT c.id FROM Cita c JOIN Propietario_Animal pa ON pa.animal_id = c.animal_id
+        WHERE pa.propietario_id = ? AND c.estado = 'pendiente'
+        AND NOT EXISTS (SELECT 1 FROM Pago p WHERE p.cita_id = c.id)
+        ORDER BY c.fecha, c.id""", (propietario_id,))
+    esperadas = [id for id, in cursor.fetchall()]
+    assert esperadas
+
+    # Recorre todas las páginas de dos en dos
+    obtenidas, siguiente = [], None
+    while True:
+        filas, siguiente = db.cuentas_por_cobrar(propietario_id=propietario_id, limite=2, despues_de=siguiente)
+        obtenidas.extend(fila[0] for fila in filas)
+        if siguiente is None:
+            break
+    assert obtenidas == esperadas
+
+    # Al pagarla, la cita sale del listado
+    v.Recepcionista(id=1).registrar_pago(esperadas[0], 100.0, "completado", db)
+    assert esperadas[0] not in [fila[0] for fila in db.cuentas_por_cobrar(propietario_id=propietario_id,
+                                                                         limite=1000)[0]]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import veterinaria_V2 as v
+
+
+def test_la_clave_sha256_original_pasa_a_pbkdf2_al_entrar(base_original):
+    db = v.Database(base_original, sembrar=False)
+    assert db.clave_actual("vet@vet.com").startswith("sha256$")
+
+    assert db.autenticar("vet@vet.com", "vet123")[0] == "Veterinario"
+    assert db.clave_actual("vet@vet.com").startswith(v.PREFIJO_KDF + "$")
+    assert db.autenticar("VET@vet.com ", "vet123")[0] == "Veterinario"
+    with pytest.raises(v.DatosInvalidos):
+        db.autenticar("vet@vet.com", "otra")
+
+
+def test_la_cache_de_sesiones_caduca_al_cambiar_la_clave(base_original):
+    db = v.Database(base_original, sembrar=False)
+    sesiones = v.CacheSesiones()
+    usuario = sesiones.autenticar(db, "admin@vet.com", "admin123")
+    assert sesiones.autenticar(db, "admin@vet.com", "admin123") == usuario
+    with pytest.raises(v.DatosInvalidos):
+        sesiones.autenticar(db, "admin@vet.com", "admin124")
+
+    # Otro puesto cambia la contraseña: la sesión guardada deja de valer
+    db.conn.execute("UPDATE Usuario SET clave = ? WHERE email = 'admin@vet.com'", (v.derivar_clave("nueva"),))
+    db.conn.commit()
+    with pytest.raises(v.DatosInvalidos):
+        sesiones.autenticar(db, "admin@vet.com", "admin123")
+    assert sesiones.autenticar(db, "admin@vet.com", "nueva") == usuario
+
+
+def test_un_propietario_importado_activa_su_cuenta_con_el_codigo_de_recepcion(tmp_path):
+    db = v.Database(":memory:", sembrar=False)
+    ruta = tmp_path / "propietarios.jsonl"
+    ruta.write_text(json.dumps({"id": 7, "nombre": "Ana", "telefono": "555", "email": "Ana@Correo.com"}) + "\n",
+                    encoding="utf-8")
+    v.ImportadorDatos(db).importar("Propietario", str(ruta))
+    assert db.clave_actual("ana@correo.com") == v.Database.CLAVE_PENDIENTE
+
+    # Sin código emitido, o con uno equivocado, no se activa
+    with pytest.raises(v.DatosInvalidos):
+        db.activar_cuenta("ana@correo.com", "", "secreta")
+    codigo = db.emitir_codigo_activacion(7)
+    with pytest.raises(v.DatosInvalidos):
+        db.activar_cuenta("ana@correo.com", "XXXXXXXX", "secreta")
+
+    db.activar_cuenta("ana@correo.com", codigo.lower(), "secreta")
+    assert db.autenticar("ana@correo.com", "secreta")[:2] == ("Propietario", 7)
+    # El código sirve una sola vez
+    with pytest.raises(v.DatosInvalidos):
+        db.activar_cuenta("ana@correo.com", codigo, "otra")
+    with pytest.raises(v.NoEncontrado):
+        db.emitir_codigo_activacion(7)
@@ -0,0 +1,67 @@
+import time
+
+import veterinaria_V2 as v
+
+
+class RaizFalsa:
+    """Lo que EjecutorBD usa de Tk: after y after_cancel, sin bucle de eventos"""
+
+    def __init__(self):
+        self.programadas = {}
+        self.siguiente = 0
+
+    def after(self, ms, funcion):
+        self.siguiente += 1
+        self.programadas[self.siguiente] = funcion
+        return self.siguiente
+
+    def after_cancel(self, id):
+        self.programadas.pop(id, None)
+
+    def correr(self):
+        """Ejecuta lo programado, vuelta a vuelta, hasta que no quede nada"""
+        for _ in range(1000):
+            if not self.programadas:
+                return
+            _, funcion = self.programadas.popitem()
+            funcion()
+            time.sleep(0.005)
+        raise AssertionError("el sondeo no se detiene")
+
+
+def test_solo_sondea_mientras_hay_trabajo(tmp_path):
+    db = v.Database(str(tmp_path / "vet.db"))
+    raiz = RaizFalsa()
+    ejecutor = v.EjecutorBD(raiz, db)
+    assert raiz.programadas == {}
+
+    resultados = []
+    ejecutor.ejecutar(lambda db: db.servicios(), al_terminar=resultados.append)
+    ejecutor.ejecutar(lambda db: None)
+    ejecutor.ejecutar(lambda db: 1 / 0, al_fallar=lambda e: resultados.append(type(e)))
+    assert len(raiz.programadas) == 1
+
+    raiz.correr()
+    assert db.servicios() in resultados
+    assert ZeroDivisionError in resultados
+    assert ejecutor.en_curso == 0 and raiz.programadas == {}
+    ejecutor.cerrar()
+
+
+def test_el_monitor_de_interfaz_mide_cada_entrega_por_su_nombre(tmp_path):
+    db = v.Database(str(tmp_path / "vet.db"))
+    raiz = RaizFalsa()
+    ejecutor = v.EjecutorBD(raiz, db)
+    monitor = v.MonitorInterfaz(ruta=str(tmp_path / "perfil.jsonl")).instalar()
+    try:
+        def mostrar_servicios(servicios):
+            pass
+
+        ejecutor.ejecutar(lambda db: db.servicios(), al_terminar=mostrar_servicios)
+        raiz.correr()
+    finally:
+        monitor.cerrar()
+        ejecutor.cerrar()
+
+    assert monitor.nombre_manejador(ejecutor.procesar_pendientes) is None
+    assert list(monitor.manejadores) == [mostrar_servicios.__qualname__]
@@ -0,0 +1,44 @@
+import json
+
+import veterinaria_V2 as v
+
+
+def escribir_jsonl(ruta, registros):
+    ruta.write_text("\n".join(json.dumps(registro) for registro in registros) + "\n", encoding="utf-8")
+    return str(ruta)
+
+
+def test_rechaza_valores_de_tipo_incorrecto_sin_cortar_la_importacion(tmp_path):
+    db = v.Database(":memory:")
+    ruta = escribir_jsonl(tmp_path / "historial.jsonl", [
+        {"fecha": "2024-01-01", "tipo": "Consulta", "descripcion": "Revisión", "animal_id": 1, "veterinario_id": 1},
+        {"fecha": "2024-01-02", "tipo": "Consulta", "descripcion": ["no", "texto"], "animal_id": 1, "veterinario_id": 1},
+        {"fecha": "2024-01-03", "tipo": "Consulta", "descripcion": "Control", "animal_id": 1.5, "veterinario_id": 1},
+        {"fecha": "2024-01-04", "tipo": "Consulta", "descripcion": "Alta", "animal_id": True, "veterinario_id": 1},
+        {"fecha": "2024-01-05", "tipo": "Consulta", "descripcion": "Peso", "animal_id": 1, "veterinario_id": 1},
+    ])
+    cursor = db.conn.cursor()
+    cursor.execute("INSERT INTO Animal (nombre, especie) VALUES ('Firulais', 'Perro')")
+    db.conn.commit()
+
+    resultado = v.ImportadorDatos(db, tamano_lote=2).importar("HistorialMedico", ruta)
+
+    assert resultado["importadas"] == 2
+    assert [linea for linea, _ in resultado["rechazadas"]] == [2, 3, 4]
+    assert cursor.execute("SELECT descripcion FROM HistorialMedico ORDER BY id").fetchall() == [("Revisión",), ("Peso",)]
+
+
+def test_un_lote_con_ids_repetidos_solo_rechaza_las_filas_que_chocan(tmp_path):
+    db = v.Database(":memory:", sembrar=False)
+    ruta = escribir_jsonl(tmp_path / "propietarios.jsonl", [
+        {"id": 1, "nombre": "Ana", "telefono": 5550001},
+        {"id": 2, "nombre": "Luis", "telefono": "5550002"},
+        {"id": 1, "nombre": "Otra Ana", "telefono": "5550003"},
+    ])
+
+    resultado = v.ImportadorDatos(db).importar("Propietario", ruta)
+
+    assert resultado["importadas"] == 2
+    assert [linea for linea, _ in resultado["rechazadas"]] == [3]
+    assert db.conn.execute("SELECT id, nombre, telefono FROM Propietario ORDER BY id").fetchall() == [
+        (1, "Ana", "5550001"), (2, "Luis", "5550002")]
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+import veterinaria_V2 as v
+
+
+def test_migra_una_base_original_con_un_pago_de_una_cita_borrada(base_original):
+    conn = sqlite3.connect(base_original)
+    conn.execute("INSERT INTO Cita (fecha, motivo, animal_id, veterinario_id, servicio_id) "
+                 "VALUES ('2024-03-01 10:00', 'Control', 1, 1, 1)")
+    conn.execute("INSERT INTO Pago (monto, fecha, cita_id) VALUES (300, '2024-03-01', 1)")
+    # La versión original borraba la cita al cancelarla y dejaba su pago
+    conn.execute("INSERT INTO Pago (monto, fecha, cita_id) VALUES (200, '2024-03-02', 99)")
+    conn.commit()
+    conn.close()
+
+    db = v.Database(base_original, sembrar=False)
+    assert db.verificar_resumen_ingresos() == []
+    cursor = db.conn.cursor()
+    assert cursor.execute("SELECT ingresos, pagos FROM IngresoMensual").fetchall() == [(500, 2)]
+    assert cursor.execute("SELECT ingresos, pagos FROM IngresoMensualServicio").fetchall() == [(300, 1)]
+
+    # El trigger también admite un pago así en una base ya migrada
+    cursor.execute("INSERT INTO Pago (monto, fecha, cita_id) VALUES (50, '2024-03-03', 98)")
+    db.conn.commit()
+    assert db.verificar_resumen_ingresos() == []
+
+
+def test_los_resumenes_coinciden_con_pago():
+    db = v.Database(":memory:")
+    v.GeneradorDatos(db, semilla=2).generar(500)
+    cita_id = db.cuentas_por_cobrar(limite=1)[0][0][0]
+    v.Recepcionista(id=1).registrar_pago(cita_id, 120.5, "completado", db)
+    assert db.verificar_resumen_ingresos() == []
+
+
+def test_no_se_cancela_una_cita_pagada_ni_se_paga_una_inexistente():
+    db = v.Database(":memory:")
+    v.GeneradorDatos(db, semilla=2).generar(200)
+    cita_id = db.cuentas_por_cobrar(limite=1)[0][0][0]
+    recepcionista = v.Recepcionista(id=1)
+    recepcionista.registrar_pago(cita_id, 100.0, "completado", db)
+    with pytest.raises(v.DatosInvalidos):
+        v.Cita(id=cita_id).cancelar_cita(db)
+    with pytest.raises(v.NoEncontrado):
+        recepcionista.registrar_pago(10 ** 9, 100.0, "completado", db)
@@ -0,0 +1,40 @@
+import sqlite3
+
+import veterinaria_V2 as v
+
+
+def test_migra_una_base_original_hasta_la_ultima_version(base_original):
+    conn = sqlite3.connect(base_original)
+    conn.execute("INSERT INTO HistorialMedico (fecha, descripcion, tipo, animal_id, veterinario_id) "
+                 "VALUES ('2024-01-10', 'Vacuna: Rabia\nPróxima aplicación: 2025-01-10', 'Vacunación', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    db = v.Database(base_original, sembrar=False)
+    cursor = db.conn.cursor()
+    assert cursor.execute("PRAGMA user_version").fetchone()[0] == v.Database.VERSION_ESQUEMA
+    assert cursor.execute("SELECT vacuna, proxima_aplicacion FROM Vacuna").fetchall() == [("Rabia", "2025-01-10")]
+    assert cursor.execute("SELECT COUNT(*) FROM MigracionRechazo").fetchone()[0] == 0
+    db.conn.close()
+
+    # Abrirla otra vez no repite ninguna migración
+    db = v.Database(base_original, sembrar=False)
+    assert db.conn.execute("SELECT COUNT(*) FROM Vacuna").fetchone()[0] == 1
+
+
+def test_un_relleno_salta_y_anota_las_filas_que_rechaza():
+    db = v.Database(":memory:", sembrar=False)
+    cursor = db.conn.cursor()
+    cursor.execute("CREATE TABLE Origen (id INTEGER PRIMARY KEY, valor TEXT)")
+    cursor.execute("CREATE TABLE Destino (id INTEGER PRIMARY KEY, valor TEXT NOT NULL)")
+    cursor.executemany("INSERT INTO Origen (valor) VALUES (?)", [("a",), (None,), ("c",), ("d",), (None,)])
+    db.conn.commit()
+
+    db.rellenar_por_lotes(99, "prueba", "Origen", [
+        "INSERT INTO Destino (id, valor) SELECT id, valor FROM Origen WHERE id BETWEEN ? AND ?"
+    ], tamano_lote=3)
+
+    assert cursor.execute("SELECT id FROM Destino").fetchall() == [(1,), (3,), (4,)]
+    assert cursor.execute("SELECT fila_id FROM MigracionRechazo WHERE version = 99").fetchall() == [(2,), (5,)]
+    assert cursor.execute("SELECT ultimo_id FROM MigracionProgreso WHERE version = 99").fetchone() == (5,)
+    assert len(db.avisos) == 2
@@ -0,0 +1,44 @@
+import pytest
+
+import veterinaria_V2 as v
+
+
+@pytest.fixture(scope="module")
+def db():
+    db = v.Database(":memory:")
+    v.GeneradorDatos(db, semilla=1).generar(3000)
+    yield db
+    db.conn.close()
+
+
+def test_las_operaciones_de_los_paneles_no_recorren_tablas_grandes(db):
+    fallos = [f"{nombre}: {detalle}\n{' '.join(sentencia.split())}"
+              for nombre, sentencia, detalle in db.verificar_planes()]
+    assert not fallos, "\n".join(fallos)
+
+
+def test_cada_operacion_ejecuta_sus_sentencias(db):
+    # Una operación que falla antes de consultar dejaría su plan sin revisar
+    sentencias = db.sentencias_paneles()
+    # Sin texto la búsqueda ni siquiera consulta
+    assert [nombre for nombre, capturadas in sentencias.items() if not capturadas] == [
+        "animales sin propietario, sin texto"]
+    tipos = {sentencia.split()[0].upper() for capturadas in sentencias.values() for sentencia, _ in capturadas}
+    assert {"SELECT", "INSERT", "UPDATE", "DELETE"} <= tipos
+
+
+def test_la_verificacion_no_modifica_la_base(db):
+    antes = db.conn.execute("SELECT COUNT(*), MAX(id) FROM Cita").fetchone()
+    db.sentencias_paneles()
+    assert db.conn.execute("SELECT COUNT(*), MAX(id) FROM Cita").fetchone() == antes
+
+
+def test_detecta_un_scan_de_tabla_grande(db):
+    assert db.recorridos_completos("SELECT id FROM Cita c WHERE c.motivo = 'x'") == ["SCAN c"]
+    assert db.recorridos_completos("SELECT id FROM Cita WHERE animal_id = ?", (1,)) == []
+    assert db.recorridos_completos("UPDATE Cita SET motivo = ? WHERE motivo = ?") == ["SCAN Cita"]
+
+
+def test_admite_el_recorrido_de_un_indice_parcial(db):
+    assert db.recorridos_completos(
+        "SELECT id FROM Cita c WHERE c.estado = 'pendiente' ORDER BY c.fecha, c.id LIMIT 50") == []
@@ -4,12 +4,57 @@
 
 @author: Fernando Marquez Arres
 """
+import time
+INICIO_IMPORTACION = time.perf_counter()  # Para --profile-startup
+
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, scrolledtext
+from tkinter import ttk, messagebox, simpledialog, scrolledtext, filedialog
 import sqlite3
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import hashlib  # Para el hash de contraseñas
+import hmac
+import secrets
+import getpass
 import re  # Para validación de email
+import sys
+import csv
+import itertools
+import json
+import queue
+import threading
+import asyncio
+import os
+import random
+import statistics
+import bisect
+from collections import deque
+import tempfile
+import cProfile
+import pstats
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+FIN_IMPORTACION = time.perf_counter()
+
+# ====================== ERRORES ======================
+
+class ErrorVeterinaria(Exception):
+    """Error de una operación del dominio; el mensaje se puede mostrar al usuario"""
+
+class DatosInvalidos(ErrorVeterinaria):
+    pass
+
+class NoEncontrado(ErrorVeterinaria):
+    pass
+
+class Duplicado(ErrorVeterinaria):
+    pass
+
+class ConflictoAgenda(ErrorVeterinaria):
+    pass
+
+class ErrorBaseDatos(ErrorVeterinaria):
+    pass
 
 # ====================== CLASES DEL DOMINIO ======================
 
@@ -27,8 +72,7 @@ class Animal:
                 nacimiento = datetime.strptime(self.fecha_nacimiento, "%Y-%m-%d").date()
                 return (date.today() - nacimiento).days // 365
             except ValueError:
-                messagebox.showerror("Error", "Formato de fecha inválido. Use YYYY-MM-DD")
-                return None
+                raise DatosInvalidos("Formato de fecha inválido. Use YYYY-MM-DD")
         return None
 
 class Propietario:
@@ -42,19 +86,21 @@ class Propietario:
         try:
             animal_id = int(animal_id)
         except (ValueError, TypeError):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return False
+            raise DatosInvalidos("ID de animal inválido")
         
         try:
              cursor = db.conn.cursor()
+             cursor.execute("SELECT id FROM Animal WHERE id = ?", (animal_id,))
+             if not cursor.fetchone():
+                 raise NoEncontrado(f"No existe un animal con ID {animal_id}")
+             
              # Verificar que la relación no existe ya
              cursor.execute(
                  "SELECT * FROM Propietario_Animal WHERE propietario_id = ? AND animal_id = ?",
                  (self.id, animal_id)
              )
              if cursor.fetchone():
-                 messagebox.showerror("Error", "Esta asociación ya existe")
-                 return False
+                 raise Duplicado("Este animal ya está asociado a tu cuenta")
             
              cursor.execute(
                  "INSERT INTO Propietario_Animal (propietario_id, animal_id) VALUES (?, ?)",
@@ -64,8 +110,27 @@ class Propietario:
              return True
         except sqlite3.Error as e:
              db.conn.rollback()
-             messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-             return False
+             raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+    
+    def listar_animales(self, db, ids=None):
+        """Animales del propietario, todos o solo los de los ids indicados"""
+        consulta = """
+        SELECT a.id, a.nombre, a.especie, a.raza, a.fecha_nacimiento 
+        FROM Animal a
+        JOIN Propietario_Animal pa ON a.id = pa.animal_id
+        WHERE pa.propietario_id = ?
+        """
+        parametros = [self.id]
+        if ids is not None:
+            ids = list(ids)
+            consulta += f" AND a.id IN ({', '.join('?' * len(ids))})"
+            parametros += ids
+        try:
+            cursor = db.conn.cursor()
+            cursor.execute(consulta, parametros)
+            return [Animal(*fila) for fila in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
             
 
 class Administrador:
@@ -80,10 +145,57 @@ class Administrador:
         return hashlib.sha256(password.encode()).hexdigest()
     
     def configurar_servicios(self, servicios, db):
-        pass
-    
+        """Da de alta los servicios [(nombre, precio), ...] y devuelve sus ids"""
+        servicios = [(nombre.strip() if isinstance(nombre, str) else nombre, precio)
+                     for nombre, precio in servicios]
+        for nombre, precio in servicios:
+            if not nombre or not isinstance(nombre, str):
+                raise DatosInvalidos("Nombre del servicio es requerido")
+            if not isinstance(precio, (int, float)) or precio < 0:
+                raise DatosInvalidos(f"Precio inválido para {nombre}")
+
+        try:
+            cursor = db.conn.cursor()
+            ids = []
+            for nombre, precio in servicios:
+                cursor.execute("INSERT INTO Servicio (nombre, precio) VALUES (?, ?)", (nombre, precio))
+                ids.append(cursor.lastrowid)
+            db.conn.commit()
+        except sqlite3.IntegrityError as e:
+            db.conn.rollback()
+            raise Duplicado("Ya existe un servicio con ese nombre") from e
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+
+        for id, (nombre, precio) in zip(ids, servicios):
+            db.catalogos.agregar("servicios", id, nombre)
+        return ids
+
     def establecer_precios(self, precios, db):
-        pass
+        """Cambia el precio de los servicios {nombre: precio} y devuelve los ids modificados"""
+        for nombre, precio in precios.items():
+            if not isinstance(precio, (int, float)) or precio < 0:
+                raise DatosInvalidos(f"Precio inválido para {nombre}")
+
+        try:
+            cursor = db.conn.cursor()
+            ids = []
+            for nombre, precio in precios.items():
+                cursor.execute("SELECT id FROM Servicio WHERE nombre = ?", (nombre,))
+                fila = cursor.fetchone()
+                if not fila:
+                    raise NoEncontrado(f"No existe un servicio llamado {nombre}")
+                cursor.execute("UPDATE Servicio SET precio = ? WHERE id = ?", (precio, fila[0]))
+                ids.append(fila[0])
+            db.conn.commit()
+            return ids
+        except NoEncontrado:
+            db.conn.rollback()
+            raise
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def generar_reportes(self, tipo, db):
         pass
@@ -101,12 +213,10 @@ class Recepcionista:
     
     def registrar_animal(self, animal, db):
         if not animal or not isinstance(animal, Animal):
-            messagebox.showerror("Error", "Datos del animal inválidos")
-            return False
+            raise DatosInvalidos("Datos del animal inválidos")
             
         if not animal.nombre or not isinstance(animal.nombre, str):
-            messagebox.showerror("Error", "Nombre del animal es requerido")
-            return False
+            raise DatosInvalidos("Nombre del animal es requerido")
             
         try:
             cursor = db.conn.cursor()
@@ -115,28 +225,25 @@ class Recepcionista:
                 (animal.nombre, animal.especie, animal.raza, animal.fecha_nacimiento)
             )
             db.conn.commit()
-            return True
+            animal.id = cursor.lastrowid
+            return animal.id
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def actualizar_datos_animal(self, animal, db):
         if not animal or not isinstance(animal, Animal):
-            messagebox.showerror("Error", "Datos del animal inválidos")
-            return False
+            raise DatosInvalidos("Datos del animal inválidos")
         
         if not animal.id or not isinstance(animal.id, int):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return False
+            raise DatosInvalidos("ID de animal inválido")
         
         try:
             cursor = db.conn.cursor()
             # Verificar que el animal existe
             cursor.execute("SELECT id FROM Animal WHERE id = ?", (animal.id,))
             if not cursor.fetchone():
-                messagebox.showerror("Error", f"No existe un animal con ID {animal.id}")
-                return False
+                raise NoEncontrado(f"No existe un animal con ID {animal.id}")
             
             cursor.execute(
                 """UPDATE Animal 
@@ -148,38 +255,120 @@ class Recepcionista:
             return True
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+    
+    def obtener_animal(self, animal_id, db):
+        try:
+            animal_id = int(animal_id)
+        except (ValueError, TypeError):
+            raise DatosInvalidos("ID de animal inválido")
+        
+        try:
+            cursor = db.conn.cursor()
+            cursor.execute("SELECT id, nombre, especie, raza, fecha_nacimiento FROM Animal WHERE id = ?",
+                           (animal_id,))
+            fila = cursor.fetchone()
+        except sqlite3.Error as e:
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+        if fila is None:
+            raise NoEncontrado(f"No existe un animal con ID {animal_id}")
+        return Animal(*fila)
     
     def administrar_cita(self, cita_id, accion, db):
         pass
     
     def enviar_recordatorio(self, cita_id, medio, db):
-        pass
+        """Deja el recordatorio de la cita en la bandeja de salida; lo envía el
+        DespachadorRecordatorios. Encolar dos veces la misma cita no lo duplica"""
+        try:
+            cita_id = int(cita_id)
+        except (ValueError, TypeError):
+            raise DatosInvalidos("ID de cita inválido")
+        
+        try:
+            cursor = db.conn.cursor()
+            cursor.execute(
+                f"""INSERT OR IGNORE INTO Recordatorio (clave, cita_id, medio, destino, mensaje)
+                {Database.RECORDATORIOS_DE_CITAS}
+                WHERE c.id = ?
+                LIMIT 1""",
+                (medio, medio, cita_id)
+            )
+            db.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+    
+    def citas_para_recordar(self, db, dias=1):
+        """Citas (id, animal, teléfono, fecha) de dentro de `dias` días. Si el
+        animal tiene varios propietarios se usa el teléfono de uno de ellos"""
+        try:
+            cursor = db.conn.cursor()
+            # Un propietario por cita con una búsqueda por animal_id; con un JOIN y
+            # GROUP BY c.id SQLite recorría entera Propietario_Animal
+            cursor.execute("""
+            SELECT c.id, a.nombre, p.telefono, c.fecha 
+            FROM Cita c
+            JOIN Animal a ON c.animal_id = a.id
+            JOIN Propietario p ON p.id = (
+                SELECT pa.propietario_id FROM Propietario_Animal pa WHERE pa.animal_id = c.animal_id LIMIT 1)
+            WHERE c.fecha >= date('now', ?) AND c.fecha < date('now', ?)
+            ORDER BY c.fecha, c.id
+            """, (f"+{dias} day", f"+{dias + 1} day"))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+    
+    def encolar_recordatorios(self, medio, db, dias=1):
+        """Encola de una vez los recordatorios de todas las citas dentro de `dias` días.
+        Devuelve cuántos recordatorios nuevos se encolaron"""
+        try:
+            cursor = db.conn.cursor()
+            cursor.execute(
+                f"""INSERT OR IGNORE INTO Recordatorio (clave, cita_id, medio, destino, mensaje)
+                {Database.RECORDATORIOS_DE_CITAS}
+                WHERE c.fecha >= date('now', ?) AND c.fecha < date('now', ?)""",
+                (medio, medio, f"+{dias} day", f"+{dias + 1} day")
+            )
+            db.conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def registrar_pago(self, cita_id, monto, estado, db):
         if not cita_id or not isinstance(cita_id, int):
-            messagebox.showerror("Error", "ID de cita inválido")
-            return False
+            raise DatosInvalidos("ID de cita inválido")
             
         if not monto or not isinstance(monto, (int, float)) or monto <= 0:
-            messagebox.showerror("Error", "Monto inválido")
-            return False
+            raise DatosInvalidos("Monto inválido")
             
         try:
             cursor = db.conn.cursor()
+            cursor.execute("SELECT 1 FROM Cita WHERE id = ?", (cita_id,))
+            if not cursor.fetchone():
+                raise NoEncontrado(f"No existe una cita con ID {cita_id}")
             cursor.execute(
                 "INSERT INTO Pago (monto, fecha, estado, cita_id) VALUES (?, date('now'), ?, ?)",
                 (monto, estado, cita_id)
             )
             db.conn.commit()
-            return True
+            return cursor.lastrowid
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
 
 class Veterinario:
+    # Días que una vacuna vencida sigue apareciendo en las alertas
+    DIAS_ATRASO_ALERTA = 30
+    
+    # Solo cuenta la última dosis de cada vacuna del animal; las anteriores ya se renovaron
+    DOSIS_VIGENTE = """NOT EXISTS (
+        SELECT 1 FROM Vacuna r
+        WHERE r.animal_id = v.animal_id AND r.vacuna = v.vacuna
+        AND (r.fecha, r.id) > (v.fecha, v.id))"""
+    
     def __init__(self, id=None, nombre=None, email=None, password=None):
         self.id = id
         self.nombre = nombre
@@ -190,63 +379,79 @@ class Veterinario:
         """Hashea la contraseña usando SHA-256"""
         return hashlib.sha256(password.encode()).hexdigest()
     
-    def buscar_historial(self, animal_id, db):
+    def linea_temporal(self, animal_id, db, limite=50, despues_de=None):
+        """Devuelve una página de la historia del animal, citas e historial médico
+        mezclados y ordenados por fecha descendente, junto con la clave para pedir
+        la siguiente página (None si no hay más). Cada fila es
+        (fecha, origen, id, tipo_o_servicio, descripcion_o_motivo, tratamiento, veterinario)"""
         try:
             animal_id = int(animal_id)
         except (ValueError, TypeError):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return None
+            raise DatosInvalidos("ID de animal inválido")
+        
+        # Paginación por clave (fecha, orden, id): cada página es un recorrido por índice
+        condicion_historial = condicion_cita = ""
+        parametros_historial = [animal_id]
+        parametros_cita = [animal_id]
+        if despues_de:
+            condicion_historial = "AND (h.fecha, 1, h.id) < (?, ?, ?)"
+            condicion_cita = "AND (c.fecha, 0, c.id) < (?, ?, ?)"
+            parametros_historial.extend(despues_de)
+            parametros_cita.extend(despues_de)
         
         try:
             cursor = db.conn.cursor()
-            # Primero verificar que el animal existe
-            cursor.execute("SELECT id FROM Animal WHERE id = ?", (animal_id,))
-            if not cursor.fetchone():
-                messagebox.showerror("Error", f"No existe un animal con ID {animal_id}")
-                return None
-            
-            cursor.execute(
-                "SELECT fecha, tipo, descripcion, tratamiento FROM HistorialMedico WHERE animal_id = ? ORDER BY fecha DESC",
-                (animal_id,)
-            )
-            historial_medico=cursor.fetchall()
-        
             cursor.execute(
-                """SELECT c.fecha, s.nombre, c.motivo, v.nombre 
-                FROM Cita c
-                JOIN Servicio s ON c.servicio_id = s.id
-                JOIN Veterinario v ON c.veterinario_id = v.id
-                WHERE c.animal_id = ?
-                ORDER BY c.fecha DESC""",
-                (animal_id,)
+                f"""SELECT fecha, orden, id, titulo, texto, tratamiento, veterinario FROM (
+                    SELECT h.fecha, 1 AS orden, h.id, h.tipo AS titulo, h.descripcion AS texto,
+                           h.tratamiento, NULL AS veterinario
+                    FROM HistorialMedico h
+                    WHERE h.animal_id = ? {condicion_historial}
+                    UNION ALL
+                    SELECT c.fecha, 0, c.id, s.nombre, c.motivo, NULL, v.nombre
+                    FROM Cita c
+                    JOIN Servicio s ON c.servicio_id = s.id
+                    JOIN Veterinario v ON c.veterinario_id = v.id
+                    WHERE c.animal_id = ? {condicion_cita}
+                )
+                ORDER BY fecha DESC, orden DESC, id DESC
+                LIMIT ?""",
+                (*parametros_historial, *parametros_cita, limite)
             )
-            citas = cursor.fetchall()
-            
-            return {
-                'historial_medico': historial_medico,
-                'citas': citas
-            }
+            filas = cursor.fetchall()
         except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return None
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+        
+        siguiente = filas[-1][:3] if len(filas) == limite else None
+        registros = [
+            (fecha, "Cita" if orden == 0 else "Historial", id, titulo, texto, tratamiento, veterinario)
+            for fecha, orden, id, titulo, texto, tratamiento, veterinario in filas
+        ]
+        return registros, siguiente
+    
+    def iterar_linea_temporal(self, animal_id, db, tamano_pagina=200):
+        """Recorre toda la historia del animal pidiendo páginas bajo demanda"""
+        registros, siguiente = self.linea_temporal(animal_id, db, tamano_pagina)
+        while registros:
+            yield from registros
+            if siguiente is None:
+                return
+            registros, siguiente = self.linea_temporal(animal_id, db, tamano_pagina, siguiente)
     
     def registrar_tratamiento(self, animal_id, tipo, descripcion, tratamiento, db):
         try:
             animal_id = int(animal_id)
         except (ValueError, TypeError):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return False
+            raise DatosInvalidos("ID de animal inválido")
         
         if not tipo or not isinstance(tipo, str):
-            messagebox.showerror("Error", "Tipo de tratamiento inválido")
-            return False
+            raise DatosInvalidos("Tipo de tratamiento inválido")
         
         try:
             cursor = db.conn.cursor()
             cursor.execute("SELECT id FROM Animal WHERE id = ?", (animal_id,))
             if not cursor.fetchone():
-                messagebox.showerror("Error", f"No existe un animal con ID {animal_id}")
-                return False
+                raise NoEncontrado(f"No existe un animal con ID {animal_id}")
             
             cursor.execute(
                 """INSERT INTO HistorialMedico 
@@ -255,20 +460,24 @@ class Veterinario:
                 (tipo, descripcion, tratamiento, animal_id, self.id)
             )
             db.conn.commit()
-            return True
+            return cursor.lastrowid
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def registrar_vacuna(self, animal_id, vacuna, proxima_aplicacion, db):
+        """Anota la vacunación en el historial y en Vacuna. Devuelve el id de la
+        entrada de HistorialMedico"""
         if not animal_id or not isinstance(animal_id, int):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return False
+            raise DatosInvalidos("ID de animal inválido")
             
         if not vacuna or not isinstance(vacuna, str):
-            messagebox.showerror("Error", "Tipo de vacuna inválido")
-            return False
+            raise DatosInvalidos("Tipo de vacuna inválido")
+            
+        try:
+            datetime.strptime(proxima_aplicacion, "%Y-%m-%d")
+        except (ValueError, TypeError):
+            raise DatosInvalidos("Formato de fecha inválido. Use YYYY-MM-DD")
             
         try:
             descripcion = f"Vacuna: {vacuna}\nPróxima aplicación: {proxima_aplicacion}"
@@ -279,37 +488,72 @@ class Veterinario:
                 VALUES (date('now'), 'Vacunación', ?, ?, ?)""",
                 (descripcion, animal_id, self.id)
             )
+            historial_id = cursor.lastrowid
+            cursor.execute(
+                """INSERT INTO Vacuna 
+                (historial_id, vacuna, fecha, proxima_aplicacion, animal_id, veterinario_id)
+                VALUES (?, ?, date('now'), ?, ?, ?)""",
+                (historial_id, vacuna, proxima_aplicacion, animal_id, self.id)
+            )
             db.conn.commit()
-            return True
+            return historial_id
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def generar_alerta_vacuna(self, animal_id, db):
         if not animal_id or not isinstance(animal_id, int):
-            messagebox.showerror("Error", "ID de animal inválido")
-            return []
+            raise DatosInvalidos("ID de animal inválido")
             
         try:
             cursor = db.conn.cursor()
             cursor.execute(
-                """SELECT a.id, a.nombre, hm.descripcion 
-                FROM Animal a
-                JOIN HistorialMedico hm ON a.id = hm.animal_id
-                WHERE hm.tipo = 'Vacunación' 
-                AND hm.descripcion LIKE '%Próxima aplicación%'
-                AND date(substr(hm.descripcion, instr(hm.descripcion, 'Próxima aplicación: ') + 19, 10)) <= date('now', '+7 day')
-                AND a.id = ?""",
-                (animal_id,)
+                f"""SELECT a.id, a.nombre, 
+                       'Vacuna: ' || v.vacuna || char(10) || 'Próxima aplicación: ' || v.proxima_aplicacion
+                FROM Vacuna v
+                JOIN Animal a ON a.id = v.animal_id
+                WHERE v.animal_id = ?
+                AND v.proxima_aplicacion BETWEEN date('now', ?) AND date('now', '+7 day')
+                AND {self.DOSIS_VIGENTE}""",
+                (animal_id, f"-{self.DIAS_ATRASO_ALERTA} day")
             )
             return cursor.fetchall()
         except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return []
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+    
+    def alertas_vacunas(self, db, dias=7, limite=50, desplazamiento=0, atraso=None):
+        """Devuelve una página de alertas (vacuna_id, animal_id, nombre, vacuna, proxima_aplicacion)
+        de la última dosis de cada vacuna que toca aplicar en los próximos `dias` días
+        o que venció hace como mucho `atraso` días (DIAS_ATRASO_ALERTA por defecto)"""
+        atraso = self.DIAS_ATRASO_ALERTA if atraso is None else atraso
+        if not isinstance(dias, int) or dias < 0:
+            raise DatosInvalidos("Ventana de días inválida")
+        if not isinstance(atraso, int) or atraso < 0:
+            raise DatosInvalidos("Días de atraso inválidos")
+        
+        try:
+            cursor = db.conn.cursor()
+            # Recorrido por rango acotado sobre el índice de proxima_aplicacion;
+            # las dosis renovadas se descartan con una búsqueda en idx_vacuna_dosis
+            cursor.execute(
+                f"""SELECT v.id, v.animal_id, a.nombre, v.vacuna, v.proxima_aplicacion
+                FROM Vacuna v
+                JOIN Animal a ON a.id = v.animal_id
+                WHERE v.proxima_aplicacion BETWEEN date('now', ?) AND date('now', ?)
+                AND {self.DOSIS_VIGENTE}
+                ORDER BY v.proxima_aplicacion, v.animal_id, v.id
+                LIMIT ? OFFSET ?""",
+                (f"-{atraso} day", f"+{dias} day", limite, desplazamiento)
+            )
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
 
 class Cita:
-    def __init__(self, id=None, fecha=None, motivo=None, estado_pago=None, animal_id=None, veterinario_id=None, servicio_id=None):
+    FORMATO_FECHA = "%Y-%m-%d %H:%M"
+    DURACION_MINUTOS = 30
+    
+    def __init__(self, id=None, fecha=None, motivo=None, estado_pago=None, animal_id=None, veterinario_id=None, servicio_id=None, duracion=DURACION_MINUTOS):
         self.id = id
         self.fecha = fecha
         self.motivo = motivo
@@ -317,11 +561,17 @@ class Cita:
         self.animal_id = animal_id
         self.veterinario_id = veterinario_id
         self.servicio_id = servicio_id
+        self.duracion = duracion
     
     def programar_cita(self, db):
         if not self.fecha or not self.motivo or not self.animal_id or not self.veterinario_id or not self.servicio_id:
-            messagebox.showerror("Error", "Todos los campos de la cita son requeridos")
-            return False
+            raise DatosInvalidos("Todos los campos de la cita son requeridos")
+        
+        try:
+            inicio = datetime.strptime(self.fecha, self.FORMATO_FECHA)
+        except (ValueError, TypeError):
+            raise DatosInvalidos("Formato de fecha inválido. Use YYYY-MM-DD HH:MM")
+        fin = inicio + timedelta(minutes=self.duracion)
             
         try:
             cursor = db.conn.cursor()
@@ -329,29 +579,42 @@ class Cita:
                 """INSERT INTO Cita 
                 (fecha, motivo, animal_id, veterinario_id, servicio_id)
                 VALUES (?, ?, ?, ?, ?)""",
-                (self.fecha, self.motivo, self.animal_id, self.veterinario_id, self.servicio_id)
+                (inicio.strftime(self.FORMATO_FECHA), self.motivo, self.animal_id, self.veterinario_id, self.servicio_id)
+            )
+            # El trigger de AgendaVeterinario rechaza la cita si se solapa con otra
+            cursor.execute(
+                "INSERT INTO AgendaVeterinario (cita_id, veterinario_id, inicio, fin) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, self.veterinario_id,
+                 inicio.strftime(self.FORMATO_FECHA), fin.strftime(self.FORMATO_FECHA))
             )
             db.conn.commit()
-            return True
+            self.id = cursor.lastrowid
+            return self.id
+        except sqlite3.IntegrityError as e:
+            db.conn.rollback()
+            if "Conflicto de agenda" in str(e):
+                raise ConflictoAgenda("El veterinario ya tiene una cita en ese horario") from e
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
     
     def cancelar_cita(self, db):
         if not self.id or not isinstance(self.id, int):
-            messagebox.showerror("Error", "ID de cita inválido")
-            return False
+            raise DatosInvalidos("ID de cita inválido")
             
         try:
             cursor = db.conn.cursor()
+            # Borrar una cita pagada dejaría su pago sin servicio ni veterinario
+            cursor.execute("SELECT 1 FROM Pago WHERE cita_id = ? LIMIT 1", (self.id,))
+            if cursor.fetchone():
+                raise DatosInvalidos(f"La cita {self.id} ya está pagada y no se puede cancelar")
             cursor.execute("DELETE FROM Cita WHERE id = ?", (self.id,))
             db.conn.commit()
             return True
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
 
 class HistorialMedico:
     def __init__(self, id=None, fecha=None, tipo=None, descripcion=None, tratamiento=None, animal_id=None, veterinario_id=None):
@@ -365,38 +628,629 @@ class HistorialMedico:
     
     def registrar_pago(self, cita_id, monto, db):
         if not cita_id or not isinstance(cita_id, int):
-            messagebox.showerror("Error", "ID de cita inválido")
-            return False
+            raise DatosInvalidos("ID de cita inválido")
             
         if not monto or not isinstance(monto, (int, float)) or monto <= 0:
-            messagebox.showerror("Error", "Monto inválido")
-            return False
+            raise DatosInvalidos("Monto inválido")
             
         try:
             cursor = db.conn.cursor()
+            cursor.execute("SELECT 1 FROM Cita WHERE id = ?", (cita_id,))
+            if not cursor.fetchone():
+                raise NoEncontrado(f"No existe una cita con ID {cita_id}")
             cursor.execute(
                 "INSERT INTO Pago (monto, fecha, cita_id) VALUES (?, date('now'), ?)",
                 (monto, cita_id)
             )
             db.conn.commit()
-            return True
+            return cursor.lastrowid
         except sqlite3.Error as e:
             db.conn.rollback()
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
-            return False
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
 
 # ====================== BASE DE DATOS ======================
 
+class CacheCatalogos:
+    """Listas (id, nombre) para los combobox, leídas una sola vez de la base de datos.
+    Solo las tablas pequeñas: animales y propietarios se buscan con SelectorAnimal"""
+    CONSULTAS = {
+        "veterinarios": "SELECT id, nombre FROM Veterinario",
+        "servicios": "SELECT id, nombre FROM Servicio"
+    }
+    
+    def __init__(self, db):
+        self.db = db
+        self.catalogos = {}
+        # Las escrituras pueden llegar desde los hilos del EjecutorBD
+        self.bloqueo = threading.Lock()
+    
+    def obtener(self, catalogo):
+        with self.bloqueo:
+            if catalogo not in self.catalogos:
+                cursor = self.db.conn.cursor()
+                cursor.execute(self.CONSULTAS[catalogo])
+                self.catalogos[catalogo] = cursor.fetchall()
+            return list(self.catalogos[catalogo])
+    
+    def opciones(self, catalogo):
+        return [f"{id} - {nombre}" for id, nombre in self.obtener(catalogo)]
+    
+    def agregar(self, catalogo, id, nombre):
+        # Si aún no se ha cargado, la próxima lectura ya incluirá el registro
+        with self.bloqueo:
+            if catalogo in self.catalogos:
+                self.catalogos[catalogo].append((id, nombre))
+    
+    def actualizar(self, catalogo, id, nombre):
+        with self.bloqueo:
+            if catalogo in self.catalogos:
+                self.catalogos[catalogo] = [
+                    (id_actual, nombre if id_actual == id else nombre_actual)
+                    for id_actual, nombre_actual in self.catalogos[catalogo]
+                ]
+    
+    def invalidar(self, catalogo=None):
+        with self.bloqueo:
+            if catalogo is None:
+                self.catalogos.clear()
+            else:
+                self.catalogos.pop(catalogo, None)
+
+class MonitorSQL:
+    """Estadísticas de las sentencias SQL de una o varias conexiones medidas:
+    llamadas, tiempo (execute más fetch), filas, histograma de latencias y las
+    últimas muestras para los percentiles. Las sentencias que superan
+    UMBRAL_LENTO_MS se añaden a RUTA_LENTAS. De cada sentencia guarda también
+    los últimos parámetros, solo en memoria, para revisar su plan"""
+    UMBRAL_LENTO_MS = 50
+    RUTA_LENTAS = "consultas_lentas.log"
+    # Límites superiores (ms) de las cubetas del histograma; la última no tiene límite
+    CUBETAS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+    MUESTRAS_RECIENTES = 500
+    
+    def __init__(self, umbral_lento_ms=None, ruta_lentas=None):
+        self.umbral_lento_ms = self.UMBRAL_LENTO_MS if umbral_lento_ms is None else umbral_lento_ms
+        self.ruta_lentas = ruta_lentas or self.RUTA_LENTAS
+        self.bloqueo = threading.Lock()
+        self.consultas = {}
+    
+    def registrar(self, sql, milisegundos, filas, origen, parametros=None):
+        consulta = " ".join(sql.split())
+        with self.bloqueo:
+            datos = self.consultas.get(consulta)
+            if datos is None:
+                datos = self.consultas[consulta] = {
+                    "llamadas": 0, "total_ms": 0.0, "maximo_ms": 0.0, "filas": 0,
+                    "cubetas": [0] * (len(self.CUBETAS_MS) + 1),
+                    "recientes": deque(maxlen=self.MUESTRAS_RECIENTES), "origenes": set(),
+                    "parametros": None
+                }
+            datos["llamadas"] += 1
+            if parametros is not None:
+                datos["parametros"] = parametros
+            datos["total_ms"] += milisegundos
+            datos["maximo_ms"] = max(datos["maximo_ms"], milisegundos)
+            datos["filas"] += max(filas, 0)
+            datos["cubetas"][sum(milisegundos > limite for limite in self.CUBETAS_MS)] += 1
+            datos["recientes"].append(milisegundos)
+            if len(datos["origenes"]) < 5:
+                datos["origenes"].add(origen)
+        
+        if milisegundos >= self.umbral_lento_ms:
+            with self.bloqueo, open(self.ruta_lentas, "a", encoding="utf-8") as f:
+                f.write(f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{milisegundos:.1f} ms\t"
+                        f"{filas} filas\t{origen}\t{consulta}\n")
+    
+    def resumen(self, orden="total_ms"):
+        """Filas (consulta, llamadas, total_ms, media_ms, p95_ms, maximo_ms, filas,
+        origenes, cubetas) ordenadas de mayor a menor por `orden`"""
+        with self.bloqueo:
+            filas = []
+            for consulta, datos in self.consultas.items():
+                recientes = sorted(datos["recientes"])
+                filas.append({
+                    "consulta": consulta,
+                    "llamadas": datos["llamadas"],
+                    "total_ms": datos["total_ms"],
+                    "media_ms": datos["total_ms"] / datos["llamadas"],
+                    "p95_ms": recientes[max(0, int(len(recientes) * 0.95) - 1)],
+                    "maximo_ms": datos["maximo_ms"],
+                    "filas": datos["filas"],
+                    "origenes": sorted(datos["origenes"]),
+                    "cubetas": list(datos["cubetas"])
+                })
+        return sorted(filas, key=lambda fila: fila[orden], reverse=True)
+    
+    def sentencias(self):
+        """(consulta, últimos parámetros) de cada sentencia registrada"""
+        with self.bloqueo:
+            return [(consulta, datos["parametros"]) for consulta, datos in self.consultas.items()]
+    
+    def reiniciar(self):
+        with self.bloqueo:
+            self.consultas.clear()
+    
+    def guardar(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"cubetas_ms": self.CUBETAS_MS, "consultas": self.resumen()}, f,
+                      ensure_ascii=False, indent=1)
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia en el MonitorSQL de su conexión. El tiempo de
+    los fetch se suma a la sentencia; se registra al agotar el resultado, al
+    ejecutar otra sentencia o al liberar el cursor"""
+    pendiente = None
+    
+    def medir(self, operacion, *args):
+        inicio = time.perf_counter()
+        try:
+            return operacion(*args)
+        finally:
+            if self.pendiente is not None:
+                self.pendiente[1] += (time.perf_counter() - inicio) * 1000
+    
+    def empezar(self, sql, parametros):
+        self.terminar()
+        # Primer marco fuera de este módulo de medición: quién ejecutó la sentencia
+        marco = sys._getframe(2)
+        while marco.f_code.co_name in ("execute", "executemany") and marco.f_back:
+            marco = marco.f_back
+        self.pendiente = [sql, 0.0, 0, f"{marco.f_code.co_name}:{marco.f_lineno}", parametros]
+    
+    def terminar(self):
+        if self.pendiente is not None:
+            sql, milisegundos, filas, origen, parametros = self.pendiente
+            self.pendiente = None
+            if self.rowcount > 0 and not filas:
+                filas = self.rowcount
+            self.connection.monitor.registrar(sql, milisegundos, filas, origen, parametros)
+    
+    def execute(self, sql, parametros=()):
+        self.empezar(sql, parametros)
+        return self.medir(super().execute, sql, parametros)
+    
+    def executemany(self, sql, parametros):
+        # De un generador no se puede guardar una muestra sin consumirlo
+        self.empezar(sql, parametros[0] if isinstance(parametros, (list, tuple)) and parametros else None)
+        return self.medir(super().executemany, sql, parametros)
+    
+    def fetchone(self):
+        fila = self.medir(super().fetchone)
+        if self.pendiente is not None:
+            if fila is None:
+                self.terminar()
+            else:
+                self.pendiente[2] += 1
+        return fila
+    
+    def fetchmany(self, size=None):
+        filas = self.medir(super().fetchmany, size or self.arraysize)
+        if self.pendiente is not None:
+            self.pendiente[2] += len(filas)
+            if len(filas) < (size or self.arraysize):
+                self.terminar()
+        return filas
+    
+    def fetchall(self):
+        filas = self.medir(super().fetchall)
+        if self.pendiente is not None:
+            self.pendiente[2] += len(filas)
+            self.terminar()
+        return filas
+    
+    def __next__(self):
+        try:
+            fila = self.medir(super().__next__)
+        except StopIteration:
+            self.terminar()
+            raise
+        if self.pendiente is not None:
+            self.pendiente[2] += 1
+        return fila
+    
+    def close(self):
+        self.terminar()
+        super().close()
+    
+    def __del__(self):
+        try:
+            self.terminar()
+        except Exception:
+            pass  # p. ej. al cerrar el intérprete
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores, incluidos los de conn.execute, son CursorMedido.
+    También mide los commit, que es donde se paga la escritura a disco"""
+    monitor = None
+    
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+    
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+    
+    def commit(self):
+        inicio = time.perf_counter()
+        super().commit()
+        marco = sys._getframe(1)
+        self.monitor.registrar("COMMIT", (time.perf_counter() - inicio) * 1000, 0,
+                               f"{marco.f_code.co_name}:{marco.f_lineno}")
+
 class Database:
-    def __init__(self):
+    # PRAGMAs aplicados a cada conexión. WAL permite leer mientras otro puesto escribe
+    # y, con synchronous=NORMAL, cada commit deja de esperar a un fsync completo
+    PERFIL_CONEXION = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negativo: en KiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000  # ms de espera ante un bloqueo de escritura
+    }
+    
+    # Cada paso del esquema tiene una versión; la última aplicada se guarda en PRAGMA user_version
+    VERSION_VACUNAS = 1
+    
+    # Versión del conjunto de índices
+    VERSION_INDICES = 3
+    
+    INDICES = [
+        "CREATE INDEX IF NOT EXISTS idx_cita_animal ON Cita(animal_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_cita_fecha ON Cita(fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_cita_veterinario ON Cita(veterinario_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_historial_animal ON HistorialMedico(animal_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_pago_cita ON Pago(cita_id)",
+        "CREATE INDEX IF NOT EXISTS idx_pago_fecha ON Pago(fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_propietario_animal_animal ON Propietario_Animal(animal_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vacuna_proxima ON Vacuna(proxima_aplicacion)",
+        "CREATE INDEX IF NOT EXISTS idx_vacuna_animal ON Vacuna(animal_id, proxima_aplicacion)",
+        "CREATE INDEX IF NOT EXISTS idx_animal_nombre ON Animal(nombre COLLATE NOCASE)"
+    ]
+    
+    # Índice de texto completo (FTS5) sobre la información clínica
+    VERSION_BUSQUEDA = 4
+    
+    BUSQUEDA_TEXTO = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS HistorialMedico_fts USING fts5(
+            descripcion, tratamiento,
+            content='HistorialMedico', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS Cita_fts USING fts5(
+            motivo,
+            content='Cita', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS historial_fts_ai AFTER INSERT ON HistorialMedico BEGIN
+            INSERT INTO HistorialMedico_fts(rowid, descripcion, tratamiento)
+            VALUES (new.id, new.descripcion, new.tratamiento);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS historial_fts_ad AFTER DELETE ON HistorialMedico BEGIN
+            INSERT INTO HistorialMedico_fts(HistorialMedico_fts, rowid, descripcion, tratamiento)
+            VALUES ('delete', old.id, old.descripcion, old.tratamiento);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS historial_fts_au AFTER UPDATE ON HistorialMedico BEGIN
+            INSERT INTO HistorialMedico_fts(HistorialMedico_fts, rowid, descripcion, tratamiento)
+            VALUES ('delete', old.id, old.descripcion, old.tratamiento);
+            INSERT INTO HistorialMedico_fts(rowid, descripcion, tratamiento)
+            VALUES (new.id, new.descripcion, new.tratamiento);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS cita_fts_ai AFTER INSERT ON Cita BEGIN
+            INSERT INTO Cita_fts(rowid, motivo) VALUES (new.id, new.motivo);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS cita_fts_ad AFTER DELETE ON Cita BEGIN
+            INSERT INTO Cita_fts(Cita_fts, rowid, motivo) VALUES ('delete', old.id, old.motivo);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS cita_fts_au AFTER UPDATE OF motivo ON Cita BEGIN
+            INSERT INTO Cita_fts(Cita_fts, rowid, motivo) VALUES ('delete', old.id, old.motivo);
+            INSERT INTO Cita_fts(rowid, motivo) VALUES (new.id, new.motivo);
+        END"""
+    ]
+    
+    # Resúmenes de ingresos mantenidos por triggers al insertar en Pago
+    VERSION_RESUMEN_INGRESOS = 5
+    
+    # Un pago cuya cita ya no existe (las versiones anteriores borraban la cita
+    # al cancelarla) cuenta por día y mes, pero no tiene servicio ni veterinario
+    CITA_DEL_PAGO = "EXISTS (SELECT 1 FROM Cita WHERE id = new.cita_id)"
+    
+    # (tabla, clave, expresión de la clave a partir de new.*, condición o None)
+    RESUMENES_INGRESOS = [
+        ("IngresoDiario", ("dia",), ("date(new.fecha)",), None),
+        ("IngresoMensual", ("mes",), ("strftime('%Y-%m', new.fecha)",), None),
+        ("IngresoMensualServicio", ("mes", "servicio_id"),
+         ("strftime('%Y-%m', new.fecha)", "(SELECT servicio_id FROM Cita WHERE id = new.cita_id)"),
+         CITA_DEL_PAGO),
+        ("IngresoMensualVeterinario", ("mes", "veterinario_id"),
+         ("strftime('%Y-%m', new.fecha)", "(SELECT veterinario_id FROM Cita WHERE id = new.cita_id)"),
+         CITA_DEL_PAGO)
+    ]
+    
+    # Misma agregación calculada desde Pago, para reconstruir y verificar los resúmenes
+    AGREGADOS_INGRESOS = {
+        "IngresoDiario": """SELECT date(p.fecha), SUM(p.monto), COUNT(*) FROM Pago p
+            GROUP BY 1""",
+        "IngresoMensual": """SELECT strftime('%Y-%m', p.fecha), SUM(p.monto), COUNT(*) FROM Pago p
+            GROUP BY 1""",
+        "IngresoMensualServicio": """SELECT strftime('%Y-%m', p.fecha), c.servicio_id, SUM(p.monto), COUNT(*)
+            FROM Pago p JOIN Cita c ON c.id = p.cita_id GROUP BY 1, 2""",
+        "IngresoMensualVeterinario": """SELECT strftime('%Y-%m', p.fecha), c.veterinario_id, SUM(p.monto), COUNT(*)
+            FROM Pago p JOIN Cita c ON c.id = p.cita_id GROUP BY 1, 2"""
+    }
+    
+    # Cita.estado pasa a 'pagada' al registrar su pago; los índices parciales
+    # solo contienen las citas pendientes de cobro
+    VERSION_CUENTAS_POR_COBRAR = 6
+    
+    CUENTAS_POR_COBRAR = [
+        """CREATE TRIGGER IF NOT EXISTS pago_marca_cita_ai AFTER INSERT ON Pago BEGIN
+            UPDATE Cita SET estado = 'pagada' WHERE id = new.cita_id;
+        END""",
+        "CREATE INDEX IF NOT EXISTS idx_cita_pendiente ON Cita(fecha, id) WHERE estado = 'pendiente'",
+        "CREATE INDEX IF NOT EXISTS idx_cita_pendiente_veterinario ON Cita(veterinario_id, fecha, id) WHERE estado = 'pendiente'"
+    ]
+    
+    # Agenda de cada veterinario como intervalos [inicio, fin) que no se solapan.
+    # Con esa invariante, solo la cita que empieza justo antes de `fin` puede
+    # chocar con un intervalo nuevo: la comprobación es una búsqueda en el índice
+    VERSION_AGENDA = 7
+    
+    AGENDA = [
+        """CREATE TABLE IF NOT EXISTS AgendaVeterinario (
+            cita_id INTEGER PRIMARY KEY,
+            veterinario_id INTEGER NOT NULL,
+            inicio DATETIME NOT NULL,
+            fin DATETIME NOT NULL,
+            FOREIGN KEY (cita_id) REFERENCES Cita(id),
+            FOREIGN KEY (veterinario_id) REFERENCES Veterinario(id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_agenda_veterinario ON AgendaVeterinario(veterinario_id, inicio, fin)",
+        """CREATE TRIGGER IF NOT EXISTS agenda_cita_ad AFTER DELETE ON Cita BEGIN
+            DELETE FROM AgendaVeterinario WHERE cita_id = old.id;
+        END"""
+    ]
+    
+    # Citas existentes; las que ya se solapaban se conservan tal cual
+    RELLENO_AGENDA = """INSERT OR IGNORE INTO AgendaVeterinario (cita_id, veterinario_id, inicio, fin)
+    SELECT id, veterinario_id, strftime('%Y-%m-%d %H:%M', fecha),
+           strftime('%Y-%m-%d %H:%M', fecha, '+30 minutes')
+    FROM Cita WHERE id BETWEEN ? AND ? AND strftime('%Y-%m-%d %H:%M', fecha) IS NOT NULL"""
+    
+    # Se crea después de copiar las citas existentes, que podían solaparse
+    AGENDA_CONFLICTO = """CREATE TRIGGER IF NOT EXISTS agenda_conflicto_bi BEFORE INSERT ON AgendaVeterinario
+        WHEN EXISTS (
+            SELECT 1 FROM (
+                SELECT fin FROM AgendaVeterinario
+                WHERE veterinario_id = new.veterinario_id AND inicio < new.fin
+                ORDER BY inicio DESC LIMIT 1
+            ) WHERE fin > new.inicio
+        )
+        BEGIN
+            SELECT RAISE(ABORT, 'Conflicto de agenda');
+        END"""
+    
+    # Bandeja de salida de recordatorios. La clave (cita y medio) hace idempotente el encolado
+    VERSION_RECORDATORIOS = 8
+    
+    RECORDATORIOS = [
+        """CREATE TABLE IF NOT EXISTS Recordatorio (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            clave TEXT UNIQUE NOT NULL,
+            cita_id INTEGER NOT NULL,
+            medio TEXT NOT NULL,
+            destino TEXT NOT NULL,
+            mensaje TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            proximo_intento DATETIME NOT NULL DEFAULT (datetime('now')),
+            enviado_en DATETIME,
+            error TEXT,
+            FOREIGN KEY (cita_id) REFERENCES Cita(id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_recordatorio_pendiente ON Recordatorio(proximo_intento) WHERE estado = 'pendiente'"
+    ]
+    
+    # SELECT común para encolar recordatorios; espera el medio dos veces como parámetro
+    RECORDATORIOS_DE_CITAS = """SELECT 'cita-' || c.id || '-' || ?, c.id, ?, p.telefono,
+           'Recordatorio: ' || a.nombre || ' tiene cita el ' || c.fecha
+    FROM Cita c
+    JOIN Animal a ON c.animal_id = a.id
+    JOIN Propietario_Animal pa ON a.id = pa.animal_id
+    JOIN Propietario p ON pa.propietario_id = p.id"""
+    
+    # Cuentas de acceso de todos los roles; el email identifica la cuenta y su rol.
+    # Las claves SHA-256 sin sal se copian con el prefijo 'sha256$' y se
+    # convierten a PBKDF2 en el siguiente inicio de sesión correcto
+    VERSION_USUARIOS = 9
+    
+    ROLES = ("Administrador", "Recepcionista", "Veterinario", "Propietario")
+    
+    USUARIOS = [
+        """CREATE TABLE IF NOT EXISTS Usuario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            rol TEXT NOT NULL,
+            persona_id INTEGER NOT NULL,
+            clave TEXT NOT NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_usuario_email ON Usuario(email)"
+    ] + [
+        f"""INSERT OR IGNORE INTO Usuario (email, rol, persona_id, clave)
+        SELECT lower(trim(email)), '{rol}', id, 'sha256$' || password FROM {rol}
+        WHERE email IS NOT NULL AND password != ''"""
+        for rol in ("Administrador", "Recepcionista", "Veterinario")
+    ] + [
+        # Solo se borra la contraseña de quien ya tiene cuenta; si su email lo usaba
+        # otra persona, conserva la anterior y se avisa con cuentas_sin_migrar
+        f"""UPDATE {rol} SET password = ''
+        WHERE EXISTS (SELECT 1 FROM Usuario u WHERE u.rol = '{rol}' AND u.persona_id = {rol}.id)"""
+        for rol in ("Administrador", "Recepcionista", "Veterinario")
+    ]
+    
+    # Los propietarios entraban sin contraseña. Reciben una cuenta pendiente de
+    # activar: la primera vez eligen su contraseña con un código que les da recepción
+    VERSION_CUENTAS_PROPIETARIOS = 12
+    
+    CLAVE_PENDIENTE = "pendiente$"
+    
+    CUENTAS_PROPIETARIOS = [
+        f"""INSERT OR IGNORE INTO Usuario (email, rol, persona_id, clave)
+        SELECT lower(trim(email)), 'Propietario', id, '{CLAVE_PENDIENTE}' FROM Propietario
+        WHERE email IS NOT NULL AND trim(email) != ''"""
+    ]
+    
+    # Los propietarios dados de alta después (formulario, importación) también
+    # reciben su cuenta pendiente, y la recibe quien añade un email más tarde
+    VERSION_ALTAS_PROPIETARIOS = 14
+    
+    ALTAS_PROPIETARIOS = [
+        # La cuenta de una persona se busca por rol y persona_id (código de activación, triggers)
+        "CREATE INDEX IF NOT EXISTS idx_usuario_persona ON Usuario(rol, persona_id)",
+        f"""CREATE TRIGGER IF NOT EXISTS propietario_cuenta_ai AFTER INSERT ON Propietario
+        WHEN new.email IS NOT NULL AND trim(new.email) != ''
+        BEGIN
+            INSERT OR IGNORE INTO Usuario (email, rol, persona_id, clave)
+            VALUES (lower(trim(new.email)), 'Propietario', new.id, '{CLAVE_PENDIENTE}');
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS propietario_cuenta_au AFTER UPDATE OF email ON Propietario
+        WHEN new.email IS NOT NULL AND trim(new.email) != ''
+        AND NOT EXISTS (SELECT 1 FROM Usuario WHERE rol = 'Propietario' AND persona_id = new.id)
+        BEGIN
+            INSERT OR IGNORE INTO Usuario (email, rol, persona_id, clave)
+            VALUES (lower(trim(new.email)), 'Propietario', new.id, '{CLAVE_PENDIENTE}');
+        END"""
+    ]
+    
+    # Caracteres de los códigos de activación: sin 0/O ni 1/I para dictarlos sin dudas
+    ALFABETO_CODIGO = "23456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+    LONGITUD_CODIGO = 8
+    
+    # Los triggers de ingresos por servicio y veterinario de la versión 5 fallaban
+    # con un pago de una cita borrada; se recrean con la condición CITA_DEL_PAGO
+    VERSION_PAGOS_SIN_CITA = 13
+    
+    # Copia a Vacuna las vacunaciones de HistorialMedico con ids entre dos parámetros
+    VACUNAS_DESDE_HISTORIAL = """INSERT INTO Vacuna (historial_id, vacuna, fecha, proxima_aplicacion, animal_id, veterinario_id)
+    SELECT hm.id,
+           substr(hm.descripcion, 9, instr(hm.descripcion, char(10)) - 9),
+           hm.fecha,
+           date(substr(hm.descripcion, instr(hm.descripcion, 'Próxima aplicación: ') + 20, 10)),
+           hm.animal_id,
+           hm.veterinario_id
+    FROM HistorialMedico hm
+    WHERE hm.id BETWEEN ? AND ?
+    AND hm.tipo = 'Vacunación'
+    AND hm.descripcion LIKE 'Vacuna: %' || char(10) || 'Próxima aplicación: %'
+    AND NOT EXISTS (SELECT 1 FROM Vacuna v WHERE v.historial_id = hm.id)"""
+    
+    # Índice para saber si una dosis es la última de su vacuna en el animal
+    VERSION_DOSIS_VACUNA = 10
+    
+    DOSIS_VACUNA = ["CREATE INDEX IF NOT EXISTS idx_vacuna_dosis ON Vacuna(animal_id, vacuna, fecha, id)"]
+    
+    # Búsqueda de propietarios por prefijo del nombre
+    VERSION_BUSQUEDA_PROPIETARIOS = 11
+    
+    BUSQUEDA_PROPIETARIOS = ["CREATE INDEX IF NOT EXISTS idx_propietario_nombre ON Propietario(nombre COLLATE NOCASE)"]
+    
+    # Pasos del esquema en orden: (versión, descripción, método)
+    MIGRACIONES = [
+        (VERSION_VACUNAS, "vacunas en tabla propia", "migrar_vacunas"),
+        (VERSION_INDICES, "índices secundarios", "crear_indices"),
+        (VERSION_BUSQUEDA, "búsqueda de texto", "crear_busqueda_texto"),
+        (VERSION_RESUMEN_INGRESOS, "resumen de ingresos", "crear_resumen_ingresos"),
+        (VERSION_CUENTAS_POR_COBRAR, "cuentas por cobrar", "crear_cuentas_por_cobrar"),
+        (VERSION_AGENDA, "agenda de veterinarios", "crear_agenda"),
+        (VERSION_RECORDATORIOS, "bandeja de recordatorios", "crear_recordatorios"),
+        (VERSION_USUARIOS, "cuentas de usuario", "crear_usuarios"),
+        (VERSION_DOSIS_VACUNA, "última dosis de cada vacuna", "crear_indice_dosis"),
+        (VERSION_BUSQUEDA_PROPIETARIOS, "búsqueda de propietarios", "crear_busqueda_propietarios"),
+        (VERSION_CUENTAS_PROPIETARIOS, "cuentas de propietarios", "crear_cuentas_propietarios"),
+        (VERSION_PAGOS_SIN_CITA, "pagos de citas borradas", "corregir_resumen_ingresos"),
+        (VERSION_ALTAS_PROPIETARIOS, "cuentas de propietarios nuevos", "crear_altas_propietarios")
+    ]
+    
+    # Última versión que alcanza preparar_esquema
+    VERSION_ESQUEMA = MIGRACIONES[-1][0]
+    
+    # Los rellenos de tablas grandes se confirman por tramos de ids, para que los
+    # demás puestos puedan escribir entre un tramo y el siguiente
+    TAMANO_LOTE_MIGRACION = 5000
+    PAUSA_LOTE_SEGUNDOS = 0.01
+    
+    # Horario en que se ofrecen huecos libres
+    HORA_APERTURA = 9
+    HORA_CIERRE = 18
+    
+    # Tablas que crecen con el uso: en ellas no se admite un SCAN completo
+    TABLAS_GRANDES = ("Animal", "Cita", "Pago", "HistorialMedico", "Vacuna", "Propietario_Animal",
+                      "AgendaVeterinario", "Recordatorio", "Usuario")
+    # Sentencias cuyo plan revisa verificar_planes
+    SENTENCIAS_CON_PLAN = ("SELECT", "WITH", "INSERT", "REPLACE", "UPDATE", "DELETE")
+    
+    def __init__(self, ruta="veterinaria.db", inicializar=True, catalogos=None, perfil=None, sembrar=True,
+                 monitor=None):
+        """Con inicializar=False solo abre la conexión (p. ej. en los hilos del
+        EjecutorBD, que comparten la caché de catálogos de la conexión principal).
+        `perfil` sustituye a PERFIL_CONEXION; un diccionario vacío deja los valores de SQLite.
+        Con sembrar=False los datos de prueba quedan para una llamada posterior
+        a insertar_datos_prueba. Con un MonitorSQL se miden todas las sentencias"""
         try:
-            self.conn = sqlite3.connect("veterinaria.db")
-            self.crear_tablas()
-            self.insertar_datos_prueba()
+            inicio = time.perf_counter()
+            self.ruta = ruta
+            self.perfil = self.PERFIL_CONEXION if perfil is None else perfil
+            self.monitor = monitor
+            if monitor is None:
+                self.conn = sqlite3.connect(ruta)
+            else:
+                self.conn = sqlite3.connect(ruta, factory=ConexionMedida)
+                self.conn.monitor = monitor
+            self.configurar_conexion()
+            self.catalogos = catalogos or CacheCatalogos(self)
+            self.busqueda_disponible = True
+            # Mensajes de las migraciones para mostrar al usuario
+            self.avisos = []
+            self.tiempos = {"apertura": time.perf_counter() - inicio}
+            if not inicializar:
+                return
+            
+            inicio = time.perf_counter()
+            self.preparar_esquema()
+            self.tiempos["esquema"] = time.perf_counter() - inicio
+            if sembrar:
+                self.insertar_datos_prueba()
         except sqlite3.Error as e:
-            messagebox.showerror("Error", f"No se pudo conectar a la base de datos: {str(e)}")
-            raise
+            raise ErrorBaseDatos(f"No se pudo conectar a la base de datos: {str(e)}") from e
     
+    def abrir_secundaria(self):
+        """Abre otra conexión a la misma base con el mismo perfil, monitor y caché
+        de catálogos, para usarla desde otro hilo"""
+        db = Database(self.ruta, inicializar=False, catalogos=self.catalogos,
+                      perfil=self.perfil, monitor=self.monitor)
+        db.busqueda_disponible = self.busqueda_disponible
+        return db
+
+    def preparar_esquema(self):
+        """Crea o actualiza el esquema. Si la versión guardada ya es la actual no
+        ejecuta ninguna sentencia DDL"""
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] < self.VERSION_ESQUEMA:
+            self.crear_tablas()
+            self.migrar()
+        
+        # Si SQLite no tenía FTS5 cuando se creó el esquema, las tablas no existen
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'HistorialMedico_fts'")
+        self.busqueda_disponible = cursor.fetchone() is not None
+
+    def configurar_conexion(self):
+        cursor = self.conn.cursor()
+        for pragma, valor in self.perfil.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+
     def crear_tablas(self):
         try:
             cursor = self.conn.cursor()
@@ -474,6 +1328,35 @@ class Database:
                     veterinario_id INTEGER NOT NULL,
                     FOREIGN KEY (animal_id) REFERENCES Animal(id),
                     FOREIGN KEY (veterinario_id) REFERENCES Veterinario(id)
+                )""",
+                """CREATE TABLE IF NOT EXISTS Vacuna (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    historial_id INTEGER UNIQUE,
+                    vacuna TEXT NOT NULL,
+                    fecha DATE NOT NULL,
+                    proxima_aplicacion DATE,
+                    animal_id INTEGER NOT NULL,
+                    veterinario_id INTEGER NOT NULL,
+                    FOREIGN KEY (historial_id) REFERENCES HistorialMedico(id),
+                    FOREIGN KEY (animal_id) REFERENCES Animal(id),
+                    FOREIGN KEY (veterinario_id) REFERENCES Veterinario(id)
+                )""",
+                # Avance de los rellenos por tramos de una migración sin terminar
+                """CREATE TABLE IF NOT EXISTS MigracionProgreso (
+                    version INTEGER NOT NULL,
+                    paso TEXT NOT NULL,
+                    ultimo_id INTEGER NOT NULL,
+                    maximo_id INTEGER NOT NULL,
+                    PRIMARY KEY (version, paso)
+                )""",
+                # Filas antiguas que un relleno no pudo copiar, para revisarlas a mano
+                """CREATE TABLE IF NOT EXISTS MigracionRechazo (
+                    version INTEGER NOT NULL,
+                    paso TEXT NOT NULL,
+                    tabla TEXT NOT NULL,
+                    fila_id INTEGER NOT NULL,
+                    error TEXT NOT NULL,
+                    PRIMARY KEY (version, paso, fila_id)
                 )"""
             ]
             for tabla in tablas:
@@ -481,46 +1364,1813 @@ class Database:
             self.conn.commit()
         except sqlite3.Error as e:
             self.conn.rollback()
-            messagebox.showerror("Error", f"Error al crear tablas: {str(e)}")
-            raise
+            raise ErrorBaseDatos(f"Error al crear tablas: {str(e)}") from e
 
-    def insertar_datos_prueba(self):
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM Propietario")
-            if cursor.fetchone()[0] == 0:
-                # Hasheamos las contraseñas de prueba
-                admin_pass = hashlib.sha256("admin123".encode()).hexdigest()
-                recep_pass = hashlib.sha256("recepcion123".encode()).hexdigest()
-                vet_pass = hashlib.sha256("vet123".encode()).hexdigest()
-                
-                datos_prueba = [
-                    ("INSERT INTO Administrador (nombre, email, password) VALUES (?, ?, ?)", 
-                     ("Admin Principal", "admin@vet.com", admin_pass)),
-                    ("INSERT INTO Recepcionista (nombre, email, password) VALUES (?, ?, ?)", 
-                     ("Ana Recepcion", "recepcion@vet.com", recep_pass)),
-                    ("INSERT INTO Veterinario (nombre, email, password) VALUES (?, ?, ?)", 
-                     ("Dr. Perez", "vet@vet.com", vet_pass)),
-                    ("INSERT INTO Propietario (nombre, telefono, email) VALUES (?, ?, ?)", 
-                     ("Juan Perez", "5551234567", "juan@email.com")),
-                    ("INSERT INTO Animal (nombre, especie, raza, fecha_nacimiento) VALUES (?, ?, ?, ?)", 
-                     ("Firulais", "Perro", "Labrador", "2020-05-15")),
-                    ("INSERT INTO Servicio (nombre, precio) VALUES (?, ?)", 
-                     ("Consulta General", 300.0))
-                ]
-                for consulta, parametros in datos_prueba:
-                    cursor.execute(consulta, parametros)
+    def migrar(self):
+        """Aplica en orden las migraciones posteriores a PRAGMA user_version. La
+        versión solo avanza cuando el paso termina; un relleno interrumpido
+        continúa desde el último tramo confirmado"""
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        actual = cursor.fetchone()[0]
+        for version, descripcion, metodo in self.MIGRACIONES:
+            if version <= actual:
+                continue
+            try:
+                getattr(self, metodo)()
+                cursor.execute("DELETE FROM MigracionProgreso WHERE version = ?", (version,))
+                cursor.execute(f"PRAGMA user_version = {version}")
                 self.conn.commit()
-        except sqlite3.Error as e:
-            self.conn.rollback()
-            messagebox.showerror("Error", f"Error al insertar datos de prueba: {str(e)}")
-            
-         
-            
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise ErrorBaseDatos(f"Error en la migración {version} ({descripcion}): {str(e)}") from e
+
+    def ejecutar_ddl(self, sentencias, relleno=None):
+        """Ejecuta las sentencias en una sola transacción y la confirma. Con
+        relleno=(version, paso, tabla) fija en esa misma transacción el último id
+        que recorrerá rellenar_por_lotes: las filas posteriores ya las ven los triggers"""
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN")
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+        if relleno:
+            self.registrar_relleno(*relleno)
+        self.conn.commit()
+
+    def registrar_relleno(self, version, paso, tabla):
+        """Anota el tramo de ids existente de `tabla` si el paso aún no tiene avance.
+        No confirma; devuelve (ultimo_id, maximo_id)"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT ultimo_id, maximo_id FROM MigracionProgreso WHERE version = ? AND paso = ?",
+                       (version, paso))
+        fila = cursor.fetchone()
+        if fila is None:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")
+            fila = (0, cursor.fetchone()[0])
+            cursor.execute("INSERT INTO MigracionProgreso (version, paso, ultimo_id, maximo_id) VALUES (?, ?, ?, ?)",
+                           (version, paso) + fila)
+        return fila
+
+    def rellenar_por_lotes(self, version, paso, tabla, sentencias, tamano_lote=None):
+        """Ejecuta `sentencias` (con los parámetros desde, hasta sobre el id de
+        `tabla`) por tramos, confirmando cada uno junto con su avance. Solo
+        recorre las filas que existían al empezar; las nuevas las cubren los
+        triggers o el propio código que las inserta. Un tramo con una fila que
+        incumple alguna restricción se repite fila a fila (rellenar_filas)"""
+        tamano_lote = tamano_lote or self.TAMANO_LOTE_MIGRACION
+        cursor = self.conn.cursor()
+        ultimo_id, maximo_id = self.registrar_relleno(version, paso, tabla)
+        self.conn.commit()
+        
+        while ultimo_id < maximo_id:
+            hasta = min(ultimo_id + tamano_lote, maximo_id)
+            try:
+                for sentencia in sentencias:
+                    cursor.execute(sentencia, (ultimo_id + 1, hasta))
+            except (sqlite3.IntegrityError, sqlite3.DataError):
+                self.conn.rollback()
+                self.rellenar_filas(version, paso, tabla, sentencias, ultimo_id + 1, hasta)
+            cursor.execute("UPDATE MigracionProgreso SET ultimo_id = ? WHERE version = ? AND paso = ?",
+                           (hasta, version, paso))
+            self.conn.commit()
+            ultimo_id = hasta
+            if ultimo_id < maximo_id:
+                time.sleep(self.PAUSA_LOTE_SEGUNDOS)
+
+    def rellenar_filas(self, version, paso, tabla, sentencias, desde, hasta):
+        """Aplica `sentencias` fila a fila entre los ids desde y hasta. Las filas
+        que fallan se anotan en MigracionRechazo y en self.avisos, y la migración
+        sigue con las demás. No confirma"""
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute(f"SELECT id FROM {tabla} WHERE id BETWEEN ? AND ?", (desde, hasta))
+        for fila_id, in cursor.fetchall():
+            cursor.execute("SAVEPOINT fila")
+            try:
+                for sentencia in sentencias:
+                    cursor.execute(sentencia, (fila_id, fila_id))
+            except (sqlite3.IntegrityError, sqlite3.DataError) as e:
+                cursor.execute("ROLLBACK TO fila")
+                cursor.execute(
+                    "INSERT OR REPLACE INTO MigracionRechazo (version, paso, tabla, fila_id, error) VALUES (?, ?, ?, ?, ?)",
+                    (version, paso, tabla, fila_id, str(e)))
+                self.avisos.append(f"Migración {version} ({paso}): la fila {fila_id} de {tabla} no se copió "
+                                   f"({e}); quedó anotada en MigracionRechazo")
+            cursor.execute("RELEASE fila")
+
+    def migrar_vacunas(self):
+        """Pasa las vacunas guardadas como texto en HistorialMedico.descripcion
+        a la tabla Vacuna"""
+        self.rellenar_por_lotes(self.VERSION_VACUNAS, "vacunas", "HistorialMedico",
+                                [self.VACUNAS_DESDE_HISTORIAL])
+
+    def crear_indices(self):
+        """Crea el conjunto de índices secundarios"""
+        self.ejecutar_ddl(self.INDICES)
+
+    def crear_busqueda_texto(self):
+        """Crea las tablas FTS5 y sus triggers, e indexa los registros existentes.
+        El 'rebuild' de FTS5 no admite tramos, así que se hace en una transacción"""
+        try:
+            self.ejecutar_ddl(self.BUSQUEDA_TEXTO + [
+                "INSERT INTO HistorialMedico_fts(HistorialMedico_fts) VALUES ('rebuild')",
+                "INSERT INTO Cita_fts(Cita_fts) VALUES ('rebuild')"
+            ])
+        except sqlite3.OperationalError as e:
+            # SQLite compilado sin FTS5: la aplicación funciona sin el buscador
+            self.conn.rollback()
+            if "fts5" not in str(e):
+                raise
+
+    def crear_resumen_ingresos(self):
+        """Crea las tablas de ingresos por día, mes, servicio y veterinario con sus
+        triggers, y acumula en ellas los pagos existentes"""
+        sentencias, rellenos = [], []
+        for tabla, claves, expresiones, condicion in self.RESUMENES_INGRESOS:
+            sentencias.append(f"""CREATE TABLE IF NOT EXISTS {tabla} (
+                {", ".join(f"{clave} NOT NULL" for clave in claves)},
+                ingresos REAL NOT NULL DEFAULT 0,
+                pagos INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({", ".join(claves)})
+            )""")
+            sentencias.append(self.trigger_resumen(tabla, claves, expresiones, condicion))
+            # Misma expresión y condición que el trigger, aplicadas a los pagos anteriores
+            filtro = f" AND {condicion.replace('new.', 'p.')}" if condicion else ""
+            rellenos.append(f"""INSERT INTO {tabla} ({", ".join(claves)}, ingresos, pagos)
+                SELECT {", ".join(expresion.replace("new.", "p.") for expresion in expresiones)}, p.monto, 1
+                FROM Pago p WHERE p.id BETWEEN ? AND ?{filtro}
+                ON CONFLICT ({", ".join(claves)}) DO UPDATE SET
+                    ingresos = ingresos + excluded.ingresos,
+                    pagos = pagos + 1""")
+        # El tope del relleno se lee en la transacción que crea los triggers; si no,
+        # un pago insertado entre ambos pasos se sumaría dos veces
+        relleno = (self.VERSION_RESUMEN_INGRESOS, "pagos", "Pago")
+        self.ejecutar_ddl(sentencias, relleno)
+        self.rellenar_por_lotes(*relleno, rellenos)
+
+    @staticmethod
+    def trigger_resumen(tabla, claves, expresiones, condicion):
+        return f"""CREATE TRIGGER IF NOT EXISTS {tabla.lower()}_ai AFTER INSERT ON Pago
+            {f"WHEN {condicion} " if condicion else ""}BEGIN
+                INSERT INTO {tabla} ({", ".join(claves)}, ingresos, pagos)
+                VALUES ({", ".join(expresiones)}, new.monto, 1)
+                ON CONFLICT ({", ".join(claves)}) DO UPDATE SET
+                    ingresos = ingresos + excluded.ingresos,
+                    pagos = pagos + 1;
+            END"""
+
+    def corregir_resumen_ingresos(self):
+        sentencias = []
+        for tabla, claves, expresiones, condicion in self.RESUMENES_INGRESOS:
+            if condicion:
+                sentencias.append(f"DROP TRIGGER IF EXISTS {tabla.lower()}_ai")
+                sentencias.append(self.trigger_resumen(tabla, claves, expresiones, condicion))
+        self.ejecutar_ddl(sentencias)
+
+    def reconstruir_resumen_ingresos(self, confirmar=True):
+        """Recalcula los resúmenes de ingresos desde Pago"""
+        cursor = self.conn.cursor()
+        for tabla, consulta in self.AGREGADOS_INGRESOS.items():
+            cursor.execute(f"DELETE FROM {tabla}")
+            cursor.execute(f"INSERT INTO {tabla} {consulta}")
+        if confirmar:
+            self.conn.commit()
+
+    def verificar_resumen_ingresos(self):
+        """Devuelve las filas en que los resúmenes no coinciden con Pago, como
+        (tabla, fila_resumen, fila_calculada)"""
+        cursor = self.conn.cursor()
+        diferencias = []
+        for tabla, claves, _, _ in self.RESUMENES_INGRESOS:
+            cursor.execute(f"SELECT {', '.join(claves)}, ingresos, pagos FROM {tabla}")
+            resumen = {fila[:-2]: fila for fila in cursor.fetchall()}
+            cursor.execute(self.AGREGADOS_INGRESOS[tabla])
+            calculado = {fila[:-2]: fila for fila in cursor.fetchall()}
+            for clave in resumen.keys() | calculado.keys():
+                fila_resumen, fila_calculada = resumen.get(clave), calculado.get(clave)
+                if (fila_resumen is None or fila_calculada is None
+                        or fila_resumen[-1] != fila_calculada[-1]
+                        or abs(fila_resumen[-2] - fila_calculada[-2]) > 0.005):
+                    diferencias.append((tabla, fila_resumen, fila_calculada))
+        return diferencias
+
+    def crear_cuentas_por_cobrar(self):
+        """Crea el trigger y los índices parciales de las citas pendientes y marca
+        como pagadas las citas que ya tienen pago"""
+        self.ejecutar_ddl(self.CUENTAS_POR_COBRAR)
+        self.rellenar_por_lotes(self.VERSION_CUENTAS_POR_COBRAR, "citas pagadas", "Cita", ["""
+        UPDATE Cita SET estado = 'pagada'
+        WHERE id BETWEEN ? AND ?
+        AND EXISTS (SELECT 1 FROM Pago p WHERE p.cita_id = Cita.id)
+        """])
+
+    def crear_agenda(self):
+        """Crea la agenda de intervalos por veterinario a partir de las citas existentes"""
+        self.ejecutar_ddl(self.AGENDA)
+        self.rellenar_por_lotes(self.VERSION_AGENDA, "citas", "Cita", [self.RELLENO_AGENDA])
+        self.ejecutar_ddl([self.AGENDA_CONFLICTO])
+
+    def crear_recordatorios(self):
+        self.ejecutar_ddl(self.RECORDATORIOS)
+
+    def crear_usuarios(self):
+        self.ejecutar_ddl(self.USUARIOS)
+        self.avisar_cuentas_sin_migrar()
+
+    def crear_cuentas_propietarios(self):
+        self.ejecutar_ddl(self.CUENTAS_PROPIETARIOS)
+        self.avisar_cuentas_sin_migrar()
+
+    def crear_altas_propietarios(self):
+        # Cubre también a los propietarios importados entre la versión 12 y esta
+        self.ejecutar_ddl(self.ALTAS_PROPIETARIOS + self.CUENTAS_PROPIETARIOS)
+        self.avisar_cuentas_sin_migrar()
+
+    def avisar_cuentas_sin_migrar(self):
+        for rol, persona_id, nombre, email in self.cuentas_sin_migrar():
+            aviso = (f"{rol} {persona_id} ({nombre}) no tiene cuenta: el email {email} ya es de otra. "
+                     f"Créela con --crear-usuario {rol} {persona_id} otro_email")
+            if aviso not in self.avisos:
+                self.avisos.append(aviso)
+
+    def cuentas_sin_migrar(self):
+        """Personas con email que no obtuvieron cuenta porque su email ya era de
+        otra persona: (rol, id, nombre, email)"""
+        cursor = self.conn.cursor()
+        filas = []
+        for rol in self.ROLES:
+            cursor.execute(
+                f"""SELECT '{rol}', t.id, t.nombre, t.email FROM {rol} t
+                WHERE t.email IS NOT NULL AND trim(t.email) != ''
+                AND NOT EXISTS (SELECT 1 FROM Usuario u WHERE u.rol = '{rol}' AND u.persona_id = t.id)
+                AND EXISTS (SELECT 1 FROM Usuario u WHERE u.email = lower(trim(t.email)))"""
+            )
+            filas.extend(cursor.fetchall())
+        return filas
+
+    def crear_indice_dosis(self):
+        self.ejecutar_ddl(self.DOSIS_VACUNA)
+
+    def crear_busqueda_propietarios(self):
+        self.ejecutar_ddl(self.BUSQUEDA_PROPIETARIOS)
+
+    def crear_usuario(self, rol, persona_id, email, password, clave=None):
+        """Crea la cuenta de acceso de una persona ya registrada en la tabla de su rol.
+        `clave` permite pasar una clave ya derivada con derivar_clave"""
+        if rol not in self.ROLES:
+            raise DatosInvalidos(f"Rol desconocido: {rol}")
+        email = (email or "").strip().lower()
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            raise DatosInvalidos("Formato de email inválido")
+        if not password and not clave:
+            raise DatosInvalidos("La contraseña es requerida")
+        
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "INSERT INTO Usuario (email, rol, persona_id, clave) VALUES (?, ?, ?, ?)",
+                (email, rol, persona_id, clave or derivar_clave(password))
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            self.conn.rollback()
+            raise Duplicado(f"Ya existe una cuenta con el email {email}") from e
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+
+    def autenticar(self, email, password):
+        """Comprueba las credenciales y devuelve (rol, id, nombre) de la persona.
+        Es lento a propósito (PBKDF2): llamarlo fuera del hilo de la interfaz"""
+        email = (email or "").strip().lower()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT id, rol, persona_id, clave FROM Usuario WHERE email = ?", (email,))
+            cuenta = cursor.fetchone()
+            if cuenta is None or not verificar_clave(password, cuenta[3]):
+                raise DatosInvalidos("Credenciales incorrectas")
+            
+            id_cuenta, rol, persona_id, clave = cuenta
+            if not clave.startswith(PREFIJO_KDF):
+                cursor.execute("UPDATE Usuario SET clave = ? WHERE id = ?", (derivar_clave(password), id_cuenta))
+                self.conn.commit()
+            # rol sale de ROLES a través de la tabla Usuario, nunca de la entrada del usuario
+            if rol not in self.ROLES:
+                raise DatosInvalidos("Credenciales incorrectas")
+            cursor.execute(f"SELECT nombre FROM {rol} WHERE id = ?", (persona_id,))
+            persona = cursor.fetchone()
+            if persona is None:
+                raise NoEncontrado(f"La cuenta {email} no tiene un {rol.lower()} asociado")
+            return rol, persona_id, persona[0]
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+
+    def clave_actual(self, email):
+        """Clave guardada de la cuenta, o None. Sirve para saber si cambió"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT clave FROM Usuario WHERE email = ?", ((email or "").strip().lower(),))
+        fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+    def emitir_codigo_activacion(self, propietario_id):
+        """Genera el código de un solo uso con el que el propietario activa su
+        cuenta pendiente. Solo se guarda su hash; uno nuevo anula el anterior"""
+        codigo = "".join(secrets.choice(self.ALFABETO_CODIGO) for _ in range(self.LONGITUD_CODIGO))
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "UPDATE Usuario SET clave = ? WHERE rol = 'Propietario' AND persona_id = ? AND clave LIKE ?",
+                (self.CLAVE_PENDIENTE + hashlib.sha256(codigo.encode()).hexdigest(),
+                 propietario_id, self.CLAVE_PENDIENTE + "%")
+            )
+            if cursor.rowcount == 0:
+                self.conn.rollback()
+                raise NoEncontrado("El propietario no tiene una cuenta pendiente de activar")
+            self.conn.commit()
+            return codigo
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+
+    def activar_cuenta(self, email, codigo, password):
+        """Primer acceso de un propietario con cuenta pendiente: comprueba el
+        código que le dio recepción y guarda la contraseña elegida"""
+        email = (email or "").strip().lower()
+        if not password:
+            raise DatosInvalidos("La contraseña es requerida")
+        esperada = self.CLAVE_PENDIENTE + hashlib.sha256((codigo or "").strip().upper().encode()).hexdigest()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT id, clave FROM Usuario WHERE email = ? AND rol = 'Propietario'", (email,))
+            cuenta = cursor.fetchone()
+            # Mismo mensaje si no hay cuenta pendiente, aún no tiene código o no coincide
+            if cuenta is None or not hmac.compare_digest(cuenta[1], esperada):
+                raise DatosInvalidos("El código de activación no es válido para ese email")
+            cursor.execute("UPDATE Usuario SET clave = ? WHERE id = ?", (derivar_clave(password), cuenta[0]))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise ErrorBaseDatos(f"Error de base de datos: {str(e)}") from e
+
+    def conflicto_agenda(self, veterinario_id, inicio, fin):
+        """Devuelve la cita (cita_id, inicio, fin) del veterinario que se solapa con
+        [inicio, fin), o None. Las fechas son cadenas 'YYYY-MM-DD HH:MM'"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT cita_id, inicio, fin FROM AgendaVeterinario
+            WHERE veterinario_id = ? AND inicio < ?
+            ORDER BY inicio DESC LIMIT 1""",
+            (veterinario_id, fin)
+        )
+        anterior = cursor.fetchone()
+        return anterior if anterior and anterior[2] > inicio else None
+
+    def huecos_libres(self, veterinario_id, desde, duracion=Cita.DURACION_MINUTOS, cantidad=5, dias=14):
+        """Devuelve hasta `cantidad` horas de inicio libres (datetime) del veterinario
+        a partir de `desde`, en pasos de `duracion` minutos dentro del horario de la clínica"""
+        paso = timedelta(minutes=duracion)
+        limite = desde + timedelta(days=dias)
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT inicio, fin FROM AgendaVeterinario
+            WHERE veterinario_id = ? AND inicio >= ? AND inicio < ?
+            ORDER BY inicio""",
+            ((veterinario_id, (desde - timedelta(days=1)).strftime(Cita.FORMATO_FECHA),
+              limite.strftime(Cita.FORMATO_FECHA)))
+        )
+        ocupados = [(datetime.strptime(inicio, Cita.FORMATO_FECHA), datetime.strptime(fin, Cita.FORMATO_FECHA))
+                    for inicio, fin in cursor.fetchall()]
+        
+        # Recorrido conjunto de los huecos candidatos y los intervalos ocupados, ambos ordenados
+        huecos = []
+        i = 0
+        candidato = desde.replace(second=0, microsecond=0)
+        while candidato < limite and len(huecos) < cantidad:
+            if candidato.hour < self.HORA_APERTURA:
+                candidato = candidato.replace(hour=self.HORA_APERTURA, minute=0)
+            fin_candidato = candidato + paso
+            if fin_candidato > candidato.replace(hour=self.HORA_CIERRE, minute=0):
+                candidato = (candidato + timedelta(days=1)).replace(hour=self.HORA_APERTURA, minute=0)
+                continue
+            while i < len(ocupados) and ocupados[i][1] <= candidato:
+                i += 1
+            if i < len(ocupados) and ocupados[i][0] < fin_candidato:
+                candidato = max(ocupados[i][1], candidato + paso)
+                continue
+            huecos.append(candidato)
+            candidato = fin_candidato
+        return huecos
+
+    def servicios(self, ids=None):
+        """Filas (id, nombre, precio) de todos los servicios o solo de los ids indicados"""
+        cursor = self.conn.cursor()
+        if ids is None:
+            cursor.execute("SELECT id, nombre, precio FROM Servicio ORDER BY id")
+        else:
+            ids = list(ids)
+            cursor.execute(
+                f"SELECT id, nombre, precio FROM Servicio WHERE id IN ({', '.join('?' * len(ids))})",
+                ids
+            )
+        return cursor.fetchall()
+
+    def cuentas_por_cobrar(self, desde=None, hasta=None, propietario_id=None, veterinario_id=None,
+                           limite=50, despues_de=None):
+        """Devuelve una página de citas sin pagar (id, animal, fecha, servicio, precio,
+        veterinario) ordenadas por fecha, y la clave de la página siguiente (o None)"""
+        condiciones = ["c.estado = 'pendiente'"]
+        parametros = []
+        if desde:
+            condiciones.append("c.fecha >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("c.fecha < date(?, '+1 day')")
+            parametros.append(hasta)
+        if veterinario_id:
+            condiciones.append("c.veterinario_id = ?")
+            parametros.append(veterinario_id)
+        if propietario_id:
+            condiciones.append("c.animal_id IN (SELECT animal_id FROM Propietario_Animal WHERE propietario_id = ?)")
+            parametros.append(propietario_id)
+        if despues_de:
+            condiciones.append("(c.fecha, c.id) > (?, ?)")
+            parametros.extend(despues_de)
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""SELECT c.id, a.nombre, c.fecha, s.nombre, s.precio, v.nombre
+            FROM Cita c
+            JOIN Animal a ON c.animal_id = a.id
+            JOIN Servicio s ON c.servicio_id = s.id
+            JOIN Veterinario v ON c.veterinario_id = v.id
+            WHERE {" AND ".join(condiciones)}
+            ORDER BY c.fecha, c.id
+            LIMIT ?""",
+            (*parametros, limite)
+        )
+        filas = cursor.fetchall()
+        siguiente = (filas[-1][2], filas[-1][0]) if len(filas) == limite else None
+        return filas, siguiente
+
+    def buscar_texto_clinico(self, texto, limite=20, desplazamiento=0):
+        """Busca en descripciones, tratamientos y motivos de cita. Devuelve filas
+        (origen, id, fecha, animal_id, animal, fragmento) ordenadas por relevancia"""
+        # Cada palabra se busca como prefijo; así el texto del usuario nunca es sintaxis FTS
+        terminos = re.findall(r"\w+", texto)
+        if not terminos or not self.busqueda_disponible:
+            return []
+        consulta = " ".join(f'"{termino}"*' for termino in terminos)
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT 'Historial', h.id, h.fecha, a.id, a.nombre,
+                   snippet(HistorialMedico_fts, -1, '[', ']', '...', 12),
+                   bm25(HistorialMedico_fts) AS rango
+            FROM HistorialMedico_fts
+            JOIN HistorialMedico h ON h.id = HistorialMedico_fts.rowid
+            JOIN Animal a ON a.id = h.animal_id
+            WHERE HistorialMedico_fts MATCH ?
+            UNION ALL
+            SELECT 'Cita', c.id, c.fecha, a.id, a.nombre,
+                   snippet(Cita_fts, 0, '[', ']', '...', 12),
+                   bm25(Cita_fts) AS rango
+            FROM Cita_fts
+            JOIN Cita c ON c.id = Cita_fts.rowid
+            JOIN Animal a ON a.id = c.animal_id
+            WHERE Cita_fts MATCH ?
+            ORDER BY rango
+            LIMIT ? OFFSET ?""",
+            (consulta, consulta, limite, desplazamiento)
+        )
+        return [fila[:6] for fila in cursor.fetchall()]
+
+    def buscar_animales(self, texto, limite=10, sin_propietario=False):
+        """Devuelve como mucho `limite` animales (id, nombre, especie) cuyo nombre
+        empieza por `texto`, o cuyo id es `texto` si es numérico.
+        Sin texto no devuelve nada: sería recorrer la tabla entera"""
+        texto = texto.strip()
+        if not texto:
+            return []
+        prefijo = re.sub(r"([\\%_])", r"\\\1", texto) + "%"
+        if texto.isdigit():
+            condicion = "(a.id = ? OR a.nombre LIKE ? ESCAPE '\\')"
+            parametros = [int(texto), prefijo]
+        else:
+            condicion = "a.nombre LIKE ? ESCAPE '\\'"
+            parametros = [prefijo]
+        
+        if sin_propietario:
+            condicion += " AND NOT EXISTS (SELECT 1 FROM Propietario_Animal pa WHERE pa.animal_id = a.id)"
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""SELECT a.id, a.nombre, a.especie FROM Animal a
+            WHERE {condicion}
+            ORDER BY a.nombre COLLATE NOCASE LIMIT ?""",
+            (*parametros, limite)
+        )
+        return cursor.fetchall()
+
+    def buscar_propietarios(self, texto, limite=10):
+        """Devuelve como mucho `limite` propietarios (id, nombre, telefono) cuyo
+        nombre empieza por `texto`, o cuyo id es `texto` si es numérico.
+        Sin texto no devuelve nada: sería recorrer la tabla entera"""
+        texto = texto.strip()
+        if not texto:
+            return []
+        prefijo = re.sub(r"([\\%_])", r"\\\1", texto) + "%"
+        if texto.isdigit():
+            condicion = "(p.id = ? OR p.nombre LIKE ? ESCAPE '\\')"
+            parametros = [int(texto), prefijo]
+        else:
+            condicion = "p.nombre LIKE ? ESCAPE '\\'"
+            parametros = [prefijo]
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""SELECT p.id, p.nombre, p.telefono FROM Propietario p
+            WHERE {condicion}
+            ORDER BY p.nombre COLLATE NOCASE LIMIT ?""",
+            (*parametros, limite)
+        )
+        return cursor.fetchall()
+
+    def operaciones_paneles(self, directorio):
+        """Lo que hacen los paneles con la base de datos, lecturas y escrituras, con
+        argumentos de ejemplo, como (nombre, función sin argumentos). Escribe en la
+        base: llamarlo sobre una copia. Los archivos se escriben en `directorio`"""
+        veterinario = Veterinario(id=1)
+        recepcionista = Recepcionista(id=1)
+        inicio = datetime(2024, 1, 1, 10, 0)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT MIN(id), MAX(id) FROM Cita WHERE estado = 'pendiente'")
+        cita_cobro, cita_cancelar = cursor.fetchone()
+        cursor.execute("SELECT MIN(persona_id) FROM Usuario WHERE rol = 'Propietario' AND clave LIKE ?",
+                       (self.CLAVE_PENDIENTE + "%",))
+        propietario_pendiente = cursor.fetchone()[0]
+        animal = Animal(id=1, nombre="Firulais", especie="Perro", raza="Labrador", fecha_nacimiento="2020-05-15")
+        operaciones = [
+            ("inicio de sesión", lambda: self.autenticar("vet@vet.com", "")),
+            ("sesión en caché", lambda: self.clave_actual("vet@vet.com")),
+            ("línea temporal", lambda: veterinario.linea_temporal(1, self)),
+            ("línea temporal, página siguiente",
+             lambda: veterinario.linea_temporal(1, self, despues_de=("2024-01-01", 1, 1))),
+            ("alertas de vacunas", lambda: veterinario.alertas_vacunas(self, 7, 50, 50)),
+            ("alerta de vacuna por animal", lambda: veterinario.generar_alerta_vacuna(1, self)),
+            ("recordatorios de mañana", lambda: Recepcionista(id=1).citas_para_recordar(self)),
+            ("recordatorios pendientes", lambda: DespachadorRecordatorios(self, None).lote_pendiente()),
+            ("animales del propietario", lambda: Propietario(id=1).listar_animales(self)),
+            ("animal asociado", lambda: Propietario(id=1).listar_animales(self, [1])),
+            ("búsqueda de animales", lambda: self.buscar_animales("fi")),
+            ("búsqueda de animales por id", lambda: self.buscar_animales("1")),
+            ("animales sin propietario", lambda: self.buscar_animales("fi", sin_propietario=True)),
+            ("animales sin propietario, sin texto", lambda: self.buscar_animales("", sin_propietario=True)),
+            ("búsqueda de propietarios", lambda: self.buscar_propietarios("ju")),
+            ("búsqueda de propietarios por id", lambda: self.buscar_propietarios("1")),
+            ("búsqueda en historiales", lambda: self.buscar_texto_clinico("otitis")),
+            ("conflicto de agenda", lambda: self.conflicto_agenda(1, "2024-01-01 10:00", "2024-01-01 10:30")),
+            ("huecos libres", lambda: self.huecos_libres(1, inicio)),
+            ("servicios", lambda: self.servicios([1])),
+            ("reporte de ingresos",
+             lambda: ReporteIngresos(os.path.join(directorio, "ingresos.txt")).escribir(self.conn)),
+            # Escrituras
+            ("registrar animal", lambda: recepcionista.registrar_animal(
+                Animal(nombre="Nuevo", especie="Gato", fecha_nacimiento="2023-01-01"), self)),
+            ("actualizar animal", lambda: recepcionista.actualizar_datos_animal(animal, self)),
+            ("asociar animal", lambda: Propietario(id=1).asociar_animal(1, self)),
+            ("programar cita", lambda: Cita(fecha="2030-01-07 10:00", motivo="Control", animal_id=1,
+                                            veterinario_id=1, servicio_id=1).programar_cita(self)),
+            ("registrar pago", lambda: recepcionista.registrar_pago(cita_cobro, 100.0, "completado", self)),
+            ("cancelar cita", lambda: Cita(id=cita_cancelar).cancelar_cita(self)),
+            ("encolar recordatorio", lambda: recepcionista.enviar_recordatorio(cita_cobro, "sms", self)),
+            ("encolar recordatorios de mañana", lambda: recepcionista.encolar_recordatorios("sms", self)),
+            ("enviar recordatorios", lambda: asyncio.run(DespachadorRecordatorios(
+                self, TransporteArchivo(os.path.join(directorio, "recordatorios.txt"))).despachar())),
+            ("registrar tratamiento",
+             lambda: veterinario.registrar_tratamiento(1, "Consulta", "Revisión", "Ninguno", self)),
+            ("registrar vacuna", lambda: veterinario.registrar_vacuna(1, "Rabia", "2030-01-01", self)),
+            ("agregar servicio", lambda: Administrador(id=1).configurar_servicios([("Servicio de prueba", 10.0)], self)),
+            ("cambiar precio", lambda: Administrador(id=1).establecer_precios({"Servicio de prueba": 12.0}, self)),
+            ("código de activación", lambda: self.emitir_codigo_activacion(propietario_pendiente)),
+            ("activar cuenta", lambda: self.activar_cuenta("juan@email.com", "XXXXXXXX", "clave"))
+        ]
+        
+        # Todas las combinaciones de filtros que arman las consultas dinámicas. Sin
+        # fechas el reporte de citas exporta todas: ese recorrido es lo que se pide
+        for desde, hasta in itertools.product(("2024-01-01", None), ("2024-01-31", None)):
+            if desde or hasta:
+                operaciones.append((
+                    f"reporte de citas desde={desde} hasta={hasta}",
+                    lambda desde=desde, hasta=hasta: ExportadorCitas(
+                        self, os.path.join(directorio, "citas.csv"), "csv", desde, hasta).exportar(self.conn)))
+            for propietario_id, veterinario_id, despues_de in itertools.product(
+                    (1, None), (1, None), (("2024-01-01 10:00", 1), None)):
+                filtros = {"desde": desde, "hasta": hasta, "propietario_id": propietario_id,
+                           "veterinario_id": veterinario_id, "despues_de": despues_de}
+                operaciones.append((
+                    "cuentas por cobrar " + " ".join(f"{clave}={valor}" for clave, valor in filtros.items()),
+                    lambda filtros=filtros: self.cuentas_por_cobrar(**filtros)))
+        return operaciones
+
+    def sentencias_paneles(self):
+        """Ejecuta operaciones_paneles sobre una copia en memoria medida con un
+        MonitorSQL y devuelve {operación: [(sentencia, parámetros)]} con lo que
+        registró el monitor durante cada una"""
+        monitor = MonitorSQL(umbral_lento_ms=float("inf"))
+        copia = Database(":memory:", inicializar=False, perfil={}, monitor=monitor)
+        self.conn.backup(copia.conn)
+        capturadas = {}
+        try:
+            with tempfile.TemporaryDirectory() as directorio:
+                for nombre, operacion in copia.operaciones_paneles(directorio):
+                    monitor.reiniciar()
+                    try:
+                        operacion()
+                    except ErrorVeterinaria:
+                        # Algunas fallan a propósito (la contraseña vacía), después de consultar
+                        pass
+                    capturadas[nombre] = [(sentencia, parametros) for sentencia, parametros in monitor.sentencias()
+                                          if sentencia.split()[0].upper() in self.SENTENCIAS_CON_PLAN]
+        finally:
+            copia.conn.close()
+        return capturadas
+
+    def recorridos_completos(self, consulta, parametros=None):
+        """Pasos de EXPLAIN QUERY PLAN en los que `consulta` recorre completa
+        alguna de las tablas grandes. Sin parámetros se prueba con NULL en cada uno"""
+        # El plan nombra las tablas por su alias (FROM Cita c -> "SCAN c")
+        tablas = {}
+        for tabla, alias in re.findall(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(\w+))?", consulta):
+            tablas[tabla] = tabla
+            if alias:
+                tablas[alias] = tabla
+        
+        cursor = self.conn.cursor()
+        # Recorrer un índice parcial solo visita las filas que cumplen su WHERE
+        # (p. ej. las citas pendientes), no la tabla completa
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        parciales = {nombre for nombre, in cursor.fetchall()}
+        
+        if parametros is None:
+            parametros = [None] * re.sub(r"'[^']*'", "", consulta).count("?")
+        cursor.execute("EXPLAIN QUERY PLAN " + consulta, parametros)
+        recorridos = []
+        for fila in cursor.fetchall():
+            detalle = fila[3]
+            partes = detalle.split()
+            indice = re.search(r"USING (?:COVERING )?INDEX (\w+)", detalle)
+            if (len(partes) >= 2 and partes[0] == "SCAN"
+                    and tablas.get(partes[1]) in self.TABLAS_GRANDES
+                    and not (indice and indice.group(1) in parciales)):
+                recorridos.append(detalle)
+        return recorridos
+
+    def verificar_planes(self):
+        """Comprueba el plan de cada sentencia que el MonitorSQL vio ejecutar a las
+        operaciones de los paneles, con los parámetros con que se ejecutó. Devuelve
+        (operación, sentencia, detalle) de las que recorren completa alguna de las
+        tablas grandes"""
+        fallos = []
+        for nombre, sentencias in self.sentencias_paneles().items():
+            for sentencia, parametros in sentencias:
+                fallos.extend((nombre, sentencia, detalle)
+                              for detalle in self.recorridos_completos(sentencia, parametros))
+        return fallos
+
+    def insertar_datos_prueba(self):
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM Propietario")
+            if cursor.fetchone()[0] == 0:
+                # (tabla, columnas, valores, email, contraseña de prueba)
+                datos_prueba = [
+                    ("Administrador", "nombre, email, password", ("Admin Principal", "admin@vet.com", ""),
+                     "admin@vet.com", "admin123"),
+                    ("Recepcionista", "nombre, email, password", ("Ana Recepcion", "recepcion@vet.com", ""),
+                     "recepcion@vet.com", "recepcion123"),
+                    ("Veterinario", "nombre, email, password", ("Dr. Perez", "vet@vet.com", ""),
+                     "vet@vet.com", "vet123"),
+                    ("Propietario", "nombre, telefono, email", ("Juan Perez", "5551234567", "juan@email.com"),
+                     "juan@email.com", "propietario123"),
+                    ("Animal", "nombre, especie, raza, fecha_nacimiento", ("Firulais", "Perro", "Labrador", "2020-05-15"),
+                     None, None),
+                    ("Servicio", "nombre, precio", ("Consulta General", 300.0), None, None)
+                ]
+                for tabla, columnas, valores, email, password in datos_prueba:
+                    cursor.execute(f"INSERT INTO {tabla} ({columnas}) VALUES ({', '.join('?' * len(valores))})",
+                                   valores)
+                    if email:
+                        cursor.execute(
+                            "INSERT OR IGNORE INTO Usuario (email, rol, persona_id, clave) VALUES (?, ?, ?, ?)",
+                            (email, tabla, cursor.lastrowid, derivar_clave(password))
+                        )
+                self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise ErrorBaseDatos(f"Error al insertar datos de prueba: {str(e)}") from e
+
+class EjecutorBD:
+    """Ejecuta trabajo de base de datos en un grupo de hilos, cada uno con su propia
+    conexión SQLite, y entrega los resultados en el hilo de Tk mediante root.after.
+    Solo consulta la cola mientras queda algún trabajo de ejecutar sin entregar"""
+    INTERVALO_MS = 50
+    
+    def __init__(self, root, db, hilos=2):
+        self.root = root
+        self.db = db
+        self.locales = threading.local()
+        self.pendientes = queue.Queue()
+        # Trabajos de ejecutar cuya entrega aún no pasó por la cola; solo lo toca el hilo de Tk
+        self.en_curso = 0
+        self.id_after = None
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="bd",
+                                       initializer=self.abrir_conexion)
+    
+    def abrir_conexion(self):
+        self.locales.db = self.db.abrir_secundaria()
+    
+    def enviar(self, funcion, *args):
+        """Ejecuta funcion(db, *args) en un hilo y devuelve un Future"""
+        return self.pool.submit(lambda: funcion(self.locales.db, *args))
+    
+    def ejecutar(self, funcion, *args, al_terminar=None, al_fallar=None):
+        """Como enviar, pero llama a al_terminar(resultado) o al_fallar(excepcion)
+        en el hilo de la interfaz"""
+        def entregar(futuro):
+            # Cada trabajo deja exactamente una entrada en la cola, aunque no tenga nada que llamar
+            if futuro.cancelled():
+                self.en_interfaz(None)
+                return
+            error = futuro.exception()
+            if error is None:
+                self.en_interfaz(al_terminar, futuro.result())
+            else:
+                self.en_interfaz(al_fallar, error)
+        
+        self.en_curso += 1
+        self.programar_revision()
+        futuro = self.enviar(funcion, *args)
+        futuro.add_done_callback(entregar)
+        return futuro
+    
+    def en_interfaz(self, funcion, *args):
+        """Entrega de un trabajo de ejecutar: funcion(*args) se llamará en el hilo
+        de Tk (nada si funcion es None). Se puede llamar desde cualquier hilo"""
+        self.pendientes.put((funcion, args))
+    
+    def programar_revision(self):
+        if self.id_after is None:
+            self.id_after = self.root.after(self.INTERVALO_MS, self.procesar_pendientes)
+    
+    def procesar_pendientes(self):
+        self.id_after = None
+        try:
+            while True:
+                funcion, args = self.pendientes.get_nowait()
+                self.en_curso -= 1
+                if funcion:
+                    # Con un MonitorInterfaz, cada entrega cuenta como su propio manejador
+                    monitor = LlamadaMedida.monitor
+                    if monitor is None:
+                        funcion(*args)
+                    else:
+                        monitor.medir(funcion, funcion, *args)
+        except queue.Empty:
+            pass
+        finally:
+            if self.en_curso > 0:
+                self.programar_revision()
+    
+    def cerrar(self):
+        if self.id_after is not None:
+            self.root.after_cancel(self.id_after)
+            self.id_after = None
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# ====================== AUTENTICACIÓN ======================
+
+PREFIJO_KDF = "pbkdf2_sha256"
+ITERACIONES_KDF = 600_000
+
+def derivar_clave(password, sal=None, iteraciones=ITERACIONES_KDF):
+    """Devuelve 'pbkdf2_sha256$iteraciones$sal$hash' para guardar en Usuario.clave"""
+    sal = sal or os.urandom(16)
+    derivada = hashlib.pbkdf2_hmac("sha256", password.encode(), sal, iteraciones)
+    return f"{PREFIJO_KDF}${iteraciones}${sal.hex()}${derivada.hex()}"
+
+def verificar_clave(password, clave):
+    """Compara en tiempo constante; admite las claves SHA-256 migradas de la versión anterior"""
+    algoritmo, *partes = clave.split("$")
+    if algoritmo == PREFIJO_KDF and len(partes) == 3:
+        iteraciones, sal, esperada = partes
+        derivada = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(sal), int(iteraciones))
+        return hmac.compare_digest(derivada.hex(), esperada)
+    if algoritmo == "sha256" and len(partes) == 1:
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), partes[0])
+    return False
+
+class CacheSesiones:
+    """Recuerda durante un turno los inicios de sesión correctos. Guarda un HMAC
+    de email y contraseña con una clave aleatoria del proceso, de modo que volver
+    a entrar no vuelve a derivar la clave. La sesión guarda también la clave de
+    la cuenta: si cambió desde entonces (nueva contraseña, en este u otro puesto)
+    la sesión deja de valer"""
+    DURACION_SEGUNDOS = 8 * 3600
+    
+    def __init__(self):
+        self.secreto = os.urandom(32)
+        self.sesiones = {}
+        self.bloqueo = threading.Lock()
+    
+    def huella(self, email, password):
+        return hmac.new(self.secreto, f"{email}\0{password}".encode(), "sha256").digest()
+    
+    def autenticar(self, db, email, password):
+        """Como Database.autenticar, pero resuelve desde la caché si puede"""
+        email = (email or "").strip().lower()
+        huella = self.huella(email, password)
+        with self.bloqueo:
+            sesion = self.sesiones.get(email)
+        if (sesion and sesion[0] > time.monotonic() and hmac.compare_digest(sesion[1], huella)
+                and db.clave_actual(email) == sesion[3]):
+            return sesion[2]
+        
+        usuario = db.autenticar(email, password)
+        # Después de autenticar, que puede haber convertido la clave a PBKDF2
+        clave = db.clave_actual(email)
+        with self.bloqueo:
+            self.sesiones[email] = (time.monotonic() + self.DURACION_SEGUNDOS, huella, usuario, clave)
+        return usuario
+    
+    def invalidar(self, email=None):
+        with self.bloqueo:
+            if email is None:
+                self.sesiones.clear()
+            else:
+                self.sesiones.pop(email.strip().lower(), None)
+
+# ====================== RECORDATORIOS ======================
+
+class TransporteArchivo:
+    """Transporte de prueba: en lugar de enviar SMS, añade cada mensaje a un archivo"""
+    def __init__(self, ruta="recordatorios_enviados.txt"):
+        self.ruta = ruta
+        self.bloqueo = threading.Lock()
+    
+    async def enviar(self, clave, destino, mensaje):
+        # Un transporte real usaría `clave` como clave de idempotencia del proveedor
+        linea = f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{clave}\t{destino}\t{mensaje}\n"
+        await asyncio.to_thread(self.escribir, linea)
+    
+    def escribir(self, linea):
+        with self.bloqueo, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+class DespachadorRecordatorios:
+    """Envía los recordatorios pendientes por lotes, con varios envíos concurrentes
+    a través de un transporte con un método `async enviar(clave, destino, mensaje)`.
+    Los fallos se reintentan con espera exponencial hasta MAX_INTENTOS"""
+    MAX_INTENTOS = 5
+    ESPERA_BASE_SEGUNDOS = 30
+    
+    def __init__(self, db, transporte, tamano_lote=100, concurrencia=10):
+        self.db = db
+        self.transporte = transporte
+        self.tamano_lote = tamano_lote
+        self.concurrencia = concurrencia
+    
+    def lote_pendiente(self):
+        """Siguiente lote de recordatorios (id, clave, destino, mensaje, intentos) que toca enviar"""
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """SELECT id, clave, destino, mensaje, intentos FROM Recordatorio
+            WHERE estado = 'pendiente' AND proximo_intento <= datetime('now')
+            ORDER BY proximo_intento LIMIT ?""",
+            (self.tamano_lote,)
+        )
+        return cursor.fetchall()
+    
+    async def despachar(self):
+        """Envía todo lo que esté pendiente y devuelve las métricas del envío"""
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        enviados = errores_envio = 0
+        inicio = time.perf_counter()
+        
+        async def enviar(id, clave, destino, mensaje, intentos):
+            async with semaforo:
+                try:
+                    await self.transporte.enviar(clave, destino, mensaje)
+                    return id, intentos, None
+                except Exception as e:
+                    return id, intentos, str(e) or type(e).__name__
+        
+        while True:
+            lote = self.lote_pendiente()
+            if not lote:
+                break
+            
+            resultados = await asyncio.gather(*(enviar(*fila) for fila in lote))
+            exitos = [(id,) for id, _, error in resultados if error is None]
+            errores = [
+                ("fallido" if intentos + 1 >= self.MAX_INTENTOS else "pendiente",
+                 f"+{self.ESPERA_BASE_SEGUNDOS * 2 ** intentos} seconds", error, id)
+                for id, intentos, error in resultados if error is not None
+            ]
+            # Un único commit por lote
+            cursor = self.db.conn.cursor()
+            cursor.executemany(
+                """UPDATE Recordatorio SET estado = 'enviado', intentos = intentos + 1,
+                enviado_en = datetime('now'), error = NULL WHERE id = ?""",
+                exitos
+            )
+            cursor.executemany(
+                """UPDATE Recordatorio SET estado = ?, intentos = intentos + 1,
+                proximo_intento = datetime('now', ?), error = ? WHERE id = ?""",
+                errores
+            )
+            self.db.conn.commit()
+            enviados += len(exitos)
+            errores_envio += len(errores)
+        
+        duracion = time.perf_counter() - inicio
+        return {
+            "enviados": enviados,
+            "errores": errores_envio,
+            "segundos": duracion,
+            "mensajes/s": enviados / duracion if duracion else 0.0
+        }
+
+# ====================== REPORTES ======================
+
+class ExportadorCitas:
+    """Exporta el reporte de citas por lotes (fetchmany) a CSV o JSON Lines,
+    sin cargar el resultado completo en memoria"""
+    COLUMNAS = ("id", "animal", "fecha", "servicio", "veterinario")
+    FORMATOS = ("csv", "jsonl")
+    
+    def __init__(self, db, ruta_salida, formato="csv", desde=None, hasta=None, tamano_lote=1000):
+        if formato not in self.FORMATOS:
+            raise ValueError(f"Formato de reporte desconocido: {formato}")
+        # Database de la que se abre la conexión del hilo exportador
+        self.db = db
+        self.ruta_salida = ruta_salida
+        self.formato = formato
+        self.desde = desde
+        self.hasta = hasta
+        self.tamano_lote = tamano_lote
+    
+    def exportar(self, conn, progreso=None):
+        """Escribe el reporte y devuelve el número de citas exportadas.
+        `progreso(n)` se llama tras cada lote"""
+        condiciones = []
+        parametros = []
+        if self.desde:
+            condiciones.append("c.fecha >= ?")
+            parametros.append(self.desde)
+        if self.hasta:
+            condiciones.append("c.fecha < date(?, '+1 day')")
+            parametros.append(self.hasta)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT c.id, a.nombre, c.fecha, s.nombre, v.nombre 
+        FROM Cita c
+        JOIN Animal a ON c.animal_id = a.id
+        JOIN Servicio s ON c.servicio_id = s.id
+        JOIN Veterinario v ON c.veterinario_id = v.id
+        {where}
+        ORDER BY c.fecha DESC
+        """, parametros)
+        
+        total = 0
+        with open(self.ruta_salida, "w", newline="", encoding="utf-8") as f:
+            if self.formato == "csv":
+                escritor = csv.writer(f)
+                escritor.writerow(self.COLUMNAS)
+            while True:
+                lote = cursor.fetchmany(self.tamano_lote)
+                if not lote:
+                    break
+                if self.formato == "csv":
+                    escritor.writerows(lote)
+                else:
+                    f.writelines(
+                        json.dumps(dict(zip(self.COLUMNAS, fila)), ensure_ascii=False) + "\n"
+                        for fila in lote
+                    )
+                total += len(lote)
+                if progreso:
+                    progreso(total)
+        return total
+    
+    def iniciar_en_segundo_plano(self):
+        """Exporta en un hilo con su propia conexión. Devuelve una cola con mensajes
+        ("progreso", n), ("fin", n) o ("error", mensaje) para que la interfaz la consulte"""
+        mensajes = queue.Queue()
+        
+        def trabajar():
+            try:
+                conexion = self.db.abrir_secundaria()
+            except ErrorVeterinaria as e:
+                mensajes.put(("error", str(e)))
+                return
+            try:
+                total = self.exportar(conexion.conn, lambda n: mensajes.put(("progreso", n)))
+                mensajes.put(("fin", total))
+            except (sqlite3.Error, OSError) as e:
+                mensajes.put(("error", str(e)))
+            finally:
+                conexion.conn.close()
+        
+        threading.Thread(target=trabajar, daemon=True).start()
+        return mensajes
+
+class ReporteIngresos:
+    """Reporte de ingresos por mes, servicio y veterinario. Lee los resúmenes
+    precalculados, no la tabla Pago"""
+    def __init__(self, ruta_salida):
+        self.ruta_salida = ruta_salida
+    
+    def escribir(self, conn):
+        """Escribe el reporte y devuelve su ruta"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT mes, ingresos, pagos FROM IngresoMensual ORDER BY mes")
+        meses = cursor.fetchall()
+        
+        cursor.execute("""
+        SELECT i.mes, s.nombre, i.ingresos, i.pagos
+        FROM IngresoMensualServicio i
+        JOIN Servicio s ON s.id = i.servicio_id
+        ORDER BY i.mes, i.ingresos DESC
+        """)
+        por_servicio = cursor.fetchall()
+        
+        cursor.execute("""
+        SELECT i.mes, v.nombre, i.ingresos, i.pagos
+        FROM IngresoMensualVeterinario i
+        JOIN Veterinario v ON v.id = i.veterinario_id
+        ORDER BY i.mes, i.ingresos DESC
+        """)
+        por_veterinario = cursor.fetchall()
+        
+        with open(self.ruta_salida, "w") as f:
+            f.write("=== Reporte de Ingresos ===\n\n")
+            f.write("Mes\t\tIngresos\tCitas\n")
+            f.write("=" * 50 + "\n")
+            for row in meses:
+                f.write(f"{row[0]}\t${row[1]:.2f}\t\t{row[2]}\n")
             
+            for titulo, filas in (("Servicio", por_servicio), ("Veterinario", por_veterinario)):
+                f.write(f"\n=== Ingresos por {titulo} ===\n\n")
+                f.write(f"Mes\t\t{titulo}\t\tIngresos\tCitas\n")
+                f.write("=" * 50 + "\n")
+                for mes, nombre, ingresos, pagos in filas:
+                    f.write(f"{mes}\t{nombre}\t${ingresos:.2f}\t\t{pagos}\n")
+        return self.ruta_salida
+
+# ====================== IMPORTACIÓN ======================
+
+class ImportadorDatos:
+    """Importa animales, propietarios, sus asociaciones e historiales desde CSV o
+    JSON Lines. Lee el archivo por lotes, valida cada lote completo y lo inserta
+    con executemany en una transacción por lote. La columna id es opcional;
+    si viene, permite asociar propietarios y animales con los ids del archivo"""
+    FORMATOS = ("csv", "jsonl")
+    
+    # tabla: (columnas admitidas, obligatorias, enteras, fechas)
+    TABLAS = {
+        "Animal": (("id", "nombre", "especie", "raza", "fecha_nacimiento"),
+                   ("nombre",), ("id",), ("fecha_nacimiento",)),
+        "Propietario": (("id", "nombre", "telefono", "email"),
+                        ("nombre", "telefono"), ("id",), ()),
+        "Propietario_Animal": (("propietario_id", "animal_id"),
+                               ("propietario_id", "animal_id"), ("propietario_id", "animal_id"), ()),
+        "HistorialMedico": (("id", "fecha", "tipo", "descripcion", "tratamiento", "animal_id", "veterinario_id"),
+                            ("fecha", "tipo", "descripcion", "animal_id", "veterinario_id"),
+                            ("id", "animal_id", "veterinario_id"), ("fecha",))
+    }
+    
+    # Columnas que apuntan a otra tabla; el id debe existir antes de importar la fila
+    REFERENCIAS = {
+        "Propietario_Animal": {"propietario_id": "Propietario", "animal_id": "Animal"},
+        "HistorialMedico": {"animal_id": "Animal", "veterinario_id": "Veterinario"}
+    }
+    
+    def __init__(self, db, tamano_lote=5000):
+        self.db = db
+        self.tamano_lote = tamano_lote
+    
+    def leer(self, ruta, formato):
+        """Devuelve un iterador de (línea, registro) sin cargar el archivo entero"""
+        with open(ruta, newline="", encoding="utf-8") as f:
+            if formato == "csv":
+                # La línea 1 es la cabecera
+                yield from enumerate(csv.DictReader(f), start=2)
+            else:
+                for linea, texto in enumerate(f, start=1):
+                    if texto.strip():
+                        try:
+                            yield linea, json.loads(texto)
+                        except json.JSONDecodeError:
+                            yield linea, None
+    
+    def validar(self, tabla, columnas, lote):
+        """Separa un lote en filas listas para executemany y rechazos (línea, motivo)"""
+        _, obligatorias, enteras, fechas = self.TABLAS[tabla]
+        validas, rechazadas = [], []
+        for linea, registro in lote:
+            if not isinstance(registro, dict):
+                rechazadas.append((linea, "registro ilegible"))
+                continue
+            
+            fila = [None if registro.get(columna) in ("", None) else registro[columna] for columna in columnas]
+            valores = dict(zip(columnas, fila))
+            faltan = [columna for columna in obligatorias if valores.get(columna) is None]
+            if faltan:
+                rechazadas.append((linea, f"faltan {', '.join(faltan)}"))
+                continue
+            try:
+                # JSON Lines admite cualquier tipo; solo pasan texto y números
+                for columna in columnas:
+                    valor = valores[columna]
+                    if isinstance(valor, bool) or not isinstance(valor, (str, int, float, type(None))):
+                        raise TypeError(columna)
+                    if isinstance(valor, float) and columna in enteras and not valor.is_integer():
+                        raise ValueError(columna)
+                    if isinstance(valor, (int, float)) and columna not in enteras:
+                        valores[columna] = str(valor)
+                for columna in enteras:
+                    if valores.get(columna) is not None:
+                        valores[columna] = int(valores[columna])
+                for columna in fechas:
+                    if valores.get(columna) is not None:
+                        datetime.strptime(valores[columna], "%Y-%m-%d")
+            except (ValueError, TypeError):
+                rechazadas.append((linea, f"valor inválido en {columna}"))
+                continue
+            validas.append((linea, tuple(valores[columna] for columna in columnas)))
+        return validas, rechazadas
+    
+    def validar_referencias(self, cursor, tabla, columnas, validas, rechazadas):
+        """Rechaza las filas cuyos ids de otras tablas no existen. Una consulta
+        por columna y lote"""
+        for columna, destino in self.REFERENCIAS.get(tabla, {}).items():
+            posicion = columnas.index(columna)
+            ids = list({fila[posicion] for _, fila in validas})
+            if not ids:
+                continue
+            cursor.execute(f"SELECT id FROM {destino} WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            existentes = {id for id, in cursor.fetchall()}
+            for linea, fila in validas:
+                if fila[posicion] not in existentes:
+                    rechazadas.append((linea, f"{columna} {fila[posicion]} no existe en {destino}"))
+            validas = [(linea, fila) for linea, fila in validas if fila[posicion] in existentes]
+        return validas
+    
+    def insertar_lote(self, cursor, sentencia, validas, rechazadas):
+        """Inserta el lote con executemany; si alguna fila viola una restricción,
+        repite el lote fila a fila para rechazar solo las que fallan"""
+        try:
+            cursor.executemany(sentencia, [fila for _, fila in validas])
+            return len(validas)
+        except sqlite3.IntegrityError:
+            self.db.conn.rollback()
+        
+        insertadas = 0
+        for linea, fila in validas:
+            try:
+                cursor.execute(sentencia, fila)
+                insertadas += 1
+            except sqlite3.IntegrityError as e:
+                rechazadas.append((linea, str(e)))
+        return insertadas
+    
+    def importar(self, tabla, ruta, formato=None, progreso=None):
+        """Importa el archivo en `tabla` y devuelve las métricas de la importación.
+        El formato se deduce de la extensión si no se indica. `progreso(n)` se
+        llama tras cada lote confirmado"""
+        if tabla not in self.TABLAS:
+            raise DatosInvalidos(f"Tabla no importable: {tabla}")
+        formato = formato or os.path.splitext(ruta)[1].lstrip(".").lower()
+        if formato not in self.FORMATOS:
+            raise DatosInvalidos(f"Formato de importación desconocido: {formato}")
+        
+        inicio = time.perf_counter()
+        registros = self.leer(ruta, formato)
+        primer_lote = list(itertools.islice(registros, self.tamano_lote))
+        # Se insertan siempre todas las columnas admitidas; las que falten en un
+        # registro van como NULL, así los lotes posteriores no pierden columnas
+        columnas = list(self.TABLAS[tabla][0])
+        presentes = set().union(*(registro for _, registro in primer_lote if isinstance(registro, dict)))
+        if not presentes & set(columnas):
+            raise DatosInvalidos(f"El archivo no contiene registros legibles de {tabla}")
+        sentencia = (f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+                     f"VALUES ({', '.join('?' * len(columnas))})")
+        
+        cursor = self.db.conn.cursor()
+        importadas = 0
+        rechazos = []
+        lote = primer_lote
+        while lote:
+            validas, rechazadas = self.validar(tabla, columnas, lote)
+            validas = self.validar_referencias(cursor, tabla, columnas, validas, rechazadas)
+            if tabla == "HistorialMedico":
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM HistorialMedico")
+                maximo_anterior = cursor.fetchone()[0]
+            importadas += self.insertar_lote(cursor, sentencia, validas, rechazadas)
+            if tabla == "HistorialMedico":
+                # Las vacunaciones importadas también alimentan las alertas
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM HistorialMedico")
+                ids = [fila[0] for _, fila in validas if fila[0] is not None]
+                cursor.execute(Database.VACUNAS_DESDE_HISTORIAL,
+                               (min(ids + [maximo_anterior + 1]), cursor.fetchone()[0]))
+            self.db.conn.commit()
+            rechazos.extend(rechazadas)
+            if progreso:
+                progreso(importadas)
+            lote = list(itertools.islice(registros, self.tamano_lote))
+        
+        duracion = time.perf_counter() - inicio
+        return {
+            "importadas": importadas,
+            "rechazadas": rechazos,
+            "segundos": duracion,
+            "filas/s": importadas / duracion if duracion else 0.0
+        }
+
+# ====================== DATOS SINTÉTICOS ======================
+
+class GeneradorDatos:
+    """Llena la base con una clínica sintética de `citas` citas. Con la misma
+    semilla genera siempre los mismos datos, con fechas relativas al día
+    de hoy. Proporciones: unas 4 citas por
+    animal, 1 a 4 animales por propietario, un historial por cita pasada y el
+    pago del 85% de las citas pasadas; las citas llegan hasta 30 días en el
+    futuro. Las citas se generan e insertan por lotes para acotar la memoria"""
+    ESPECIES = [("Perro", 50, ["Mestizo", "Labrador", "Pastor Alemán", "Chihuahua", "Poodle", "Bulldog"]),
+                ("Gato", 35, ["Doméstico", "Siamés", "Persa", "Maine Coon"]),
+                ("Conejo", 6, ["Enano", "Belier"]),
+                ("Ave", 5, ["Periquito", "Canario", "Loro"]),
+                ("Hurón", 4, ["Estándar"])]
+    NOMBRES_ANIMAL = ["Firulais", "Luna", "Max", "Rocky", "Nala", "Simba", "Toby", "Kira", "Coco",
+                      "Lola", "Bruno", "Mia", "Thor", "Canela", "Oreo", "Pelusa", "Manchas", "Chispa"]
+    NOMBRES = ["Juan", "María", "José", "Ana", "Luis", "Carmen", "Carlos", "Laura", "Jorge", "Sofía",
+               "Miguel", "Elena", "Pedro", "Lucía", "Fernando", "Isabel"]
+    APELLIDOS = ["García", "Martínez", "López", "Hernández", "González", "Pérez", "Sánchez",
+                 "Ramírez", "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Morales"]
+    # (nombre, precio, peso, tipo de historial, motivos)
+    SERVICIOS = [("Consulta General", 300.0, 45, "Consulta", ["Revisión anual", "Decaimiento", "Vómitos", "Cojera"]),
+                 ("Vacunación", 250.0, 25, "Vacunación", ["Vacuna anual"]),
+                 ("Desparasitación", 180.0, 12, "Control", ["Desparasitación trimestral"]),
+                 ("Estética", 350.0, 10, "Control", ["Baño y corte"]),
+                 ("Análisis Clínicos", 600.0, 6, "Consulta", ["Análisis de sangre", "Urianálisis"]),
+                 ("Cirugía", 2500.0, 2, "Cirugía", ["Esterilización", "Extracción dental"])]
+    VACUNAS = ["Rabia", "Parvovirus", "Moquillo", "Triple felina", "Leptospirosis"]
+    # Refuerzos de cachorro a las 3 semanas y dosis anuales, para que haya alertas
+    # en la ventana de los próximos días con cualquier volumen
+    INTERVALOS_VACUNA = (21, 365)
+    TAMANO_LOTE = 10000
+    
+    def __init__(self, db, semilla=42):
+        self.db = db
+        self.azar = random.Random(semilla)
+    
+    def insertar(self, sentencia, filas):
+        cursor = self.db.conn.cursor()
+        for inicio in range(0, len(filas), self.TAMANO_LOTE):
+            cursor.executemany(sentencia, filas[inicio:inicio + self.TAMANO_LOTE])
+            self.db.conn.commit()
+    
+    def siguiente_id(self, tabla):
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}")
+        return cursor.fetchone()[0]
+    
+    def generar(self, citas):
+        """Inserta los datos y devuelve cuántas filas creó en cada tabla"""
+        azar = self.azar
+        cursor = self.db.conn.cursor()
+        
+        # Servicios y veterinarios; los horarios libres crecen con el volumen
+        cursor.executemany("INSERT OR IGNORE INTO Servicio (nombre, precio) VALUES (?, ?)",
+                           [(nombre, precio) for nombre, precio, *_ in self.SERVICIOS])
+        cursor.execute(f"SELECT nombre, id FROM Servicio WHERE nombre IN ({', '.join('?' * len(self.SERVICIOS))})",
+                       [nombre for nombre, *_ in self.SERVICIOS])
+        servicios = dict(cursor.fetchall())
+        primer_veterinario = self.siguiente_id("Veterinario")
+        veterinarios = list(range(primer_veterinario, primer_veterinario + max(5, citas // 20000)))
+        cursor.executemany("INSERT INTO Veterinario (id, nombre, email, password) VALUES (?, ?, ?, '')",
+                           [(id, f"Dr. {azar.choice(self.APELLIDOS)}", f"vet{id}@vet.com")
+                            for id in veterinarios])
+        # Datos sintéticos: todas las cuentas comparten una clave derivada una sola vez
+        clave = derivar_clave("vet123")
+        cursor.executemany("INSERT INTO Usuario (email, rol, persona_id, clave) VALUES (?, 'Veterinario', ?, ?)",
+                           [(f"vet{id}@vet.com", id, clave) for id in veterinarios])
+        self.db.conn.commit()
+        
+        # Propietarios con 1 a 4 animales
+        primer_propietario, primer_animal = self.siguiente_id("Propietario"), self.siguiente_id("Animal")
+        propietarios, animales, asociaciones = [], [], []
+        total_animales = max(1, citas // 4)
+        while len(animales) < total_animales:
+            id_propietario = primer_propietario + len(propietarios)
+            nombre, apellido = azar.choice(self.NOMBRES), azar.choice(self.APELLIDOS)
+            propietarios.append((id_propietario, f"{nombre} {apellido}", f"55{azar.randrange(10**8):08d}",
+                                 f"{nombre.lower()}.{id_propietario}@correo.com"))
+            for _ in range(azar.choices((1, 2, 3, 4), (60, 25, 10, 5))[0]):
+                id_animal = primer_animal + len(animales)
+                especie, raza = self.elegir_especie()
+                nacimiento = date.today() - timedelta(days=azar.randrange(60, 15 * 365))
+                animales.append((id_animal, azar.choice(self.NOMBRES_ANIMAL), especie, raza, nacimiento.isoformat()))
+                asociaciones.append((id_propietario, id_animal))
+        self.insertar("INSERT INTO Propietario (id, nombre, telefono, email) VALUES (?, ?, ?, ?)", propietarios)
+        self.insertar("INSERT INTO Animal (id, nombre, especie, raza, fecha_nacimiento) VALUES (?, ?, ?, ?, ?)", animales)
+        self.insertar("INSERT INTO Propietario_Animal (propietario_id, animal_id) VALUES (?, ?)", asociaciones)
+        
+        # Citas en huecos de 30 minutos sin solapes, hacia atrás desde dentro de 30 días;
+        # alrededor de un 30% de los huecos quedan libres
+        ahora = datetime.now()
+        ultimo_dia = datetime.combine(date.today() + timedelta(days=30), datetime.min.time())
+        huecos_por_dia = (Database.HORA_CIERRE - Database.HORA_APERTURA) * 60 // Cita.DURACION_MINUTOS
+        pesos = [peso for _, _, peso, _, _ in self.SERVICIOS]
+        primera_cita = self.siguiente_id("Cita")
+        primer_historial = self.siguiente_id("HistorialMedico")
+        filas_citas, agenda, pagos, historial = [], [], [], []
+        totales = {"Cita": 0, "Pago": 0, "HistorialMedico": 0}
+        hueco = 0
+        while totales["Cita"] + len(filas_citas) < citas:
+            posicion, id_veterinario = divmod(hueco, len(veterinarios))
+            id_veterinario = veterinarios[id_veterinario]
+            hueco += 1
+            if azar.random() < 0.3:
+                continue
+            dia, indice = divmod(posicion, huecos_por_dia)
+            inicio = (ultimo_dia - timedelta(days=dia)
+                      + timedelta(hours=Database.HORA_APERTURA, minutes=indice * Cita.DURACION_MINUTOS))
+            fecha = inicio.strftime(Cita.FORMATO_FECHA)
+            nombre, precio, _, tipo, motivos = azar.choices(self.SERVICIOS, pesos)[0]
+            id_cita = primera_cita + totales["Cita"] + len(filas_citas)
+            id_animal = primer_animal + azar.randrange(len(animales))
+            filas_citas.append((id_cita, fecha, azar.choice(motivos), id_animal, id_veterinario, servicios[nombre]))
+            agenda.append((id_cita, id_veterinario, fecha,
+                           (inicio + timedelta(minutes=Cita.DURACION_MINUTOS)).strftime(Cita.FORMATO_FECHA)))
+            if inicio > ahora:
+                continue
+            if azar.random() < 0.85:
+                pagos.append((precio, inicio.date().isoformat(), "completado", id_cita))
+            if tipo == "Vacunación":
+                proxima = inicio.date() + timedelta(days=azar.choice(self.INTERVALOS_VACUNA))
+                descripcion = f"Vacuna: {azar.choice(self.VACUNAS)}\nPróxima aplicación: {proxima}"
+                tratamiento = None
+            else:
+                descripcion = f"{azar.choice(motivos)}: exploración sin hallazgos graves"
+                tratamiento = azar.choice([None, "Antiinflamatorio 5 días", "Dieta blanda", "Antibiótico 7 días"])
+            historial.append((inicio.date().isoformat(), tipo, descripcion, tratamiento, id_animal, id_veterinario))
+            if len(filas_citas) >= self.TAMANO_LOTE:
+                self.insertar_citas(filas_citas, agenda, pagos, historial, totales)
+        self.insertar_citas(filas_citas, agenda, pagos, historial, totales)
+        cursor.execute(Database.VACUNAS_DESDE_HISTORIAL, (primer_historial, self.siguiente_id("HistorialMedico")))
+        self.db.conn.commit()
+        self.db.catalogos.invalidar()
+        
+        return {"Propietario": len(propietarios), "Animal": len(animales),
+                "Veterinario": len(veterinarios), **totales}
+    
+    def insertar_citas(self, filas_citas, agenda, pagos, historial, totales):
+        """Inserta un lote de citas con su agenda, pagos e historial y vacía las listas"""
+        self.insertar("""INSERT INTO Cita (id, fecha, motivo, animal_id, veterinario_id, servicio_id)
+                      VALUES (?, ?, ?, ?, ?, ?)""", filas_citas)
+        self.insertar("INSERT INTO AgendaVeterinario (cita_id, veterinario_id, inicio, fin) VALUES (?, ?, ?, ?)", agenda)
+        self.insertar("INSERT INTO Pago (monto, fecha, estado, cita_id) VALUES (?, ?, ?, ?)", pagos)
+        self.insertar("""INSERT INTO HistorialMedico (fecha, tipo, descripcion, tratamiento, animal_id, veterinario_id)
+                      VALUES (?, ?, ?, ?, ?, ?)""", historial)
+        for tabla, filas in (("Cita", filas_citas), ("Pago", pagos), ("HistorialMedico", historial)):
+            totales[tabla] += len(filas)
+        for filas in (filas_citas, agenda, pagos, historial):
+            filas.clear()
+    
+    def elegir_especie(self):
+        especie, _, razas = self.azar.choices(self.ESPECIES, [peso for _, peso, _ in self.ESPECIES])[0]
+        return especie, self.azar.choice(razas)
 
 # ====================== INTERFAZ DE USUARIO ======================
 
+class LlamadaMedida(tk.CallWrapper):
+    """Sustituye a tkinter.CallWrapper mientras hay un MonitorInterfaz instalado:
+    todos los command, bind y after pasan por el monitor"""
+    monitor = None
+    
+    def __call__(self, *args):
+        monitor = LlamadaMedida.monitor
+        if monitor is None:
+            return super().__call__(*args)
+        return monitor.medir(self.func, super().__call__, *args)
+
+class MonitorInterfaz:
+    """Perfilador opcional del bucle de eventos de Tk. Mide el tiempo de cada
+    manejador de eventos y el retraso del bucle con un latido de after(); los
+    manejadores y retrasos que superan el umbral se escriben en `ruta` (JSON Lines)
+    junto con un resumen final, para comparar entre versiones con --comparar-perfil.
+    Con perfilar=True cada manejador se ejecuta bajo cProfile y se guardan las
+    funciones más costosas de los que superan el umbral. Se instala antes de
+    crear la ventana principal, para medir también la pantalla de inicio de sesión,
+    y se conecta a ella después para el latido"""
+    INTERVALO_LATIDO_MS = 100
+    UMBRAL_MS = 100
+    FUNCIONES_PERFIL = 15
+    MUESTRAS = 1000
+    
+    def __init__(self, ruta="perfil_interfaz.jsonl", umbral_ms=None, perfilar=False):
+        self.root = None
+        self.ruta = ruta
+        self.umbral_ms = self.UMBRAL_MS if umbral_ms is None else umbral_ms
+        self.perfilar = perfilar
+        self.manejadores = {}
+        self.retrasos = deque(maxlen=self.MUESTRAS)
+        self.ultimo_manejador = None
+        self.id_latido = None
+    
+    def instalar(self):
+        # Los command, bind y after registrados desde aquí pasan por LlamadaMedida
+        LlamadaMedida.monitor = self
+        tk.CallWrapper = LlamadaMedida
+        self.escribir({"tipo": "inicio", "momento": f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+                       "esquema": Database.VERSION_ESQUEMA, "umbral_ms": self.umbral_ms})
+        return self
+    
+    def conectar(self, root):
+        """Empieza a medir el retraso del bucle de eventos de `root`"""
+        self.root = root
+        self.esperado = time.perf_counter() + self.INTERVALO_LATIDO_MS / 1000
+        self.id_latido = self.root.after(self.INTERVALO_LATIDO_MS, self.latido)
+    
+    def cerrar(self):
+        """Desinstala el monitor y escribe el resumen"""
+        tk.CallWrapper = LlamadaMedida.__bases__[0]
+        LlamadaMedida.monitor = None
+        if self.id_latido:
+            self.root.after_cancel(self.id_latido)
+            self.id_latido = None
+        self.escribir({"tipo": "resumen", "momento": f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+                       "retraso_bucle": self.estadisticas(self.retrasos),
+                       "manejadores": {nombre: self.estadisticas(muestras)
+                                       for nombre, muestras in self.manejadores.items()}})
+    
+    def latido(self):
+        # Lo que el after se retrasa respecto a lo programado es lo que el bucle estuvo bloqueado
+        ahora = time.perf_counter()
+        retraso = max(0.0, (ahora - self.esperado) * 1000)
+        self.retrasos.append(retraso)
+        if retraso >= self.umbral_ms:
+            self.escribir({"tipo": "bloqueo", "ms": round(retraso, 1), "manejador": self.ultimo_manejador})
+        self.esperado = ahora + self.INTERVALO_LATIDO_MS / 1000
+        self.id_latido = self.root.after(self.INTERVALO_LATIDO_MS, self.latido)
+    
+    def nombre_manejador(self, funcion):
+        # after() envuelve la función en un `callit` local; se busca la original en su cierre
+        if getattr(funcion, "__qualname__", "").endswith("after.<locals>.callit"):
+            for celda in funcion.__closure__ or ():
+                contenido = celda.cell_contents
+                if callable(contenido) and not isinstance(contenido, tk.Misc):
+                    funcion = contenido
+                    break
+        # Los envoltorios (p. ej. el terminar de en_segundo_plano) apuntan al manejador real
+        funcion = getattr(funcion, "__wrapped__", funcion)
+        # procesar_pendientes mide aparte cada resultado que entrega
+        if funcion == self.latido or getattr(funcion, "__func__", None) is EjecutorBD.procesar_pendientes:
+            return None
+        return getattr(funcion, "__qualname__", None) or type(funcion).__name__
+    
+    def medir(self, funcion, llamar, *args):
+        nombre = self.nombre_manejador(funcion)
+        if nombre is None:
+            return llamar(*args)
+        
+        perfil = cProfile.Profile() if self.perfilar else None
+        inicio = time.perf_counter()
+        try:
+            if perfil:
+                return perfil.runcall(llamar, *args)
+            return llamar(*args)
+        finally:
+            milisegundos = (time.perf_counter() - inicio) * 1000
+            self.manejadores.setdefault(nombre, deque(maxlen=self.MUESTRAS)).append(milisegundos)
+            if milisegundos >= self.umbral_ms:
+                self.ultimo_manejador = nombre
+                registro = {"tipo": "manejador", "nombre": nombre, "ms": round(milisegundos, 1)}
+                if perfil:
+                    salida = io.StringIO()
+                    pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(self.FUNCIONES_PERFIL)
+                    registro["perfil"] = salida.getvalue()
+                self.escribir(registro)
+    
+    def estadisticas(self, muestras):
+        ordenadas = sorted(muestras)
+        if not ordenadas:
+            return {"n": 0}
+        return {"n": len(ordenadas), "mediana_ms": round(statistics.median(ordenadas), 2),
+                "p95_ms": round(ordenadas[max(0, int(len(ordenadas) * 0.95) - 1)], 2),
+                "max_ms": round(ordenadas[-1], 2)}
+    
+    def escribir(self, registro):
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+class SelectorAnimal(tk.Frame):
+    """Buscador de animales mientras se escribe: solo muestra una ventana
+    acotada de resultados y devuelve directamente el id seleccionado. Con un
+    EjecutorBD la consulta se hace fuera del hilo de la interfaz. No consulta
+    hasta que se escribe algo"""
+    RETARDO_BUSQUEDA_MS = 150
+    
+    def __init__(self, padre, db, limite=8, sin_propietario=False, al_seleccionar=None, ejecutor=None):
+        super().__init__(padre)
+        self.db = db
+        self.ejecutor = ejecutor
+        # Número de la última búsqueda lanzada; las respuestas anteriores se descartan
+        self.busquedas = 0
+        self.limite = limite
+        self.sin_propietario = sin_propietario
+        self.al_seleccionar = al_seleccionar
+        self.resultados = []
+        self.id_seleccionado = None
+        self.busqueda_pendiente = None
+        
+        self.texto = tk.StringVar()
+        tk.Entry(self, textvariable=self.texto).pack(fill="x")
+        self.lista = tk.Listbox(self, height=limite, exportselection=False)
+        self.lista.pack(fill="x")
+        
+        self.texto.trace_add("write", self.programar_busqueda)
+        self.lista.bind("<<ListboxSelect>>", self.seleccionar)
+    
+    def programar_busqueda(self, *args):
+        # Espera a que el usuario deje de teclear antes de consultar
+        if self.busqueda_pendiente:
+            self.after_cancel(self.busqueda_pendiente)
+        self.busqueda_pendiente = self.after(self.RETARDO_BUSQUEDA_MS, self.buscar)
+    
+    def consultar(self, db, texto):
+        return db.buscar_animales(texto, self.limite, self.sin_propietario)
+    
+    def buscar(self):
+        self.busqueda_pendiente = None
+        texto = self.texto.get()
+        if not texto.strip():
+            # Descarta también la respuesta de una búsqueda aún en curso
+            self.busquedas += 1
+            self.mostrar([])
+            return
+        if self.ejecutor is None:
+            try:
+                self.mostrar(self.consultar(self.db, texto))
+            except sqlite3.Error as e:
+                messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
+            return
+        
+        self.busquedas += 1
+        numero = self.busquedas
+        
+        def terminar(resultados):
+            if numero == self.busquedas and self.winfo_exists():
+                self.mostrar(resultados)
+        
+        self.ejecutor.ejecutar(
+            self.consultar, texto, al_terminar=terminar,
+            al_fallar=lambda e: messagebox.showerror("Error", f"Error de base de datos: {str(e)}"))
+    
+    def mostrar(self, resultados):
+        self.resultados = resultados
+        self.lista.delete(0, tk.END)
+        for id, nombre, especie in self.resultados:
+            self.lista.insert(tk.END, f"{id} - {nombre} ({especie})" if especie else f"{id} - {nombre}")
+    
+    def seleccionar(self, event=None):
+        seleccion = self.lista.curselection()
+        if not seleccion:
+            return
+        self.id_seleccionado = self.resultados[seleccion[0]][0]
+        if self.al_seleccionar:
+            self.al_seleccionar(self.id_seleccionado)
+    
+    def obtener_id(self):
+        return self.id_seleccionado
+    
+    def refrescar(self):
+        self.id_seleccionado = None
+        self.buscar()
+
+class SelectorPropietario(SelectorAnimal):
+    """El mismo buscador acotado, sobre los propietarios. Pensado para filtros:
+    al cambiar el texto se olvida el propietario elegido"""
+    
+    def consultar(self, db, texto):
+        return db.buscar_propietarios(texto, self.limite)
+    
+    def programar_busqueda(self, *args):
+        self.id_seleccionado = None
+        super().programar_busqueda(*args)
+
+class TablaEnlazada(tk.Frame):
+    """Treeview ligado por clave a filas de la base de datos. Cada fila usa su clave
+    como iid, así que tras una escritura solo se tocan las filas que cambiaron.
+    Ordena al pulsar un encabezado y filtra por texto sin volver a consultar"""
+    RETARDO_FILTRO_MS = 150
+
+    def __init__(self, padre, columnas, obtener_filas=None, clave=0, ordenar_por=None,
+                 anchos=None, filtrable=True, acciones=(), **opciones):
+        super().__init__(padre)
+        self.columnas = columnas
+        # obtener_filas(ids) devuelve las filas actuales de esos ids
+        self.obtener_filas = obtener_filas
+        self.clave = clave
+        self.columna_orden = clave if ordenar_por is None else ordenar_por
+        self.descendente = False
+        self.filas = {}
+        # (orden, iid) de las filas que pasan el filtro, siempre ordenadas
+        self.visibles = []
+        self.texto_filtro = ""
+        self.filtro_pendiente = None
+
+        if filtrable:
+            marco_filtro = tk.Frame(self)
+            marco_filtro.pack(fill="x")
+            tk.Label(marco_filtro, text="Filtrar:").pack(side="left")
+            self.filtro = tk.StringVar()
+            tk.Entry(marco_filtro, textvariable=self.filtro).pack(side="left", fill="x", expand=True)
+            self.filtro.trace_add("write", self.programar_filtro)
+
+        # Una sola barra de botones para todas las filas: cada acción recibe los
+        # valores de la fila seleccionada y el doble clic lanza la primera
+        if acciones:
+            marco_acciones = tk.Frame(self)
+            marco_acciones.pack(side="bottom", fill="x")
+            for texto, accion in acciones:
+                tk.Button(marco_acciones, text=texto,
+                          command=lambda accion=accion: self.ejecutar(accion)).pack(side="left", padx=5, pady=2)
+
+        self.arbol = ttk.Treeview(self, columns=columnas, show="headings", **opciones)
+        if acciones:
+            self.arbol.bind("<Double-1>", lambda event: self.ejecutar(acciones[0][1]))
+        barra = ttk.Scrollbar(self, orient="vertical", command=self.arbol.yview)
+        self.arbol.configure(yscrollcommand=barra.set)
+        for indice, columna in enumerate(columnas):
+            self.arbol.heading(columna, text=columna, command=lambda indice=indice: self.ordenar(indice))
+            if anchos:
+                self.arbol.column(columna, width=anchos[indice])
+        barra.pack(side="right", fill="y")
+        self.arbol.pack(fill="both", expand=True)
+        self.marcar_encabezados()
+
+    @staticmethod
+    def valor_orden(valor):
+        # Números antes que texto y los vacíos al final, sin comparar tipos distintos
+        if valor is None:
+            return (2, "")
+        if isinstance(valor, (int, float)):
+            return (0, valor)
+        return (1, str(valor).lower())
+
+    def orden(self, iid):
+        valores = self.filas[iid]
+        return (self.valor_orden(valores[self.columna_orden]), self.valor_orden(valores[self.clave]), iid)
+
+    def coincide(self, valores):
+        return not self.texto_filtro or any(self.texto_filtro in str(valor).lower() for valor in valores)
+
+    def indice_arbol(self, posicion):
+        # self.visibles va siempre de menor a mayor; en orden descendente se recorre al revés
+        return len(self.visibles) - 1 - posicion if self.descendente else posicion
+
+    def quitar_visible(self, iid):
+        entrada = self.orden(iid)
+        posicion = bisect.bisect_left(self.visibles, entrada)
+        if posicion < len(self.visibles) and self.visibles[posicion] == entrada:
+            del self.visibles[posicion]
+            return True
+        return False
+
+    def colocar(self, fila):
+        """Inserta o actualiza una fila en su posición. Si no cambió no hace nada"""
+        iid = str(fila[self.clave])
+        valores = tuple(fila)
+        anterior = self.filas.get(iid)
+        if anterior == valores:
+            return False
+
+        visible = anterior is not None and self.quitar_visible(iid)
+        self.filas[iid] = valores
+
+        if self.coincide(valores):
+            entrada = self.orden(iid)
+            posicion = bisect.bisect_left(self.visibles, entrada)
+            self.visibles.insert(posicion, entrada)
+            indice = self.indice_arbol(posicion)
+            if anterior is None:
+                self.arbol.insert("", indice, iid=iid, values=valores)
+            else:
+                self.arbol.item(iid, values=valores)
+                # Se separa antes de moverla para que el índice no cuente la propia fila
+                if visible:
+                    self.arbol.detach(iid)
+                self.arbol.move(iid, "", indice)
+        elif anterior is None:
+            self.arbol.insert("", "end", iid=iid, values=valores)
+            self.arbol.detach(iid)
+        else:
+            self.arbol.item(iid, values=valores)
+            if visible:
+                self.arbol.detach(iid)
+        return True
+
+    def agregar(self, filas):
+        """Inserta o actualiza las filas dadas sin tocar las demás"""
+        return sum(self.colocar(fila) for fila in filas)
+
+    def cargar(self, filas):
+        """Deja la tabla igual a `filas`: solo inserta, actualiza o borra las diferencias"""
+        filas = list(filas)
+        nuevas = {str(fila[self.clave]) for fila in filas}
+        self.eliminar(*[iid for iid in self.filas if iid not in nuevas])
+        return self.agregar(filas)
+
+    def refrescar(self, ids, filas=None):
+        """Vuelve a leer solo las filas de `ids`; las que ya no existen se quitan.
+        Si se pasan las `filas` ya leídas (p. ej. en el EjecutorBD) no consulta"""
+        ids = list(ids)
+        if not ids:
+            return 0
+        if filas is None:
+            filas = self.obtener_filas(ids)
+        devueltas = {str(fila[self.clave]) for fila in filas}
+        self.eliminar(*[id for id in ids if str(id) not in devueltas])
+        return self.agregar(filas)
+
+    def eliminar(self, *ids):
+        for id in ids:
+            iid = str(id)
+            if iid in self.filas:
+                self.quitar_visible(iid)
+                del self.filas[iid]
+                self.arbol.delete(iid)
+
+    def vaciar(self):
+        if self.filas:
+            self.arbol.delete(*self.filas)
+        self.filas.clear()
+        self.visibles.clear()
+
+    def valores(self, id):
+        return self.filas.get(str(id))
+
+    def seleccion(self):
+        seleccion = self.arbol.selection()
+        return seleccion[0] if seleccion else None
+
+    def ejecutar(self, accion):
+        valores = self.valores(self.seleccion())
+        if valores:
+            accion(valores)
+
+    def programar_filtro(self, *args):
+        if self.filtro_pendiente:
+            self.after_cancel(self.filtro_pendiente)
+        self.filtro_pendiente = self.after(self.RETARDO_FILTRO_MS, self.aplicar_filtro)
+
+    def aplicar_filtro(self):
+        self.filtro_pendiente = None
+        self.texto_filtro = self.filtro.get().strip().lower()
+        self.reordenar()
+
+    def ordenar(self, columna):
+        if columna == self.columna_orden:
+            self.descendente = not self.descendente
+        else:
+            self.columna_orden, self.descendente = columna, False
+        self.reordenar()
+        self.marcar_encabezados()
+
+    def reordenar(self):
+        # Cambiar el orden o el filtro sí recorre toda la tabla, pero sin consultar la base
+        self.visibles = sorted(self.orden(iid) for iid, valores in self.filas.items()
+                               if self.coincide(valores))
+        iids = [iid for *_, iid in self.visibles]
+        if self.descendente:
+            iids.reverse()
+        # set_children deja fuera (separadas) las filas que no pasan el filtro
+        self.arbol.set_children("", *iids)
+
+    def marcar_encabezados(self):
+        for indice, columna in enumerate(self.columnas):
+            flecha = ""
+            if indice == self.columna_orden:
+                flecha = " ▼" if self.descendente else " ▲"
+            self.arbol.heading(columna, text=columna + flecha)
+
 class PantallaLogin:
     def __init__(self, root, db, mostrar_panel_callback):
         self.root = root
@@ -531,75 +3181,103 @@ class PantallaLogin:
         
         tk.Label(self.marco, text="Inicio de Sesión", font=("Arial", 16), bg="#f0f0f0").pack(pady=20)
         
-        tk.Label(self.marco, text="Rol:", bg="#f0f0f0").pack()
-        self.rol_var = tk.StringVar()
-        roles = ["Administrador", "Recepcionista", "Veterinario", "Propietario"]
-        combobox_rol = ttk.Combobox(self.marco, textvariable=self.rol_var, values=roles, state="readonly")
-        combobox_rol.pack()
-        
-        self.marco_email = tk.Frame(self.marco, bg="#f0f0f0")
-        self.marco_email.pack()
-        tk.Label(self.marco_email, text="Email:", bg="#f0f0f0").pack()
-        self.entrada_email = tk.Entry(self.marco_email)
+        # El rol lo determina la cuenta asociada al email
+        tk.Label(self.marco, text="Email:", bg="#f0f0f0").pack()
+        self.entrada_email = tk.Entry(self.marco)
         self.entrada_email.pack()
         
-        self.marco_password = tk.Frame(self.marco, bg="#f0f0f0")
-        self.marco_password.pack()
-        tk.Label(self.marco_password, text="Contraseña:", bg="#f0f0f0").pack()
-        self.entrada_password = tk.Entry(self.marco_password, show="*")
+        tk.Label(self.marco, text="Contraseña:", bg="#f0f0f0").pack()
+        self.entrada_password = tk.Entry(self.marco, show="*")
         self.entrada_password.pack()
+        self.entrada_password.bind("<Return>", lambda evento: self.verificar_login())
         
-        tk.Button(self.marco, text="Ingresar", command=self.verificar_login).pack(pady=20)
+        self.boton_ingresar = tk.Button(self.marco, text="Ingresar", command=self.verificar_login)
+        self.boton_ingresar.pack(pady=20)
         
-        self.rol_var.trace_add("write", self.actualizar_campos_login)
-
-    def actualizar_campos_login(self, *args):
-        if self.rol_var.get() == "Propietario":
-            self.marco_email.pack_forget()
-            self.marco_password.pack_forget()
-        else:
-            self.marco_email.pack()
-            self.marco_password.pack()
+        # Propietarios con cuenta pendiente: la contraseña escrita arriba pasa a ser la suya
+        self.boton_activar = tk.Button(self.marco, text="Primer acceso de propietario",
+                                       command=self.activar_cuenta)
+        self.boton_activar.pack()
 
     def verificar_login(self):
-        rol = self.rol_var.get()
+        email = self.entrada_email.get()
+        password = self.entrada_password.get()
         
-        if rol == "Propietario":
-            id_usuario = 1
-            nombre_usuario = "Propietario"
-            self.mostrar_panel_callback(rol, id_usuario, nombre_usuario)
-        else:
-            email = self.entrada_email.get()
-            password = self.entrada_password.get()
-            
-            # Validación básica de email
-            if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-                messagebox.showerror("Error", "Formato de email inválido")
-                return
-                
-            if not password:
-                messagebox.showerror("Error", "La contraseña es requerida")
-                return
+        # Validación básica de email
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            messagebox.showerror("Error", "Formato de email inválido")
+            return
             
-            try:
-                cursor = self.db.conn.cursor()
-                # Hasheamos la contraseña ingresada para comparar con la almacenada
-                hashed_password = hashlib.sha256(password.encode()).hexdigest()
-                cursor.execute(f"SELECT id, nombre FROM {rol} WHERE email = ? AND password = ?", 
-                             (email, hashed_password))
-                usuario = cursor.fetchone()
-                
-                if usuario:
-                    self.mostrar_panel_callback(rol, usuario[0], usuario[1])
-                else:
-                    messagebox.showerror("Error", "Credenciales incorrectas")
-            except sqlite3.Error as e:
-                messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
+        if not password:
+            messagebox.showerror("Error", "La contraseña es requerida")
+            return
+        
+        def terminar(usuario):
+            self.mostrar_panel_callback(*usuario)
+        
+        def fallar(error):
+            if self.boton_ingresar.winfo_exists():
+                self.boton_ingresar.config(state="normal")
+            if isinstance(error, ErrorVeterinaria):
+                messagebox.showerror("Error", str(error))
+            else:
+                messagebox.showerror("Error", f"Error de base de datos: {str(error)}")
+        
+        def autenticar(db, email, password):
+            # En el primer arranque las cuentas de prueba se crean en segundo plano
+            self.root.esperar_siembra()
+            return self.root.sesiones.autenticar(db, email, password)
+        
+        # La derivación de la clave tarda; se hace en un hilo del EjecutorBD
+        self.boton_ingresar.config(state="disabled")
+        self.root.ejecutor.ejecutar(autenticar, email, password,
+                                    al_terminar=terminar, al_fallar=fallar)
+
+    def activar_cuenta(self):
+        email = self.entrada_email.get()
+        password = self.entrada_password.get()
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            messagebox.showerror("Error", "Formato de email inválido")
+            return
+        if not password:
+            messagebox.showerror("Error", "Escriba la contraseña que quiere usar")
+            return
+        codigo = simpledialog.askstring("Primer acceso", "Código de activación entregado en recepción:",
+                                        parent=self.root)
+        if not codigo:
+            return
+        
+        def activar(db):
+            self.root.esperar_siembra()
+            db.activar_cuenta(email, codigo, password)
+            self.root.sesiones.invalidar(email)
+        
+        def terminar(resultado):
+            messagebox.showinfo("Cuenta activada", "Ya puede ingresar con su email y contraseña")
+            if self.marco.winfo_exists():
+                self.verificar_login()
+        
+        def fallar(error):
+            if self.boton_activar.winfo_exists():
+                self.boton_activar.config(state="normal")
+            messagebox.showerror("Error", str(error) if isinstance(error, ErrorVeterinaria)
+                                 else f"Error de base de datos: {str(error)}")
+        
+        self.boton_activar.config(state="disabled")
+        self.root.ejecutor.ejecutar(activar, al_terminar=terminar, al_fallar=fallar)
 
 # [El resto del código permanece exactamente igual, solo se han modificado las clases anteriores]
 
 
 class PanelPrincipal:
+    TAMANO_PAGINA_ALERTAS = 50
+    TAMANO_PAGINA_BUSQUEDA = 50
+    TAMANO_PAGINA_HISTORIAL = 100
+    TAMANO_PAGINA_COBROS = 100
+    # Si es True, las pestañas no visitadas se construyen en segundo plano
+    PRECARGAR_PESTANAS = False
+    RETARDO_PRECARGA_MS = 200
+    
     def __init__(self, root, db, rol, id_usuario, nombre_usuario):
         self.root = root
         self.db = db
@@ -609,6 +3287,8 @@ class PanelPrincipal:
         self.cuaderno = ttk.Notebook(root)
         self.cuaderno.pack(expand=True, fill="both")
         self.texto_historial = None  # Lo inicializaremos después
+        self.constructores_pestanas = {}
+        self.tareas_en_curso = 0
         self.style = ttk.Style()
         self.style.configure('Titulo.TLabel', font=('Arial', 10, 'bold'))
         
@@ -621,7 +3301,8 @@ class PanelPrincipal:
         menu_archivo = tk.Menu(barra_menu, tearoff=0)
         menu_archivo.add_command(label="Cerrar Sesión", command=self.cerrar_sesion)
         menu_archivo.add_separator()
-        menu_archivo.add_command(label="Salir", command=self.root.quit)
+        # cerrar() guarda los perfiles y estadísticas y detiene el EjecutorBD
+        menu_archivo.add_command(label="Salir", command=self.root.cerrar)
         barra_menu.add_cascade(label="Archivo", menu=menu_archivo)
 
     def cerrar_sesion(self):
@@ -644,6 +3325,75 @@ class PanelPrincipal:
         elif self.rol == "Administrador":
             self.pestanas_administrador()
 
+    def agregar_pestanas(self, pestanas):
+        """Añade las pestañas vacías; cada una se construye la primera vez que se muestra"""
+        for texto, comando in pestanas:
+            pestana = ttk.Frame(self.cuaderno)
+            self.cuaderno.add(pestana, text=texto)
+            self.constructores_pestanas[str(pestana)] = (pestana, comando)
+        
+        self.cuaderno.bind("<<NotebookTabChanged>>", self.construir_pestana_actual)
+        self.construir_pestana_actual()
+        if self.PRECARGAR_PESTANAS:
+            self.root.after(self.RETARDO_PRECARGA_MS, self.precargar_pestanas)
+
+    def construir_pestana(self, nombre):
+        pendiente = self.constructores_pestanas.pop(nombre, None)
+        if pendiente:
+            pestana, comando = pendiente
+            comando(pestana)
+
+    def construir_pestana_actual(self, event=None):
+        seleccionada = self.cuaderno.select()
+        if seleccionada:
+            self.construir_pestana(seleccionada)
+
+    def precargar_pestanas(self):
+        """Construye una pestaña pendiente por vuelta del bucle de eventos para no bloquear la interfaz"""
+        if not self.constructores_pestanas or not self.cuaderno.winfo_exists():
+            return
+        self.construir_pestana(next(iter(self.constructores_pestanas)))
+        if self.constructores_pestanas:
+            self.root.after(self.RETARDO_PRECARGA_MS, self.precargar_pestanas)
+
+    def en_segundo_plano(self, boton, funcion, *args, al_terminar=None):
+        """Ejecuta funcion(db, *args) en el EjecutorBD mostrando la interfaz ocupada
+        (botón deshabilitado, si lo hay, y cursor de espera) hasta que termina"""
+        if boton:
+            boton.config(state="disabled")
+        self.tareas_en_curso += 1
+        self.root.config(cursor="watch")
+        
+        def liberar():
+            self.tareas_en_curso -= 1
+            if not self.tareas_en_curso:
+                self.root.config(cursor="")
+            if boton and boton.winfo_exists():
+                boton.config(state="normal")
+        
+        def terminar(resultado):
+            liberar()
+            if al_terminar:
+                al_terminar(resultado)
+        if al_terminar:
+            terminar.__wrapped__ = al_terminar
+        
+        def fallar(error):
+            liberar()
+            if isinstance(error, ErrorVeterinaria):
+                messagebox.showerror("Error", str(error))
+            else:
+                messagebox.showerror("Error", f"Error de base de datos: {str(error)}")
+        
+        self.root.ejecutor.ejecutar(funcion, *args, al_terminar=terminar, al_fallar=fallar)
+
+    def combobox_catalogo(self, padre, catalogo, **opciones):
+        """Combobox que toma sus valores del catálogo en caché cada vez que se despliega"""
+        combobox = ttk.Combobox(padre, values=self.db.catalogos.opciones(catalogo), **opciones)
+        combobox.configure(postcommand=lambda: combobox.configure(
+            values=self.db.catalogos.opciones(catalogo)))
+        return combobox
+
     def pestanas_propietario(self):
         pestana1 = ttk.Frame(self.cuaderno)
         self.cuaderno.add(pestana1, text="Asociar Animal")
@@ -653,32 +3403,19 @@ class PanelPrincipal:
         self.id_animal_asociar = tk.Label(pestana1, text="")
         self.id_animal_asociar.pack()
     
-        # Combobox para seleccionar animal
-        tk.Label(pestana1, text="Seleccionar Animal:").pack()
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT a.id, a.nombre, a.especie 
-        FROM Animal a
-        LEFT JOIN Propietario_Animal pa ON a.id = pa.animal_id
-        WHERE pa.animal_id IS NULL
-         """)
-        animales = [f"{id} - {nombre} ({especie})" for id, nombre, especie in cursor.fetchall()]
-    
-        combobox_animal = ttk.Combobox(pestana1, values=animales, state="readonly")
-        combobox_animal.pack(pady=5)
-        combobox_animal.bind("<<ComboboxSelected>>", lambda e: self.id_animal_asociar.config(
-            text=combobox_animal.get().split(" - ")[0]))
+        # Buscador de animales disponibles para asociar
+        tk.Label(pestana1, text="Buscar animal disponible (nombre o ID):").pack()
+        self.selector_asociar = SelectorAnimal(
+            pestana1, self.db, sin_propietario=True, ejecutor=self.root.ejecutor,
+            al_seleccionar=lambda id: self.id_animal_asociar.config(text=str(id)))
+        self.selector_asociar.pack(pady=5)
     
         # Botón para asociar
-        tk.Button(pestana1, text="Asociar a mi cuenta", 
+        self.boton_asociar = tk.Button(pestana1, text="Asociar a mi cuenta", 
                  command=lambda: self.asociar_animal_propietario(
-                     combobox_animal.get().split(" - ")[0]
-                 )).pack(pady=10)
-    
-        # Lista de animales disponibles
-        tk.Label(pestana1, text="Animales disponibles para asociar:").pack(pady=10)
-        for animal in animales:
-            tk.Label(pestana1, text=animal).pack()
+                     self.selector_asociar.obtener_id()
+                 ))
+        self.boton_asociar.pack(pady=10)
     
         pestana2 = ttk.Frame(self.cuaderno)
         self.cuaderno.add(pestana2, text="Mis Animales")
@@ -691,55 +3428,43 @@ class PanelPrincipal:
              messagebox.showerror("Error", "ID de animal inválido")
              return
         
-        # Verificar que el animal existe y no está ya asociado
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id FROM Animal WHERE id = ?", (id_animal,))
-        if not cursor.fetchone():
-            messagebox.showerror("Error", f"No existe un animal con ID {id_animal}")
-            return
-    
-        cursor.execute("""
-        SELECT animal_id FROM Propietario_Animal 
-        WHERE animal_id = ? AND propietario_id = ?
-        """, (id_animal, self.id_usuario))
-        if cursor.fetchone():
-            messagebox.showerror("Error", "Este animal ya está asociado a tu cuenta")
-            return
-    
         propietario = Propietario(id=self.id_usuario)
-        if propietario.asociar_animal(id_animal, self.db):
+        
+        def asociar(db):
+            propietario.asociar_animal(id_animal, db)
+            # Solo se lee el animal recién asociado
+            return self.animales_propietario(db, [id_animal])
+        
+        def terminar(filas):
             messagebox.showinfo("Éxito", "Animal asociado correctamente")
-             # Actualizar la lista de animales
-            for widget in self.cuaderno.winfo_children():
-                if isinstance(widget, ttk.Notebook):
-                    for tab_id in widget.tabs():
-                        if "Mis Animales" in widget.tab(tab_id, "text"):
-                            widget.forget(tab_id)
-                            new_tab = ttk.Frame(widget)
-                            widget.add(new_tab, text="Mis Animales")
-                            self.mostrar_animales_propietario(new_tab)
-                            break
+            if self.tabla_animales.winfo_exists():
+                self.selector_asociar.refrescar()
+                self.tabla_animales.refrescar([id_animal], filas)
+        
+        self.en_segundo_plano(self.boton_asociar, asociar, al_terminar=terminar)
 
     def mostrar_animales_propietario(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT a.id, a.nombre, a.especie, a.raza, a.fecha_nacimiento 
-        FROM Animal a
-        JOIN Propietario_Animal pa ON a.id = pa.animal_id
-        WHERE pa.propietario_id = ?
-        """, (self.id_usuario,))
-        
-        for datos_animal in cursor.fetchall():
-            animal = Animal(*datos_animal)
-            marco = tk.Frame(pestana, borderwidth=2, relief="groove", padx=10, pady=10)
-            marco.pack(fill="x", padx=5, pady=5)
-            
-            edad = animal.calcular_edad()
-            
-            tk.Label(marco, text=f"Nombre: {animal.nombre}", font=("Arial", 10, "bold")).grid(row=0, column=0, sticky="w")
-            tk.Label(marco, text=f"Especie: {animal.especie}").grid(row=1, column=0, sticky="w")
-            tk.Label(marco, text=f"Raza: {animal.raza}").grid(row=2, column=0, sticky="w")
-            tk.Label(marco, text=f"Edad: {edad} años" if edad else "Edad: Desconocida").grid(row=3, column=0, sticky="w")
+        # El Treeview solo dibuja las filas visibles, sin widgets por animal
+        self.tabla_animales = TablaEnlazada(pestana, ("ID", "Nombre", "Especie", "Raza", "Edad"),
+                                            anchos=(60, 150, 120, 120, 100))
+        self.tabla_animales.pack(fill="both", expand=True, padx=5, pady=5)
+        self.en_segundo_plano(
+            None, self.animales_propietario,
+            al_terminar=lambda filas: self.tabla_animales.winfo_exists() and self.tabla_animales.cargar(filas))
+
+    def animales_propietario(self, db, ids=None):
+        """Filas (id, nombre, especie, raza, edad) de los animales del propietario,
+        todas o solo las de los ids indicados"""
+        propietario = Propietario(id=self.id_usuario)
+        filas = []
+        for animal in propietario.listar_animales(db, ids):
+            try:
+                edad = animal.calcular_edad()
+            except DatosInvalidos:
+                edad = None
+            filas.append((animal.id, animal.nombre, animal.especie, animal.raza,
+                          f"{edad} años" if edad else "Desconocida"))
+        return filas
 
     def pestanas_recepcionista(self):
         pestanas = [
@@ -747,13 +3472,11 @@ class PanelPrincipal:
             ("Modificar Animal", self.pestana_modificar_animal),
             ("Programar Cita", self.pestana_programar_cita),
             ("Registrar Pago", self.pestana_registrar_pago),
-            ("Enviar Recordatorios", self.pestana_enviar_recordatorios)
+            ("Enviar Recordatorios", self.pestana_enviar_recordatorios),
+            ("Acceso de Propietarios", self.pestana_acceso_propietarios)
         ]
         
-        for texto, comando in pestanas:
-            pestana = ttk.Frame(self.cuaderno)
-            self.cuaderno.add(pestana, text=texto)
-            comando(pestana)
+        self.agregar_pestanas(pestanas)
 
     def pestana_registrar_animal(self, pestana):
         campos = [
@@ -767,32 +3490,60 @@ class PanelPrincipal:
             tk.Label(pestana, text=etiqueta).grid(row=i, column=0, padx=5, pady=5, sticky="e")
             entrada.grid(row=i, column=1, padx=5, pady=5)
         
-        tk.Button(pestana, text="Registrar", 
+        self.boton_registrar_animal = tk.Button(pestana, text="Registrar", 
                  command=lambda: self.registrar_animal(
                      campos[0][1].get(),
                      campos[1][1].get(),
                      campos[2][1].get(),
                      campos[3][1].get()
-                 )).grid(row=len(campos), columnspan=2, pady=10)
+                 ))
+        self.boton_registrar_animal.grid(row=len(campos), columnspan=2, pady=10)
+        
+        # Alta masiva desde CSV o JSON Lines
+        marco_importar = tk.LabelFrame(pestana, text="Importar desde archivo")
+        marco_importar.grid(row=len(campos) + 1, columnspan=2, padx=5, pady=10, sticky="ew")
+        tk.Label(marco_importar, text="Tabla:").pack(side="left", padx=5)
+        combobox_tabla = ttk.Combobox(marco_importar, values=list(ImportadorDatos.TABLAS),
+                                      state="readonly", width=20)
+        combobox_tabla.set("Animal")
+        combobox_tabla.pack(side="left", padx=5)
+        boton_importar = tk.Button(marco_importar, text="Elegir archivo...")
+        boton_importar.config(command=lambda: self.importar_archivo(combobox_tabla.get(), boton_importar))
+        boton_importar.pack(side="left", padx=5)
+
+    def importar_archivo(self, tabla, boton):
+        ruta = filedialog.askopenfilename(
+            title=f"Importar {tabla}",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Todos", "*.*")])
+        if not ruta:
+            return
+        
+        def terminar(metricas):
+            rechazadas = metricas["rechazadas"]
+            detalle = "".join(f"\nLínea {linea}: {motivo}" for linea, motivo in rechazadas[:10])
+            messagebox.showinfo(
+                "Importación",
+                f"{metricas['importadas']} filas importadas ({metricas['filas/s']:.0f} filas/s), "
+                f"{len(rechazadas)} rechazadas{detalle}")
+        
+        self.en_segundo_plano(boton, lambda db: ImportadorDatos(db).importar(tabla, ruta),
+                              al_terminar=terminar)
 
     def registrar_animal(self, nombre, especie, raza, fecha_nacimiento):
         animal = Animal(nombre=nombre, especie=especie, raza=raza, fecha_nacimiento=fecha_nacimiento)
         recepcionista = Recepcionista(id=self.id_usuario)
-        if recepcionista.registrar_animal(animal, self.db):
-            messagebox.showinfo("Éxito", "Animal registrado")
+        self.en_segundo_plano(
+            self.boton_registrar_animal, lambda db: recepcionista.registrar_animal(animal, db),
+            al_terminar=lambda id_animal: messagebox.showinfo("Éxito", "Animal registrado"))
 
     def pestana_modificar_animal(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre FROM Animal")
-        animales = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-    
         tk.Label(pestana, text="ID del Animal:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.id_animal_label = tk.Label(pestana, text="")
         self.id_animal_label.grid(row=0, column=1, padx=5, pady=5, sticky="w")
     
-        tk.Label(pestana, text="Seleccionar Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        combobox_animal = ttk.Combobox(pestana, values=animales, state="readonly")
-        combobox_animal.grid(row=1, column=1, padx=5, pady=5)
+        tk.Label(pestana, text="Seleccionar Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="ne")
+        selector_animal = SelectorAnimal(pestana, self.db, ejecutor=self.root.ejecutor)
+        selector_animal.grid(row=1, column=1, padx=5, pady=5)
         
         campos = [
             ("Nombre:", tk.Entry(pestana)),
@@ -802,47 +3553,45 @@ class PanelPrincipal:
         ]
         
         for i, (etiqueta, entrada) in enumerate(campos):
-            tk.Label(pestana, text=etiqueta).grid(row=i+1, column=0, padx=5, pady=5, sticky="e")
-            entrada.grid(row=i+1, column=1, padx=5, pady=5)
+            tk.Label(pestana, text=etiqueta).grid(row=i+2, column=0, padx=5, pady=5, sticky="e")
+            entrada.grid(row=i+2, column=1, padx=5, pady=5)
         
-        tk.Button(pestana, text="Cargar Datos", 
+        self.boton_cargar_animal = tk.Button(pestana, text="Cargar Datos", 
                  command=lambda: self.cargar_datos_animal(
-                     combobox_animal.get().split(" - ")[0], campos
-                 )).grid(row=len(campos)+1, columnspan=2, pady=5)
+                     selector_animal.obtener_id(), campos
+                 ))
+        self.boton_cargar_animal.grid(row=len(campos)+2, columnspan=2, pady=5)
         
-        tk.Button(pestana, text="Actualizar", 
+        self.boton_actualizar_animal = tk.Button(pestana, text="Actualizar", 
                  command=lambda: self.actualizar_animal(
-                     combobox_animal.get().split(" - ")[0],
+                     selector_animal.obtener_id(),
                      campos[0][1].get(),
                      campos[1][1].get(),
                      campos[2][1].get(),
                      campos[3][1].get()
-                 )).grid(row=len(campos)+2, columnspan=2, pady=10)
+                 ))
+        self.boton_actualizar_animal.grid(row=len(campos)+3, columnspan=2, pady=10)
 
     def cargar_datos_animal(self, id_animal, campos):
-        try:
-            id_animal = int(id_animal)
-            self.id_animal_label.config(text=str(id_animal))  # Actualizar el label del ID
+        recepcionista = Recepcionista(id=self.id_usuario)
+        self.en_segundo_plano(
+            self.boton_cargar_animal, lambda db: recepcionista.obtener_animal(id_animal, db),
+            al_terminar=lambda animal: self.mostrar_datos_animal(animal, campos))
+
+    def mostrar_datos_animal(self, animal, campos):
+        if not self.id_animal_label.winfo_exists():
+            return
+        self.id_animal_label.config(text=str(animal.id))  # Actualizar el label del ID
         
-            cursor = self.db.conn.cursor()
-            cursor.execute("SELECT nombre, especie, raza, fecha_nacimiento FROM Animal WHERE id = ?", (id_animal,))
-            datos_animal = cursor.fetchone()
+        # Limpiar todos los campos primero
+        for campo in campos:
+            campo[1].delete(0, tk.END)
         
-            if datos_animal:
-                # Limpiar todos los campos primero
-                for campo in campos:
-                    campo[1].delete(0, tk.END)
-            
-                # Llenar los campos en el orden correcto
-                campos[0][1].insert(0, datos_animal[0])  # Nombre
-                campos[1][1].insert(0, datos_animal[1])  # Especie
-                campos[2][1].insert(0, datos_animal[2])  # Raza
-                campos[3][1].insert(0, datos_animal[3] if datos_animal[3] else "")  # Fecha nacimiento
-            
-        except (ValueError, TypeError):
-            messagebox.showerror("Error", "ID de animal inválido")
-        except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Error de base de datos: {str(e)}")
+        # Llenar los campos en el orden correcto
+        campos[0][1].insert(0, animal.nombre)  # Nombre
+        campos[1][1].insert(0, animal.especie)  # Especie
+        campos[2][1].insert(0, animal.raza)  # Raza
+        campos[3][1].insert(0, animal.fecha_nacimiento or "")  # Fecha nacimiento
 
     def actualizar_animal(self, id_animal, nombre, especie, raza, fecha_nacimiento):
         try:
@@ -854,24 +3603,15 @@ class PanelPrincipal:
        
         animal = Animal(id=id_animal, nombre=nombre, especie=especie, raza=raza, fecha_nacimiento=fecha_nacimiento)
         recepcionista = Recepcionista(id=self.id_usuario)
-        if recepcionista.actualizar_datos_animal(animal, self.db):
-            messagebox.showinfo("Éxito", "Datos del animal actualizados")
+        self.en_segundo_plano(
+            self.boton_actualizar_animal, lambda db: recepcionista.actualizar_datos_animal(animal, db),
+            al_terminar=lambda resultado: messagebox.showinfo("Éxito", "Datos del animal actualizados"))
 
     def pestana_programar_cita(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre FROM Animal")
-        animales = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-        
-        cursor.execute("SELECT id, nombre FROM Veterinario")
-        veterinarios = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-        
-        cursor.execute("SELECT id, nombre FROM Servicio")
-        servicios = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-        
         campos = [
-            ("Animal:", ttk.Combobox(pestana, values=animales, state="readonly")),
-            ("Veterinario:", ttk.Combobox(pestana, values=veterinarios, state="readonly")),
-            ("Servicio:", ttk.Combobox(pestana, values=servicios, state="readonly")),
+            ("Animal:", SelectorAnimal(pestana, self.db, ejecutor=self.root.ejecutor)),
+            ("Veterinario:", self.combobox_catalogo(pestana, "veterinarios", state="readonly")),
+            ("Servicio:", self.combobox_catalogo(pestana, "servicios", state="readonly")),
             ("Fecha y Hora (YYYY-MM-DD HH:MM):", tk.Entry(pestana)),
             ("Motivo:", tk.Entry(pestana))
         ]
@@ -880,122 +3620,316 @@ class PanelPrincipal:
             tk.Label(pestana, text=etiqueta).grid(row=i, column=0, padx=5, pady=5, sticky="e")
             widget.grid(row=i, column=1, padx=5, pady=5)
         
-        tk.Button(pestana, text="Programar", 
+        self.boton_programar_cita = tk.Button(pestana, text="Programar", 
                  command=lambda: self.programar_cita(
-                     campos[0][1].get().split(" - ")[0],
+                     campos[0][1].obtener_id(),
                      campos[1][1].get().split(" - ")[0],
                      campos[2][1].get().split(" - ")[0],
                      campos[3][1].get(),
                      campos[4][1].get()
-                 )).grid(row=len(campos), columnspan=2, pady=10)
+                 ))
+        self.boton_programar_cita.grid(row=len(campos), columnspan=2, pady=10)
+        
+        # Disponibilidad del veterinario mientras se escribe la fecha
+        self.estado_agenda = tk.Label(pestana, text="")
+        self.estado_agenda.grid(row=3, column=2, padx=5, sticky="w")
+        tk.Label(pestana, text="Próximos huecos libres:").grid(row=0, column=2, padx=5, sticky="w")
+        lista_huecos = tk.Listbox(pestana, height=5, exportselection=False)
+        lista_huecos.grid(row=1, column=2, rowspan=2, padx=5, sticky="n")
+        
+        combobox_veterinario, entrada_fecha = campos[1][1], campos[3][1]
+        comprobar = lambda e=None: self.programar_comprobacion_agenda(
+            combobox_veterinario.get().split(" - ")[0], entrada_fecha.get(), lista_huecos)
+        combobox_veterinario.bind("<<ComboboxSelected>>", comprobar)
+        entrada_fecha.bind("<KeyRelease>", comprobar)
+        
+        def elegir_hueco(event):
+            seleccion = lista_huecos.curselection()
+            if seleccion:
+                entrada_fecha.delete(0, tk.END)
+                entrada_fecha.insert(0, lista_huecos.get(seleccion[0]))
+                comprobar()
+        lista_huecos.bind("<<ListboxSelect>>", elegir_hueco)
+
+    def programar_comprobacion_agenda(self, id_veterinario, fecha_hora, lista_huecos):
+        # Espera a que el usuario deje de teclear
+        if getattr(self, "comprobacion_agenda", None):
+            self.root.after_cancel(self.comprobacion_agenda)
+        self.comprobacion_agenda = self.root.after(
+            200, self.comprobar_agenda, id_veterinario, fecha_hora, lista_huecos)
+
+    def comprobar_agenda(self, id_veterinario, fecha_hora, lista_huecos):
+        self.comprobacion_agenda = None
+        if not self.estado_agenda.winfo_exists() or not id_veterinario:
+            return
+        try:
+            inicio = datetime.strptime(fecha_hora, Cita.FORMATO_FECHA)
+        except ValueError:
+            # Fecha incompleta: se proponen huecos desde ahora
+            inicio = None
+        
+        def consultar(db):
+            conflicto = None
+            if inicio:
+                fin = inicio + timedelta(minutes=Cita.DURACION_MINUTOS)
+                conflicto = db.conflicto_agenda(
+                    id_veterinario, inicio.strftime(Cita.FORMATO_FECHA), fin.strftime(Cita.FORMATO_FECHA))
+            return conflicto, db.huecos_libres(id_veterinario, inicio or datetime.now())
+        
+        # Solo cuenta la respuesta de la última comprobación
+        self.comprobaciones_agenda = getattr(self, "comprobaciones_agenda", 0) + 1
+        numero = self.comprobaciones_agenda
+        
+        def terminar(resultado):
+            if numero == self.comprobaciones_agenda and self.estado_agenda.winfo_exists():
+                self.mostrar_agenda(inicio, *resultado, lista_huecos)
+        
+        self.en_segundo_plano(None, consultar, al_terminar=terminar)
+
+    def mostrar_agenda(self, inicio, conflicto, huecos, lista_huecos):
+        if conflicto:
+            self.estado_agenda.config(text=f"Ocupado ({conflicto[1]} - {conflicto[2][11:]})", fg="red")
+        elif inicio:
+            self.estado_agenda.config(text="Disponible", fg="green")
+        else:
+            self.estado_agenda.config(text="")
+        
+        lista_huecos.delete(0, tk.END)
+        for hueco in huecos:
+            lista_huecos.insert(tk.END, hueco.strftime(Cita.FORMATO_FECHA))
 
     def programar_cita(self, id_animal, id_veterinario, id_servicio, fecha_hora, motivo):
         cita = Cita(fecha=fecha_hora, motivo=motivo, animal_id=id_animal, 
                    veterinario_id=id_veterinario, servicio_id=id_servicio)
-        if cita.programar_cita(self.db):
-            messagebox.showinfo("Éxito", "Cita programada")
+        self.en_segundo_plano(
+            self.boton_programar_cita, lambda db: cita.programar_cita(db),
+            al_terminar=lambda id_cita: messagebox.showinfo("Éxito", f"Cita {id_cita} programada"))
 
     def pestana_registrar_pago(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT c.id, a.nombre, c.fecha, s.nombre, s.precio 
-        FROM Cita c
-        JOIN Animal a ON c.animal_id = a.id
-        JOIN Servicio s ON c.servicio_id = s.id
-        WHERE c.id NOT IN (SELECT cita_id FROM Pago)
-        """)
-        citas = [f"{id} - {animal} ({fecha}) - {servicio} - ${precio}" 
-                for id, animal, fecha, servicio, precio in cursor.fetchall()]
+        marco_filtros = tk.Frame(pestana)
+        marco_filtros.pack(fill="x", padx=5, pady=5)
+        
+        tk.Label(marco_filtros, text="Desde:").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+        entrada_desde = tk.Entry(marco_filtros, width=12)
+        entrada_desde.grid(row=0, column=1, padx=5, pady=2)
+        tk.Label(marco_filtros, text="Hasta:").grid(row=0, column=2, padx=5, pady=2, sticky="e")
+        entrada_hasta = tk.Entry(marco_filtros, width=12)
+        entrada_hasta.grid(row=0, column=3, padx=5, pady=2)
+        
+        tk.Label(marco_filtros, text="Propietario:").grid(row=1, column=0, padx=5, pady=2, sticky="ne")
+        # Búsqueda acotada: no se cargan todos los propietarios en una lista
+        selector_propietario = SelectorPropietario(marco_filtros, self.db, limite=4, ejecutor=self.root.ejecutor)
+        selector_propietario.grid(row=1, column=1, padx=5, pady=2)
+        tk.Label(marco_filtros, text="Veterinario:").grid(row=1, column=2, padx=5, pady=2, sticky="e")
+        combobox_veterinario = self.combobox_catalogo(marco_filtros, "veterinarios")
+        combobox_veterinario.grid(row=1, column=3, padx=5, pady=2)
+        
+        self.boton_filtrar_cobros = tk.Button(marco_filtros, text="Filtrar",
+                 command=lambda: self.filtrar_cuentas_por_cobrar(
+                     entrada_desde.get().strip() or None,
+                     entrada_hasta.get().strip() or None,
+                     selector_propietario.obtener_id(),
+                     combobox_veterinario.get().split(" - ")[0] or None
+                 ))
+        self.boton_filtrar_cobros.grid(row=0, column=4, rowspan=2, padx=10)
+        
+        # Mismo orden que la consulta (fecha, id); el iid de cada fila es el id de la cita
+        self.tabla_cobros = TablaEnlazada(pestana, ("ID", "Animal", "Fecha", "Servicio", "Precio", "Veterinario"),
+                                          ordenar_por=2, anchos=(60, 140, 140, 140, 60, 140),
+                                          height=12, selectmode="browse")
+        self.tabla_cobros.pack(fill="both", expand=True, padx=5, pady=5)
+        self.boton_mas_cobros = tk.Button(pestana, text="Cargar más",
+                                          command=lambda: self.mostrar_cuentas_por_cobrar(self.boton_mas_cobros))
         
-        tk.Label(pestana, text="Cita:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
-        combobox_cita = ttk.Combobox(pestana, values=citas, state="readonly", width=50)
-        combobox_cita.grid(row=0, column=1, padx=5, pady=5)
+        marco_pago = tk.Frame(pestana)
+        marco_pago.pack(fill="x", padx=5, pady=5, side="bottom")
+        tk.Label(marco_pago, text="Monto:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        entrada_monto = tk.Entry(marco_pago)
+        entrada_monto.grid(row=0, column=1, padx=5, pady=5)
         
-        tk.Label(pestana, text="Monto:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        entrada_monto = tk.Entry(pestana)
-        entrada_monto.grid(row=1, column=1, padx=5, pady=5)
+        def seleccionar_cita(event):
+            # Propone como monto el precio del servicio
+            valores = self.tabla_cobros.valores(self.tabla_cobros.seleccion())
+            if valores:
+                entrada_monto.delete(0, tk.END)
+                entrada_monto.insert(0, valores[4])
+        self.tabla_cobros.arbol.bind("<<TreeviewSelect>>", seleccionar_cita)
         
-        tk.Button(pestana, text="Registrar Pago", 
+        self.boton_registrar_pago = tk.Button(marco_pago, text="Registrar Pago", 
                  command=lambda: self.registrar_pago(
-                     combobox_cita.get().split(" - ")[0],
+                     self.tabla_cobros.seleccion(),
                      entrada_monto.get()
-                 )).grid(row=2, columnspan=2, pady=10)
+                 ))
+        self.boton_registrar_pago.grid(row=0, column=2, padx=10, pady=5)
+        
+        self.filtrar_cuentas_por_cobrar()
+
+    def filtrar_cuentas_por_cobrar(self, desde=None, hasta=None, propietario_id=None, veterinario_id=None):
+        self.filtros_cobros = {"desde": desde, "hasta": hasta,
+                               "propietario_id": propietario_id, "veterinario_id": veterinario_id}
+        self.siguiente_cobros = None
+        self.tabla_cobros.vaciar()
+        self.mostrar_cuentas_por_cobrar(self.boton_filtrar_cobros)
+
+    def mostrar_cuentas_por_cobrar(self, boton):
+        # Una página de un filtro anterior ya no se muestra
+        filtros, siguiente = self.filtros_cobros, self.siguiente_cobros
+        
+        def terminar(pagina):
+            if filtros is self.filtros_cobros and self.tabla_cobros.winfo_exists():
+                self.mostrar_pagina_cobros(*pagina)
+        
+        self.en_segundo_plano(
+            boton,
+            lambda db: db.cuentas_por_cobrar(limite=self.TAMANO_PAGINA_COBROS, despues_de=siguiente, **filtros),
+            al_terminar=terminar)
+
+    def mostrar_pagina_cobros(self, citas, siguiente):
+        self.siguiente_cobros = siguiente
+        self.tabla_cobros.agregar(citas)
+        
+        if self.siguiente_cobros:
+            self.boton_mas_cobros.pack(pady=5)
+        else:
+            self.boton_mas_cobros.pack_forget()
 
     def registrar_pago(self, id_cita, monto):
-        recepcionista = Recepcionista(id=self.id_usuario)
-        if recepcionista.registrar_pago(id_cita, monto, "completado", self.db):
+        try:
+            id_cita = int(id_cita)
+            monto = float(monto)
+        except (ValueError, TypeError):
+            messagebox.showerror("Error", "ID de cita o monto inválido")
+            return
+        
+        def terminar(id_pago):
+            if self.tabla_cobros.winfo_exists():
+                self.tabla_cobros.eliminar(id_cita)
             messagebox.showinfo("Éxito", "Pago registrado")
+        
+        recepcionista = Recepcionista(id=self.id_usuario)
+        self.en_segundo_plano(
+            self.boton_registrar_pago,
+            lambda db: recepcionista.registrar_pago(id_cita, monto, "completado", db),
+            al_terminar=terminar)
 
     def pestana_enviar_recordatorios(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT c.id, a.nombre, p.telefono, c.fecha 
-        FROM Cita c
-        JOIN Animal a ON c.animal_id = a.id
-        JOIN Propietario_Animal pa ON a.id = pa.animal_id
-        JOIN Propietario p ON pa.propietario_id = p.id
-        WHERE date(c.fecha) = date('now', '+1 day')
-        """)
+        marco_acciones = tk.Frame(pestana)
+        marco_acciones.pack(fill="x", padx=5, pady=5)
+        self.boton_encolar = tk.Button(marco_acciones, text="Encolar todos", command=self.encolar_recordatorios)
+        self.boton_encolar.pack(side="left", padx=5)
+        self.boton_despachar = tk.Button(marco_acciones, text="Enviar pendientes", command=self.despachar_recordatorios)
+        self.boton_despachar.pack(side="left", padx=5)
+        self.estado_recordatorios = tk.Label(marco_acciones, text="")
+        self.estado_recordatorios.pack(side="left", padx=5)
         
-        citas = cursor.fetchall()
+        titulo = tk.Label(pestana, text="Buscando citas de mañana...")
+        titulo.pack(pady=10)
         
-        if not citas:
-            tk.Label(pestana, text="No hay citas para recordar mañana").pack(pady=20)
-            return
+        # Cientos de citas son filas del Treeview, no cientos de marcos con botón
+        tabla_citas = TablaEnlazada(pestana, ("ID", "Animal", "Teléfono", "Fecha"), ordenar_por=3,
+                                    acciones=[("Enviar SMS", lambda cita: self.enviar_sms(cita[2], cita[0]))])
         
-        tk.Label(pestana, text="Citas para mañana:").pack(pady=10)
+        def mostrar(citas):
+            if not tabla_citas.winfo_exists():
+                return
+            if not citas:
+                titulo.config(text="No hay citas para recordar mañana")
+                return
+            titulo.config(text="Citas para mañana:")
+            tabla_citas.pack(fill="both", expand=True, padx=5, pady=5)
+            tabla_citas.cargar(citas)
         
-        for cita in citas:
-            marco = tk.Frame(pestana, borderwidth=1, relief="groove", padx=10, pady=5)
-            marco.pack(fill="x", padx=5, pady=2)
-            
-            tk.Label(marco, text=f"ID: {cita[0]} - {cita[1]} a las {cita[3]}").pack(side="left")
-            tk.Button(marco, text="Enviar SMS", 
-                     command=lambda tel=cita[2], cid=cita[0]: self.enviar_sms(tel, cid)).pack(side="right", padx=5)
+        recepcionista = Recepcionista(id=self.id_usuario)
+        self.en_segundo_plano(None, recepcionista.citas_para_recordar, al_terminar=mostrar)
 
     def enviar_sms(self, telefono, id_cita):
-        messagebox.showinfo("Recordatorio enviado", 
-                          f"Se envió recordatorio al teléfono {telefono} para la cita {id_cita}")
+        recepcionista = Recepcionista(id=self.id_usuario)
+        self.en_segundo_plano(
+            None, lambda db: recepcionista.enviar_recordatorio(id_cita, "sms", db),
+            al_terminar=lambda resultado: messagebox.showinfo(
+                "Recordatorio encolado", f"Se enviará recordatorio al teléfono {telefono} para la cita {id_cita}"))
+
+    def encolar_recordatorios(self):
+        def terminar(nuevos):
+            if self.estado_recordatorios.winfo_exists():
+                self.estado_recordatorios.config(text=f"{nuevos} recordatorios encolados")
+        
+        recepcionista = Recepcionista(id=self.id_usuario)
+        self.en_segundo_plano(self.boton_encolar, lambda db: recepcionista.encolar_recordatorios("sms", db),
+                              al_terminar=terminar)
+
+    def despachar_recordatorios(self):
+        def terminar(metricas):
+            if self.estado_recordatorios.winfo_exists():
+                self.estado_recordatorios.config(
+                    text=f"{metricas['enviados']} enviados, {metricas['errores']} con error "
+                         f"({metricas['mensajes/s']:.0f} mensajes/s)")
+        
+        self.en_segundo_plano(
+            self.boton_despachar,
+            lambda db: asyncio.run(DespachadorRecordatorios(db, TransporteArchivo()).despachar()),
+            al_terminar=terminar)
+
+    def pestana_acceso_propietarios(self, pestana):
+        tk.Label(pestana, text="Propietario:").grid(row=0, column=0, padx=5, pady=5, sticky="ne")
+        selector_propietario = SelectorPropietario(pestana, self.db, ejecutor=self.root.ejecutor)
+        selector_propietario.grid(row=0, column=1, padx=5, pady=5)
+        
+        # El propietario lo escribe en "Primer acceso de propietario" junto con su contraseña
+        self.boton_codigo_acceso = tk.Button(
+            pestana, text="Generar código de acceso",
+            command=lambda: self.emitir_codigo_activacion(selector_propietario.obtener_id()))
+        self.boton_codigo_acceso.grid(row=1, column=1, padx=5, pady=10)
+
+    def emitir_codigo_activacion(self, id_propietario):
+        if id_propietario is None:
+            messagebox.showerror("Error", "Seleccione un propietario")
+            return
+        
+        self.en_segundo_plano(
+            self.boton_codigo_acceso, lambda db: db.emitir_codigo_activacion(id_propietario),
+            al_terminar=lambda codigo: messagebox.showinfo(
+                "Código de acceso", f"Entregue este código al propietario: {codigo}\n"
+                                    "Sirve una sola vez; generar otro anula este"))
 
     def pestanas_veterinario(self):
         pestanas = [
             ("Buscar Historial", self.pestana_buscar_historial),
             ("Registrar Tratamiento", self.pestana_registrar_tratamiento),
             ("Registrar Vacuna", self.pestana_registrar_vacuna),
-            ("Alertas de Vacunas", self.pestana_alertas_vacunas)
+            ("Alertas de Vacunas", self.pestana_alertas_vacunas),
+            ("Buscar en Historiales", self.pestana_buscar_texto)
         ]
         
-        for texto, comando in pestanas:
-            pestana = ttk.Frame(self.cuaderno)
-            self.cuaderno.add(pestana, text=texto)
-            comando(pestana)
+        self.agregar_pestanas(pestanas)
 
     def pestana_buscar_historial(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre FROM Animal")
-        animales = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-    
         tk.Label(pestana, text="ID del Animal:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.id_animal_historial = tk.Label(pestana, text="")
         self.id_animal_historial.grid(row=0, column=1, padx=5, pady=5, sticky="w")
     
-        tk.Label(pestana, text="Seleccionar Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        combobox_animal = ttk.Combobox(pestana, values=animales, state="readonly")
-        combobox_animal.grid(row=1, column=1, padx=5, pady=5)
-        combobox_animal.bind("<<ComboboxSelected>>", lambda e: self.id_animal_historial.config(
-             text=combobox_animal.get().split(" - ")[0]))
+        tk.Label(pestana, text="Seleccionar Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="ne")
+        selector_animal = SelectorAnimal(
+            pestana, self.db, ejecutor=self.root.ejecutor,
+            al_seleccionar=lambda id: self.id_animal_historial.config(text=str(id)))
+        selector_animal.grid(row=1, column=1, padx=5, pady=5)
     
-        tk.Button(pestana, text="Buscar Historial", 
+        self.boton_buscar_historial = tk.Button(pestana, text="Buscar Historial", 
                  command=lambda: self.mostrar_historial(
                      pestana, 
-                     combobox_animal.get().split(" - ")[0]
-                 )).grid(row=2, columnspan=2, pady=10)
+                     selector_animal.obtener_id()
+                 ))
+        self.boton_buscar_historial.grid(row=2, columnspan=2, pady=10)
     
         self.texto_historial = scrolledtext.ScrolledText(pestana, wrap=tk.WORD, width=60, height=15)
         self.texto_historial.grid(row=3, columnspan=2, padx=5, pady=5, sticky="nsew")
+        self.texto_historial.tag_config('titulo', font=('Arial', 10, 'bold'))
+        
+        self.boton_mas_historial = tk.Button(pestana, text="Cargar más", command=self.cargar_mas_historial)
 
     def mostrar_historial(self, pestana, id_animal):
         self.texto_historial.delete(1.0, tk.END)
+        self.boton_mas_historial.grid_remove()
     
         try:
             id_animal = int(id_animal)
@@ -1003,57 +3937,69 @@ class PanelPrincipal:
             messagebox.showerror("Error", "ID de animal inválido")
             return
     
+        self.id_animal_linea = id_animal
+        self.siguiente_historial = None
+        self.cargar_pagina_historial(self.boton_buscar_historial)
+
+    def abrir_historial(self, id_animal):
+        """Cambia a la pestaña Buscar Historial con la línea temporal del animal"""
+        for pestana in self.cuaderno.tabs():
+            if self.cuaderno.tab(pestana, "text") == "Buscar Historial":
+                self.cuaderno.select(pestana)
+                # El evento de cambio de pestaña llega después; se construye ya
+                self.construir_pestana(pestana)
+                self.id_animal_historial.config(text=str(id_animal))
+                self.mostrar_historial(self.cuaderno.nametowidget(pestana), id_animal)
+                return
+
+    def cargar_mas_historial(self):
+        self.cargar_pagina_historial(self.boton_mas_historial)
+
+    def cargar_pagina_historial(self, boton):
         veterinario = Veterinario(id=self.id_usuario)
-        historial_completo = veterinario.buscar_historial(id_animal, self.db)
-    
-        if not historial_completo:
-            self.texto_historial.insert(tk.END, "No hay registros para este animal")
+        id_animal, siguiente = self.id_animal_linea, self.siguiente_historial
+        self.en_segundo_plano(
+            boton,
+            lambda db: veterinario.linea_temporal(id_animal, db, self.TAMANO_PAGINA_HISTORIAL, siguiente),
+            al_terminar=self.mostrar_pagina_historial)
+
+    def mostrar_pagina_historial(self, pagina):
+        """Pinta una página de la línea temporal con una sola inserción en el texto"""
+        if not self.texto_historial.winfo_exists():
             return
-    
-        # Mostrar citas primero
-        self.texto_historial.insert(tk.END, "=== CITAS ===\n\n", 'titulo')
-        if historial_completo['citas']:
-            for cita in historial_completo['citas']:
-                fecha, servicio, motivo, veterinario = cita
-                self.texto_historial.insert(tk.END, f"Fecha: {fecha}\n")
-                self.texto_historial.insert(tk.END, f"Servicio: {servicio}\n")
-                self.texto_historial.insert(tk.END, f"Motivo: {motivo}\n")
-                self.texto_historial.insert(tk.END, f"Veterinario: {veterinario}\n")
-                self.texto_historial.insert(tk.END, "-"*50 + "\n\n")
-        else:
-            self.texto_historial.insert(tk.END, "No hay citas registradas\n\n")
-    
-        # Mostrar historial médico
-        self.texto_historial.insert(tk.END, "\n=== HISTORIAL MÉDICO ===\n\n", 'titulo')
-        if historial_completo['historial_medico']:
-            for registro in historial_completo['historial_medico']:
-                fecha, tipo, descripcion, tratamiento = registro
-                self.texto_historial.insert(tk.END, f"Fecha: {fecha}\n")
-                self.texto_historial.insert(tk.END, f"Tipo: {tipo}\n")
-                self.texto_historial.insert(tk.END, f"Descripción:\n{descripcion}\n")
+        registros, self.siguiente_historial = pagina
+        if not registros and not self.texto_historial.get("1.0", "end-1c"):
+            self.texto_historial.insert(tk.END, "No hay registros para este animal")
+        
+        # Text.insert acepta pares (texto, etiquetas) consecutivos
+        fragmentos = []
+        for fecha, origen, id, titulo, texto, tratamiento, veterinario_cita in registros:
+            if origen == "Cita":
+                fragmentos += [f"{fecha} - Cita\n", 'titulo',
+                               f"Servicio: {titulo}\nMotivo: {texto}\nVeterinario: {veterinario_cita}\n", ()]
+            else:
+                fragmentos += [f"{fecha} - {titulo}\n", 'titulo', f"Descripción:\n{texto}\n", ()]
                 if tratamiento:
-                    self.texto_historial.insert(tk.END, f"Tratamiento:\n{tratamiento}\n")
-                self.texto_historial.insert(tk.END, "-"*50 + "\n\n")
+                    fragmentos += [f"Tratamiento:\n{tratamiento}\n", ()]
+            fragmentos += ["-"*50 + "\n\n", ()]
+        if fragmentos:
+            self.texto_historial.insert(tk.END, *fragmentos)
+        
+        if self.siguiente_historial:
+            self.boton_mas_historial.grid(row=4, columnspan=2, pady=5)
         else:
-            self.texto_historial.insert(tk.END, "No hay registros médicos\n")
-    
-        # Configurar estilo para los títulos
-        self.texto_historial.tag_config('titulo', font=('Arial', 10, 'bold'))
+            self.boton_mas_historial.grid_remove()
 
     def pestana_registrar_tratamiento(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre FROM Animal")
-        animales = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-    
         tk.Label(pestana, text="ID del Animal:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.id_animal_tratamiento = tk.Label(pestana, text="")
         self.id_animal_tratamiento.grid(row=0, column=1, padx=5, pady=5, sticky="w")
     
-        tk.Label(pestana, text="Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        combobox_animal = ttk.Combobox(pestana, values=animales, state="readonly")
-        combobox_animal.grid(row=1, column=1, padx=5, pady=5)
-        combobox_animal.bind("<<ComboboxSelected>>", lambda e: self.id_animal_tratamiento.config(
-        text=combobox_animal.get().split(" - ")[0]))
+        tk.Label(pestana, text="Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="ne")
+        selector_animal = SelectorAnimal(
+            pestana, self.db, ejecutor=self.root.ejecutor,
+            al_seleccionar=lambda id: self.id_animal_tratamiento.config(text=str(id)))
+        selector_animal.grid(row=1, column=1, padx=5, pady=5)
     
         campos = [
             ("Tipo:", ttk.Combobox(pestana, values=["Consulta", "Cirugía", "Control"], state="readonly")),
@@ -1065,16 +4011,16 @@ class PanelPrincipal:
             tk.Label(pestana, text=etiqueta).grid(row=i+2, column=0, padx=5, pady=5, sticky="e")
             widget.grid(row=i+2, column=1, padx=5, pady=5)
     
-        tk.Button(pestana, text="Registrar", 
+        self.boton_registrar_tratamiento = tk.Button(pestana, text="Registrar", 
                  command=lambda: self.registrar_tratamiento(
-                     combobox_animal.get().split(" - ")[0],
+                     selector_animal.obtener_id(),
                      campos[0][1].get(),
                      campos[1][1].get(),
-                     campos[2][1].get(),
-                     self.db
-                 )).grid(row=len(campos)+2, columnspan=2, pady=10)
+                     campos[2][1].get()
+                 ))
+        self.boton_registrar_tratamiento.grid(row=len(campos)+2, columnspan=2, pady=10)
 
-    def registrar_tratamiento(self, id_animal, tipo, descripcion, tratamiento, db):
+    def registrar_tratamiento(self, id_animal, tipo, descripcion, tratamiento):
         try:
            id_animal = int(id_animal)
         except (ValueError, TypeError):
@@ -1082,40 +4028,38 @@ class PanelPrincipal:
             return
         
         veterinario = Veterinario(id=self.id_usuario)
-        if veterinario.registrar_tratamiento(id_animal, tipo, descripcion, tratamiento, db):
-            messagebox.showinfo("Éxito", "Tratamiento registrado")
+        self.en_segundo_plano(
+            self.boton_registrar_tratamiento,
+            lambda db: veterinario.registrar_tratamiento(id_animal, tipo, descripcion, tratamiento, db),
+            al_terminar=lambda resultado: messagebox.showinfo("Éxito", "Tratamiento registrado"))
 
     def pestana_registrar_vacuna(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre FROM Animal")
-        animales = [f"{id} - {nombre}" for id, nombre in cursor.fetchall()]
-    
         tk.Label(pestana, text="ID del Animal:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.id_animal_vacuna = tk.Label(pestana, text="")
         self.id_animal_vacuna.grid(row=0, column=1, padx=5, pady=5, sticky="w")
     
-        tk.Label(pestana, text="Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        combobox_animal = ttk.Combobox(pestana, values=animales, state="readonly")
-        combobox_animal.grid(row=1, column=1, padx=5, pady=5)
-        combobox_animal.bind("<<ComboboxSelected>>", lambda e: self.id_animal_vacuna.config(
-        text=combobox_animal.get().split(" - ")[0]))
+        tk.Label(pestana, text="Animal:").grid(row=1, column=0, padx=5, pady=5, sticky="ne")
+        selector_animal = SelectorAnimal(
+            pestana, self.db, ejecutor=self.root.ejecutor,
+            al_seleccionar=lambda id: self.id_animal_vacuna.config(text=str(id)))
+        selector_animal.grid(row=1, column=1, padx=5, pady=5)
         
         campos = [
-            ("Animal:", ttk.Combobox(pestana, values=animales, state="readonly")),
             ("Tipo de Vacuna:", tk.Entry(pestana)),
             ("Próxima Aplicación (YYYY-MM-DD):", tk.Entry(pestana))
         ]
         
         for i, (etiqueta, widget) in enumerate(campos):
-            tk.Label(pestana, text=etiqueta).grid(row=i, column=0, padx=5, pady=5, sticky="e")
-            widget.grid(row=i, column=1, padx=5, pady=5)
+            tk.Label(pestana, text=etiqueta).grid(row=i+2, column=0, padx=5, pady=5, sticky="e")
+            widget.grid(row=i+2, column=1, padx=5, pady=5)
         
-        tk.Button(pestana, text="Registrar", 
+        self.boton_registrar_vacuna = tk.Button(pestana, text="Registrar", 
                  command=lambda: self.registrar_vacuna(
-                     campos[0][1].get().split(" - ")[0],
-                     campos[1][1].get(),
-                     campos[2][1].get()
-                 )).grid(row=len(campos), columnspan=2, pady=10)
+                     selector_animal.obtener_id(),
+                     campos[0][1].get(),
+                     campos[1][1].get()
+                 ))
+        self.boton_registrar_vacuna.grid(row=len(campos)+2, columnspan=2, pady=10)
 
     def registrar_vacuna(self, id_animal, vacuna, proxima_aplicacion):
         try:
@@ -1126,56 +4070,153 @@ class PanelPrincipal:
             return
        
         veterinario = Veterinario(id=self.id_usuario)
-        if veterinario.registrar_vacuna(id_animal, vacuna, proxima_aplicacion, self.db):
-            messagebox.showinfo("Éxito", "Vacuna registrada")
+        self.en_segundo_plano(
+            self.boton_registrar_vacuna,
+            lambda db: veterinario.registrar_vacuna(id_animal, vacuna, proxima_aplicacion, db),
+            al_terminar=lambda resultado: messagebox.showinfo("Éxito", "Vacuna registrada"))
 
     def pestana_alertas_vacunas(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id FROM Animal")
-        animales = [id for (id,) in cursor.fetchall()]
+        self.pagina_alertas = 0
+        self.titulo_alertas = tk.Label(pestana, text="Buscando vacunas próximas...")
+        self.titulo_alertas.pack(pady=10)
         
-        alertas = []
+        # Clave: id de la vacuna; mismo orden que la consulta paginada
+        self.tabla_alertas = TablaEnlazada(pestana, ("Vacuna ID", "Animal ID", "Nombre", "Vacuna", "Próxima aplicación"),
+                                           ordenar_por=4, anchos=(70, 70, 150, 150, 130),
+                                           acciones=[("Ver historial", lambda alerta: self.abrir_historial(alerta[1]))])
+        self.boton_mas_alertas = tk.Button(pestana, text="Cargar más",
+                                           command=self.cargar_mas_alertas)
+        self.cargar_alertas(None)
+    
+    def cargar_alertas(self, boton):
         veterinario = Veterinario(id=self.id_usuario)
-        for id_animal in animales:
-            alertas.extend(veterinario.generar_alerta_vacuna(id_animal, self.db))
+        desplazamiento = self.pagina_alertas * self.TAMANO_PAGINA_ALERTAS
+        self.en_segundo_plano(
+            boton, lambda db: veterinario.alertas_vacunas(db, 7, self.TAMANO_PAGINA_ALERTAS, desplazamiento),
+            al_terminar=self.mostrar_alertas)
+    
+    def mostrar_alertas(self, alertas):
+        if not self.tabla_alertas.winfo_exists():
+            return
+        if not alertas and not self.pagina_alertas:
+            self.titulo_alertas.config(text="No hay alertas de vacunas próximas")
+            return
+        if not self.pagina_alertas:
+            self.titulo_alertas.config(text="Animales con vacunas próximas a vencer:")
+            self.tabla_alertas.pack(fill="both", expand=True, padx=5, pady=5)
+        self.tabla_alertas.agregar(alertas)
         
-        if not alertas:
-            tk.Label(pestana, text="No hay alertas de vacunas próximas").pack(pady=20)
+        # Solo se ofrece otra página si esta vino completa
+        if len(alertas) == self.TAMANO_PAGINA_ALERTAS:
+            self.boton_mas_alertas.pack(pady=5)
+        else:
+            self.boton_mas_alertas.pack_forget()
+    
+    def cargar_mas_alertas(self):
+        self.pagina_alertas += 1
+        self.cargar_alertas(self.boton_mas_alertas)
+
+    def pestana_buscar_texto(self, pestana):
+        if not self.db.busqueda_disponible:
+            tk.Label(pestana, text="La búsqueda de texto requiere SQLite con FTS5").pack(pady=20)
             return
         
-        tk.Label(pestana, text="Animales con vacunas próximas a vencer:").pack(pady=10)
+        marco_busqueda = tk.Frame(pestana)
+        marco_busqueda.pack(fill="x", padx=5, pady=5)
+        tk.Label(marco_busqueda, text="Buscar (ej. otitis, amoxicilina):").pack(side="left")
+        entrada_texto = tk.Entry(marco_busqueda, width=40)
+        entrada_texto.pack(side="left", padx=5)
         
-        for alerta in alertas:
-            marco = tk.Frame(pestana, borderwidth=1, relief="groove", padx=10, pady=5)
-            marco.pack(fill="x", padx=5, pady=2)
-            
-            tk.Label(marco, text=f"ID: {alerta[0]} - {alerta[1]}").pack(side="left")
-            tk.Label(marco, text=alerta[2].split("\n")[1]).pack(side="right")
+        self.arbol_busqueda = ttk.Treeview(pestana, columns=("Origen", "Fecha", "Animal", "Fragmento"), show="headings")
+        for columna, ancho in (("Origen", 80), ("Fecha", 120), ("Animal", 150), ("Fragmento", 500)):
+            self.arbol_busqueda.heading(columna, text=columna)
+            self.arbol_busqueda.column(columna, width=ancho)
+        self.arbol_busqueda.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        self.boton_mas_busqueda = tk.Button(pestana, text="Cargar más", command=self.cargar_mas_busqueda)
+        
+        buscar = lambda e=None: self.buscar_texto(entrada_texto.get())
+        self.boton_buscar_texto = tk.Button(marco_busqueda, text="Buscar", command=buscar)
+        self.boton_buscar_texto.pack(side="left")
+        entrada_texto.bind("<Return>", buscar)
+
+    def buscar_texto(self, texto):
+        self.texto_busqueda = texto
+        self.pagina_busqueda = 0
+        self.arbol_busqueda.delete(*self.arbol_busqueda.get_children())
+        self.mostrar_resultados_busqueda(self.boton_buscar_texto)
+
+    def cargar_mas_busqueda(self):
+        self.pagina_busqueda += 1
+        self.mostrar_resultados_busqueda(self.boton_mas_busqueda)
+
+    def mostrar_resultados_busqueda(self, boton):
+        texto, pagina = self.texto_busqueda, self.pagina_busqueda
+        
+        def terminar(resultados):
+            # Con Intro se puede lanzar otra búsqueda antes de que llegue esta
+            if (texto, pagina) == (self.texto_busqueda, self.pagina_busqueda) and self.arbol_busqueda.winfo_exists():
+                self.mostrar_pagina_busqueda(resultados)
+        
+        self.en_segundo_plano(
+            boton,
+            lambda db: db.buscar_texto_clinico(texto, limite=self.TAMANO_PAGINA_BUSQUEDA,
+                                               desplazamiento=pagina * self.TAMANO_PAGINA_BUSQUEDA),
+            al_terminar=terminar)
+
+    def mostrar_pagina_busqueda(self, resultados):
+        for origen, id, fecha, animal_id, animal, fragmento in resultados:
+            self.arbol_busqueda.insert("", "end", values=(
+                origen, fecha, f"{animal_id} - {animal}", fragmento.replace("\n", " ")))
+        
+        if len(resultados) == self.TAMANO_PAGINA_BUSQUEDA:
+            self.boton_mas_busqueda.pack(pady=5)
+        else:
+            self.boton_mas_busqueda.pack_forget()
 
     def pestanas_administrador(self):
         pestanas = [
             ("Servicios", self.pestana_servicios),
             ("Reportes", self.pestana_reportes)
         ]
+        if self.db.monitor:
+            pestanas.append(("Consultas SQL", self.pestana_consultas_sql))
         
-        for texto, comando in pestanas:
-            pestana = ttk.Frame(self.cuaderno)
-            self.cuaderno.add(pestana, text=texto)
-            comando(pestana)
+        self.agregar_pestanas(pestanas)
 
-    def pestana_servicios(self, pestana):
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre, precio FROM Servicio")
-        servicios = cursor.fetchall()
-        
-        self.arbol_servicios = ttk.Treeview(pestana, columns=("ID", "Nombre", "Precio"), show="headings")
-        self.arbol_servicios.heading("ID", text="ID")
-        self.arbol_servicios.heading("Nombre", text="Nombre")
-        self.arbol_servicios.heading("Precio", text="Precio")
-        self.arbol_servicios.pack(fill="both", expand=True, padx=5, pady=5)
+    def pestana_consultas_sql(self, pestana):
+        columnas = ("Llamadas", "Total ms", "Media ms", "p95 ms", "Máx ms", "Filas", "Origen")
+        self.arbol_sql = ttk.Treeview(pestana, columns=columnas, show="tree headings")
+        self.arbol_sql.heading("#0", text="Sentencia")
+        self.arbol_sql.column("#0", width=380)
+        for columna in columnas:
+            self.arbol_sql.heading(columna, text=columna)
+            self.arbol_sql.column(columna, width=160 if columna == "Origen" else 70, anchor="e")
+        self.arbol_sql.pack(fill="both", expand=True, padx=5, pady=5)
         
-        for servicio in servicios:
-            self.arbol_servicios.insert("", "end", values=servicio)
+        marco_botones = tk.Frame(pestana)
+        marco_botones.pack(fill="x", padx=5, pady=5)
+        tk.Button(marco_botones, text="Actualizar", command=self.mostrar_consultas_sql).pack(side="left", padx=5)
+        tk.Button(marco_botones, text="Reiniciar",
+                  command=lambda: (self.db.monitor.reiniciar(), self.mostrar_consultas_sql())).pack(side="left", padx=5)
+        tk.Label(marco_botones, text=f"Sentencias de más de {self.db.monitor.umbral_lento_ms} ms en "
+                                     f"'{self.db.monitor.ruta_lentas}'").pack(side="right", padx=5)
+        self.mostrar_consultas_sql()
+
+    def mostrar_consultas_sql(self):
+        self.arbol_sql.delete(*self.arbol_sql.get_children())
+        for fila in self.db.monitor.resumen()[:200]:
+            self.arbol_sql.insert("", "end", text=fila["consulta"][:200], values=(
+                fila["llamadas"], f"{fila['total_ms']:.1f}", f"{fila['media_ms']:.2f}",
+                f"{fila['p95_ms']:.2f}", f"{fila['maximo_ms']:.2f}", fila["filas"],
+                ", ".join(fila["origenes"])))
+
+    def pestana_servicios(self, pestana):
+        self.tabla_servicios = TablaEnlazada(pestana, ("ID", "Nombre", "Precio"), selectmode="browse")
+        self.tabla_servicios.pack(fill="both", expand=True, padx=5, pady=5)
+        self.en_segundo_plano(
+            None, lambda db: db.servicios(),
+            al_terminar=lambda filas: self.tabla_servicios.winfo_exists() and self.tabla_servicios.cargar(filas))
         
         marco_edicion = tk.Frame(pestana)
         marco_edicion.pack(fill="x", padx=5, pady=5)
@@ -1188,107 +4229,492 @@ class PanelPrincipal:
         entrada_precio = tk.Entry(marco_edicion)
         entrada_precio.grid(row=1, column=1, padx=5, pady=5)
         
-        tk.Button(marco_edicion, text="Agregar", 
+        def seleccionar_servicio(event):
+            # Carga el servicio elegido para editar su precio
+            valores = self.tabla_servicios.valores(self.tabla_servicios.seleccion())
+            if valores:
+                entrada_nombre.delete(0, tk.END)
+                entrada_nombre.insert(0, valores[1])
+                entrada_precio.delete(0, tk.END)
+                entrada_precio.insert(0, valores[2])
+        self.tabla_servicios.arbol.bind("<<TreeviewSelect>>", seleccionar_servicio)
+        
+        self.boton_agregar_servicio = tk.Button(marco_edicion, text="Agregar", 
                  command=lambda: self.agregar_servicio(
                      entrada_nombre.get(),
                      entrada_precio.get()
-                 )).grid(row=2, column=0, padx=5, pady=5)
+                 ))
+        self.boton_agregar_servicio.grid(row=2, column=0, padx=5, pady=5)
         
-        tk.Button(marco_edicion, text="Actualizar", 
+        self.boton_actualizar_servicio = tk.Button(marco_edicion, text="Actualizar", 
                  command=lambda: self.actualizar_servicio(
                      entrada_nombre.get(),
                      entrada_precio.get()
-                 )).grid(row=2, column=1, padx=5, pady=5)
+                 ))
+        self.boton_actualizar_servicio.grid(row=2, column=1, padx=5, pady=5)
 
     def agregar_servicio(self, nombre, precio):
-        cursor = self.db.conn.cursor()
-        cursor.execute("INSERT INTO Servicio (nombre, precio) VALUES (?, ?)", (nombre, precio))
-        self.db.conn.commit()
-        self.actualizar_lista_servicios()
+        try:
+            precio = float(precio)
+        except ValueError:
+            messagebox.showerror("Error", "Precio inválido")
+            return
+        
+        administrador = Administrador(id=self.id_usuario)
+        self.guardar_servicios(self.boton_agregar_servicio,
+                               lambda db: administrador.configurar_servicios([(nombre, precio)], db))
 
     def actualizar_servicio(self, nombre, precio):
-        cursor = self.db.conn.cursor()
-        cursor.execute("UPDATE Servicio SET precio = ? WHERE nombre = ?", (precio, nombre))
-        self.db.conn.commit()
-        self.actualizar_lista_servicios()
+        try:
+            precio = float(precio)
+        except ValueError:
+            messagebox.showerror("Error", "Precio inválido")
+            return
+        
+        administrador = Administrador(id=self.id_usuario)
+        self.guardar_servicios(self.boton_actualizar_servicio,
+                               lambda db: administrador.establecer_precios({nombre.strip(): precio}, db))
 
-    def actualizar_lista_servicios(self):
-        for item in self.arbol_servicios.get_children():
-            self.arbol_servicios.delete(item)
+    def guardar_servicios(self, boton, guardar):
+        """guardar(db) devuelve los ids de los servicios escritos; en el mismo hilo
+        se leen esas filas y solo ellas se actualizan en la tabla"""
+        def escribir(db):
+            ids = guardar(db)
+            return ids, db.servicios(ids)
         
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT id, nombre, precio FROM Servicio")
-        for servicio in cursor.fetchall():
-            self.arbol_servicios.insert("", "end", values=servicio)
+        def terminar(resultado):
+            if self.tabla_servicios.winfo_exists():
+                self.tabla_servicios.refrescar(*resultado)
+        
+        self.en_segundo_plano(boton, escribir, al_terminar=terminar)
 
     def pestana_reportes(self, pestana):
-        tk.Button(pestana, text="Generar Reporte de Citas", 
-                 command=self.generar_reporte_citas).pack(pady=10)
+        marco_citas = tk.LabelFrame(pestana, text="Reporte de Citas", padx=10, pady=10)
+        marco_citas.pack(fill="x", padx=10, pady=10)
+        
+        tk.Label(marco_citas, text="Desde (YYYY-MM-DD):").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        self.entrada_desde_reporte = tk.Entry(marco_citas)
+        self.entrada_desde_reporte.grid(row=0, column=1, padx=5, pady=5)
+        
+        tk.Label(marco_citas, text="Hasta (YYYY-MM-DD):").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.entrada_hasta_reporte = tk.Entry(marco_citas)
+        self.entrada_hasta_reporte.grid(row=1, column=1, padx=5, pady=5)
         
-        tk.Button(pestana, text="Generar Reporte de Ingresos", 
-                 command=self.generar_reporte_ingresos).pack(pady=10)
+        tk.Label(marco_citas, text="Formato:").grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.combobox_formato_reporte = ttk.Combobox(marco_citas, values=ExportadorCitas.FORMATOS, state="readonly")
+        self.combobox_formato_reporte.current(0)
+        self.combobox_formato_reporte.grid(row=2, column=1, padx=5, pady=5)
+        
+        self.boton_reporte_citas = tk.Button(marco_citas, text="Generar Reporte de Citas", 
+                                             command=self.generar_reporte_citas)
+        self.boton_reporte_citas.grid(row=3, columnspan=2, pady=5)
+        self.estado_reporte_citas = tk.Label(marco_citas, text="")
+        self.estado_reporte_citas.grid(row=4, columnspan=2)
+        
+        self.boton_reporte_ingresos = tk.Button(pestana, text="Generar Reporte de Ingresos", 
+                                                command=self.generar_reporte_ingresos)
+        self.boton_reporte_ingresos.pack(pady=10)
 
     def generar_reporte_citas(self):
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT c.id, a.nombre, c.fecha, s.nombre, v.nombre 
-        FROM Cita c
-        JOIN Animal a ON c.animal_id = a.id
-        JOIN Servicio s ON c.servicio_id = s.id
-        JOIN Veterinario v ON c.veterinario_id = v.id
-        ORDER BY c.fecha DESC
-        """)
+        desde = self.entrada_desde_reporte.get().strip() or None
+        hasta = self.entrada_hasta_reporte.get().strip() or None
+        for fecha in (desde, hasta):
+            if fecha:
+                try:
+                    datetime.strptime(fecha, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("Error", "Formato de fecha inválido. Use YYYY-MM-DD")
+                    return
         
-        with open("reporte_citas.txt", "w") as f:
-            f.write("=== Reporte de Citas ===\n\n")
-            for cita in cursor.fetchall():
-                f.write(f"ID: {cita[0]}\n")
-                f.write(f"Animal: {cita[1]}\n")
-                f.write(f"Fecha: {cita[2]}\n")
-                f.write(f"Servicio: {cita[3]}\n")
-                f.write(f"Veterinario: {cita[4]}\n")
-                f.write("-" * 50 + "\n")
+        formato = self.combobox_formato_reporte.get()
+        self.ruta_reporte_citas = f"reporte_citas.{formato}"
+        exportador = ExportadorCitas(self.db, self.ruta_reporte_citas, formato, desde, hasta)
         
-        messagebox.showinfo("Éxito", "Reporte de citas generado como 'reporte_citas.txt'")
+        self.boton_reporte_citas.config(state="disabled")
+        self.estado_reporte_citas.config(text="Generando reporte...")
+        self.vigilar_reporte_citas(exportador.iniciar_en_segundo_plano())
+
+    def vigilar_reporte_citas(self, mensajes):
+        """Consulta la cola del hilo exportador sin bloquear el bucle de eventos"""
+        if not self.boton_reporte_citas.winfo_exists():
+            return
+        try:
+            while True:
+                tipo, valor = mensajes.get_nowait()
+                if tipo == "progreso":
+                    self.estado_reporte_citas.config(text=f"{valor} citas exportadas...")
+                    continue
+                
+                self.boton_reporte_citas.config(state="normal")
+                if tipo == "fin":
+                    self.estado_reporte_citas.config(text=f"{valor} citas exportadas")
+                    messagebox.showinfo("Éxito", f"Reporte de citas generado como '{self.ruta_reporte_citas}'")
+                else:
+                    self.estado_reporte_citas.config(text="")
+                    messagebox.showerror("Error", f"No se pudo generar el reporte: {valor}")
+                return
+        except queue.Empty:
+            self.root.after(100, self.vigilar_reporte_citas, mensajes)
 
     def generar_reporte_ingresos(self):
-        cursor = self.db.conn.cursor()
-        cursor.execute("""
-        SELECT strftime('%Y-%m', p.fecha) AS mes, 
-               SUM(p.monto) AS ingresos,
-               COUNT(*) AS citas
-        FROM Pago p
-        GROUP BY mes
-        ORDER BY mes
-        """)
-        
-        with open("reporte_ingresos.txt", "w") as f:
-            f.write("=== Reporte de Ingresos ===\n\n")
-            f.write("Mes\t\tIngresos\tCitas\n")
-            f.write("=" * 50 + "\n")
-            for row in cursor.fetchall():
-                f.write(f"{row[0]}\t${row[1]:.2f}\t\t{row[2]}\n")
-        
-        messagebox.showinfo("Éxito", "Reporte de ingresos generado como 'reporte_ingresos.txt'")
+        self.en_segundo_plano(
+            self.boton_reporte_ingresos, self.escribir_reporte_ingresos,
+            al_terminar=lambda ruta: messagebox.showinfo(
+                "Éxito", f"Reporte de ingresos generado como '{ruta}'"))
+
+    def escribir_reporte_ingresos(self, db):
+        """Se ejecuta en un hilo del EjecutorBD: no toca widgets"""
+        return ReporteIngresos("reporte_ingresos.txt").escribir(db.conn)
 
 class Veterinaria(tk.Tk):
-    def __init__(self):
+    # Con MEDIR_SQL todas las sentencias pasan por un MonitorSQL; sus estadísticas
+    # se ven en la pestaña "Consultas SQL" y se guardan en RUTA_ESTADISTICAS_SQL al salir.
+    # Desactivado por defecto: se activa con --medir-sql o VETERINARIA_MEDIR_SQL=1
+    MEDIR_SQL = os.environ.get("VETERINARIA_MEDIR_SQL") == "1"
+    RUTA_ESTADISTICAS_SQL = "estadisticas_sql.json"
+    
+    def __init__(self, db=None, monitor_interfaz=None):
+        """`monitor_interfaz` es un MonitorInterfaz ya instalado antes de crear la ventana"""
         super().__init__()
+        self.monitor_interfaz = monitor_interfaz
+        if monitor_interfaz:
+            monitor_interfaz.conectar(self)
         self.title("Veterinaria")
         self.geometry("1000x700")
         self.configure(bg="#f0f0f0")
         
-        self.db = Database()
+        # Una sola conexión principal para toda la aplicación
+        try:
+            self.db = db or Database(sembrar=False, monitor=MonitorSQL() if self.MEDIR_SQL else None)
+        except ErrorVeterinaria as e:
+            messagebox.showerror("Error", str(e))
+            if monitor_interfaz:
+                monitor_interfaz.cerrar()
+            self.destroy()
+            raise
+        if self.db.avisos:
+            messagebox.showwarning("Avisos de la actualización", "\n".join(self.db.avisos))
+        self.ejecutor = EjecutorBD(self, self.db)
+        self.sesiones = CacheSesiones()
+        # Los datos de prueba (con la derivación de sus claves) se crean en segundo plano
+        self.sembrar_datos()
+        self.protocol("WM_DELETE_WINDOW", self.cerrar)
         self.pantalla_login = PantallaLogin(self, self.db, self.mostrar_panel_principal)
     
+    def sembrar_datos(self):
+        """Encola la siembra en el EjecutorBD. self.siembra es su Future; su
+        resultado son los segundos que tardó el trabajo en el hilo"""
+        def sembrar(db):
+            inicio = time.perf_counter()
+            db.insertar_datos_prueba()
+            return time.perf_counter() - inicio
+        
+        self.siembra = self.ejecutor.ejecutar(
+            sembrar, al_fallar=lambda e: messagebox.showerror("Error", str(e)))
+    
+    def esperar_siembra(self):
+        """Espera, desde un hilo del EjecutorBD, a que termine la siembra. Si falló,
+        el inicio de sesión sigue con las cuentas que haya"""
+        if not self.siembra.cancelled():
+            self.siembra.exception()
+    
+    def cerrar(self):
+        if self.monitor_interfaz:
+            self.monitor_interfaz.cerrar()
+        self.ejecutor.cerrar()
+        if self.db.monitor:
+            try:
+                self.db.monitor.guardar(self.RUTA_ESTADISTICAS_SQL)
+            except OSError:
+                pass
+        self.destroy()
+    
     def mostrar_panel_principal(self, rol, id_usuario, nombre_usuario):
         for widget in self.winfo_children():
             widget.destroy()
         PanelPrincipal(self, self.db, rol, id_usuario, nombre_usuario)
 
-if __name__ == "__main__":
+def comparar_perfiles(argumentos):
+    """Compara los resúmenes de dos archivos de MonitorInterfaz: --comparar-perfil antes.jsonl despues.jsonl"""
+    if len(argumentos) != 2:
+        print("Uso: --comparar-perfil antes.jsonl despues.jsonl")
+        return 2
+    
+    resumenes = []
+    for ruta in argumentos:
+        with open(ruta, encoding="utf-8") as f:
+            registros = [json.loads(linea) for linea in f if linea.strip()]
+        resumen = [registro for registro in registros if registro["tipo"] == "resumen"]
+        if not resumen:
+            print(f"'{ruta}' no tiene resumen: la aplicación no se cerró normalmente")
+            return 1
+        # Si el archivo acumula varias sesiones, se compara la última
+        resumenes.append({"retraso del bucle": resumen[-1]["retraso_bucle"], **resumen[-1]["manejadores"]})
+    
+    antes, despues = resumenes
+    print(f"{'p95 ms':60}{'antes':>10}{'después':>10}{'cambio':>9}")
+    for nombre in sorted(antes.keys() | despues.keys(),
+                         key=lambda nombre: -despues.get(nombre, antes.get(nombre)).get("p95_ms", 0)):
+        p95_antes = antes.get(nombre, {}).get("p95_ms")
+        p95_despues = despues.get(nombre, {}).get("p95_ms")
+        cambio = (f"{(p95_despues - p95_antes) / p95_antes:+.0%}"
+                  if p95_antes and p95_despues is not None else "")
+        print(f"{nombre[:60]:60}{'' if p95_antes is None else p95_antes:>10}"
+              f"{'' if p95_despues is None else p95_despues:>10}{cambio:>9}")
+    return 0
+
+def perfilar_arranque():
+    """Mide el arranque: importaciones, apertura de la base, esquema, primer
+    dibujado y la siembra de datos que sigue en segundo plano"""
+    tiempos = {"importaciones": FIN_IMPORTACION - INICIO_IMPORTACION}
     
+    db = Database(sembrar=False)
+    tiempos["apertura de la base"] = db.tiempos["apertura"]
+    tiempos["esquema (DDL)"] = db.tiempos["esquema"]
+    
+    inicio = time.perf_counter()
+    app = Veterinaria(db)
+    app.update_idletasks()
+    tiempos["primer dibujado"] = time.perf_counter() - inicio
+    
+    # Trabajo diferido: se espera a que termine y se toma lo que tardó en su hilo
+    inicio = time.perf_counter()
+    tiempos["siembra (segundo plano)"] = app.siembra.result()
+    tiempos["espera hasta la siembra"] = time.perf_counter() - inicio
+    tiempos["total"] = time.perf_counter() - INICIO_IMPORTACION
+    
+    app.cerrar()
+    for etapa, segundos in tiempos.items():
+        print(f"{etapa:24}{segundos * 1000:10.1f} ms")
+    return 0
+
+def verificar_planes():
+    """Comprueba los planes de lo que ejecutan los paneles, sobre una copia de la
+    base; devuelve el código de salida"""
     db = Database()
-   
-    app = Veterinaria()
+    fallos = db.verificar_planes()
+    for nombre, sentencia, detalle in fallos:
+        print(f"SCAN completo en '{nombre}': {detalle}\n    {' '.join(sentencia.split())}")
+    if not fallos:
+        print("Las operaciones de los paneles usan índices")
+    return 1 if fallos else 0
+
+def reconstruir_ingresos():
+    """Compara los resúmenes de ingresos con Pago, informa de las diferencias y los reconstruye"""
+    db = Database()
+    diferencias = db.verificar_resumen_ingresos()
+    for tabla, fila_resumen, fila_calculada in diferencias:
+        print(f"{tabla}: resumen={fila_resumen} calculado={fila_calculada}")
+    db.reconstruir_resumen_ingresos()
+    print(f"{len(diferencias)} diferencias; resúmenes reconstruidos")
+    return 1 if diferencias else 0
+
+def despachar_recordatorios():
+    """Envía los recordatorios pendientes con el transporte de archivo"""
+    metricas = asyncio.run(DespachadorRecordatorios(Database(), TransporteArchivo()).despachar())
+    print(", ".join(f"{nombre}: {valor:.2f}" if isinstance(valor, float) else f"{nombre}: {valor}"
+                    for nombre, valor in metricas.items()))
+    return 0
+
+def crear_usuario(argumentos):
+    """Crea una cuenta de acceso: --crear-usuario ROL ID EMAIL (pide la contraseña)"""
+    if len(argumentos) != 3 or not argumentos[1].isdigit():
+        print(f"Uso: --crear-usuario {{{'|'.join(Database.ROLES)}}} ID email")
+        return 2
+    rol, persona_id, email = argumentos
+    password = getpass.getpass("Contraseña: ")
+    try:
+        Database().crear_usuario(rol, int(persona_id), email, password)
+    except ErrorVeterinaria as e:
+        print(e)
+        return 1
+    print(f"Cuenta {email} creada")
+    return 0
+
+def estadisticas_sql():
+    """Muestra las estadísticas SQL que guardó la aplicación al cerrarse"""
+    try:
+        with open(Veterinaria.RUTA_ESTADISTICAS_SQL, encoding="utf-8") as f:
+            estadisticas = json.load(f)
+    except OSError:
+        print(f"No hay estadísticas en '{Veterinaria.RUTA_ESTADISTICAS_SQL}': inicie la aplicación con --medir-sql")
+        return 1
+    
+    limites = [f"<={limite}" for limite in estadisticas["cubetas_ms"]] + [">"]
+    print(f"{'llamadas':>9}{'total ms':>11}{'media ms':>10}{'p95 ms':>9}{'máx ms':>9}{'filas':>9}  sentencia")
+    for fila in estadisticas["consultas"]:
+        print(f"{fila['llamadas']:>9}{fila['total_ms']:>11.1f}{fila['media_ms']:>10.2f}{fila['p95_ms']:>9.2f}"
+              f"{fila['maximo_ms']:>9.2f}{fila['filas']:>9}  {fila['consulta'][:100]}")
+        histograma = ", ".join(f"{limite}: {n}" for limite, n in zip(limites, fila["cubetas"]) if n)
+        print(f"{'':58}{', '.join(fila['origenes'])} | ms {histograma}")
+    return 0
+
+def importar_datos(argumentos):
+    """Importa un archivo por línea de comandos: --importar TABLA RUTA"""
+    if len(argumentos) != 2:
+        print(f"Uso: --importar {{{'|'.join(ImportadorDatos.TABLAS)}}} archivo.csv|archivo.jsonl")
+        return 2
+    tabla, ruta = argumentos
+    try:
+        metricas = ImportadorDatos(Database()).importar(
+            tabla, ruta, progreso=lambda n: print(f"{n} filas importadas...", end="\r"))
+    except ErrorVeterinaria as e:
+        print(e)
+        return 1
+    print()
+    for linea, motivo in metricas["rechazadas"]:
+        print(f"Línea {linea}: {motivo}")
+    print(f"{metricas['importadas']} filas importadas, {len(metricas['rechazadas'])} rechazadas "
+          f"en {metricas['segundos']:.2f} s ({metricas['filas/s']:.0f} filas/s)")
+    return 1 if metricas["rechazadas"] else 0
+
+def medir_perfil(perfil, escrituras=500, lectores=4):
+    """Mide commits/s de un solo puesto y lecturas/s de varios lectores
+    mientras otro puesto escribe, sobre una base temporal"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "benchmark.db")
+        db = Database(ruta, perfil=perfil)
+        cursor = db.conn.cursor()
+        
+        # Escritura como en la aplicación: un INSERT y un commit por operación
+        inicio = time.perf_counter()
+        for i in range(escrituras):
+            cursor.execute("INSERT INTO Cita (fecha, motivo, animal_id, veterinario_id, servicio_id) "
+                           "VALUES (datetime('now'), ?, 1, 1, 1)", (f"Control {i}",))
+            db.conn.commit()
+        commits_por_segundo = escrituras / (time.perf_counter() - inicio)
+        
+        terminar = threading.Event()
+        lecturas = [0] * lectores
+        bloqueos = [0] * lectores
+        
+        def leer(n):
+            lector = Database(ruta, inicializar=False, perfil=perfil)
+            lector.conn.execute("PRAGMA busy_timeout = 0")
+            while not terminar.is_set():
+                try:
+                    lector.conn.execute("SELECT COUNT(*) FROM Cita WHERE animal_id = 1").fetchone()
+                    lecturas[n] += 1
+                except sqlite3.OperationalError:
+                    bloqueos[n] += 1
+            lector.conn.close()
+        
+        hilos = [threading.Thread(target=leer, args=(n,)) for n in range(lectores)]
+        for hilo in hilos:
+            hilo.start()
+        inicio = time.perf_counter()
+        for i in range(escrituras):
+            cursor.execute("INSERT INTO Cita (fecha, motivo, animal_id, veterinario_id, servicio_id) "
+                           "VALUES (datetime('now'), ?, 1, 1, 1)", (f"Concurrente {i}",))
+            db.conn.commit()
+        duracion = time.perf_counter() - inicio
+        terminar.set()
+        for hilo in hilos:
+            hilo.join()
+        db.conn.close()
+        
+        return {
+            "commits/s": commits_por_segundo,
+            "commits/s con lectores": escrituras / duracion,
+            "lecturas/s": sum(lecturas) / duracion,
+            "lecturas bloqueadas": sum(bloqueos)
+        }
+
+def medir_consultas(db, repeticiones=20, semilla=7):
+    """Mide las consultas de los paneles sobre una base ya poblada. Devuelve
+    {consulta: (mediana, p95)} en milisegundos"""
+    azar = random.Random(semilla)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM Animal")
+    primer_animal, ultimo_animal = cursor.fetchone()
+    cursor.execute("SELECT email FROM Usuario ORDER BY id DESC LIMIT 5")
+    emails = cursor.fetchall()
+    veterinario = Veterinario(id=1)
+    hasta = date.today()
+    desde = hasta - timedelta(days=30)
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        consultas = {
+            "login (cuenta por email)": lambda: db.clave_actual(azar.choice(emails)[0]),
+            "historial de un animal": lambda: veterinario.linea_temporal(
+                azar.randint(primer_animal, ultimo_animal), db),
+            "buscar animal": lambda: db.buscar_animales(azar.choice(GeneradorDatos.NOMBRES_ANIMAL)[:3]),
+            "alertas de vacunas": lambda: veterinario.alertas_vacunas(db, dias=7),
+            "citas sin pagar": lambda: db.cuentas_por_cobrar(limite=100),
+            "reporte de citas (30 días)": lambda: ExportadorCitas(
+                db, os.path.join(directorio, "citas.csv"), "csv",
+                desde.isoformat(), hasta.isoformat()).exportar(db.conn),
+            "reporte de ingresos": lambda: ReporteIngresos(
+                os.path.join(directorio, "ingresos.txt")).escribir(db.conn)
+        }
+        resultados = {}
+        for nombre, consulta in consultas.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                consulta()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            resultados[nombre] = (statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1])
+        return resultados
+
+def benchmark_carga(tamanos):
+    """Genera bases sintéticas de cada tamaño (en citas) y mide las consultas de los paneles"""
+    tamanos = [int(tamano) for tamano in tamanos] or [10_000, 100_000, 1_000_000]
+    columnas = []
+    for tamano in tamanos:
+        with tempfile.TemporaryDirectory() as directorio:
+            db = Database(os.path.join(directorio, "benchmark.db"))
+            inicio = time.perf_counter()
+            filas = GeneradorDatos(db).generar(tamano)
+            print(f"{tamano} citas: {sum(filas.values())} filas generadas en "
+                  f"{time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+            columnas.append((tamano, medir_consultas(db)))
+            db.conn.close()
+    
+    print(f"{'mediana / p95 (ms)':28}" + "".join(f"{tamano:>20}" for tamano, _ in columnas))
+    for consulta in columnas[0][1]:
+        print(f"{consulta:28}" + "".join(
+            f"{medidas[consulta][0]:>11.2f} /{medidas[consulta][1]:>7.2f}" for _, medidas in columnas))
+    return 0
+
+def benchmark_conexion():
+    """Compara la configuración por defecto de SQLite con PERFIL_CONEXION"""
+    resultados = [("por defecto", medir_perfil({})),
+                  ("PERFIL_CONEXION", medir_perfil(Database.PERFIL_CONEXION))]
+    print(f"{'':24}" + "".join(f"{nombre:>18}" for nombre, _ in resultados))
+    for metrica in resultados[0][1]:
+        print(f"{metrica:24}" + "".join(f"{medidas[metrica]:>18.1f}" for _, medidas in resultados))
+    return 0
+
+if __name__ == "__main__":
+    if "--verificar-planes" in sys.argv:
+        sys.exit(verificar_planes())
+    if "--benchmark-conexion" in sys.argv:
+        sys.exit(benchmark_conexion())
+    if "--reconstruir-ingresos" in sys.argv:
+        sys.exit(reconstruir_ingresos())
+    if "--despachar-recordatorios" in sys.argv:
+        sys.exit(despachar_recordatorios())
+    if "--profile-startup" in sys.argv:
+        sys.exit(perfilar_arranque())
+    if "--benchmark-carga" in sys.argv:
+        sys.exit(benchmark_carga(sys.argv[sys.argv.index("--benchmark-carga") + 1:]))
+    if "--crear-usuario" in sys.argv:
+        sys.exit(crear_usuario(sys.argv[sys.argv.index("--crear-usuario") + 1:]))
+    if "--estadisticas-sql" in sys.argv:
+        sys.exit(estadisticas_sql())
+    if "--importar" in sys.argv:
+        sys.exit(importar_datos(sys.argv[sys.argv.index("--importar") + 1:]))
+    
+    if "--comparar-perfil" in sys.argv:
+        sys.exit(comparar_perfiles(sys.argv[sys.argv.index("--comparar-perfil") + 1:]))
+    
+    if "--medir-sql" in sys.argv:
+        Veterinaria.MEDIR_SQL = True
+    monitor_interfaz = None
+    if "--perfilar-interfaz" in sys.argv:
+        # --cprofile guarda además las funciones más costosas de los manejadores lentos
+        monitor_interfaz = MonitorInterfaz(perfilar="--cprofile" in sys.argv).instalar()
+    app = Veterinaria(monitor_interfaz=monitor_interfaz)
     app.mainloop()
\ No newline at end of file